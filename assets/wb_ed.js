@@ -0,0 +1,36 @@
+// static version of the callbacks of wb_ed.py, used when the app runs with ESG_STATIC=1.
+// every state was rendered by python -m esg.bake, so the callbacks only fetch json files. baked is the
+// manifest of the baked files (years and folder of every option) with the url they are served from.
+// a state missing from the baked files is one on which the callback failed, the charts shown are kept
+function fetchBaked(baked, path) {
+    return fetch(baked.url + '/' + path + '?v=' + baked.version).then(function (response) {
+        if (response.status === 404) {
+            throw window.dash_clientside.PreventUpdate;
+        }
+        if (!response.ok) {
+            throw new Error('could not fetch ' + path + ': ' + response.status);
+        }
+        return response.json();
+    });
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    wb_ed: {
+        update_dropdown: function (level, baked) {
+            return fetchBaked(baked, 'options/' + level + '.json');
+        },
+
+        update_period: function (period) {
+            return period !== 'Year';
+        },
+
+        // the charts of an option for a year, or for all years when no year of the dataset is selected
+        update_output: function (option, year, baked) {
+            if (!baked.folders.hasOwnProperty(option)) {
+                return null;
+            }
+            var period = baked.years.indexOf(year) >= 0 ? year : 'all';
+            return fetchBaked(baked, 'output/' + baked.folders[option] + '/' + period + '.json');
+        }
+    }
+});
@@ -0,0 +1,223 @@
+#benchmark of the data loading, the cleaning and the callbacks of the dashboards on a local fixture.
+#
+#    python benchmarks/bench.py                    compare against benchmarks/baseline.json
+#    python benchmarks/bench.py --update-baseline  store the current numbers as the new baseline (the median of
+#                                                  --baseline-runs runs of the suite, each in a new process so
+#                                                  that the imports are timed from scratch, so it is not a lucky run)
+#
+#every stage reports its fastest wall time over the runs (noise only ever adds time) and its peak python memory
+#(tracemalloc).
+#the wall times depend on the machine, so a calibration stage (a fixed mix of numpy, pandas and pure python work) runs
+#in the same process before every stage, and the baseline times are scaled by how much faster or slower it
+#runs here than when the baseline was stored. The script exits with 1 if a stage is slower than the scaled baseline or
+#uses more memory than the baseline allows
+
+#import necessary libraries
+import argparse
+import importlib
+import inspect
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'top_10_co2_emmissions'))
+
+from benchmarks.fixture import make_fixture  # noqa: E402
+
+
+#the times of the calibration stage run before every stage
+_calibration = []
+
+
+# run func repeat times for the timing and once more under tracemalloc for the peak memory.
+# the calibration runs once before, so that its median time is taken over the whole suite
+def measure(func, repeat):
+    start = time.perf_counter()
+    calibration_work()
+    _calibration.append(time.perf_counter() - start)
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {'seconds': min(times), 'peak_mb': peak / 2 ** 20}
+
+
+# a fixed amount of work close to what the stages do: sorting and grouping arrays, and python objects and json
+def calibration_work():
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    values = rng.random(200000)
+    frame = pd.DataFrame({'group': rng.integers(0, 200, len(values)), 'value': values})
+    frame.groupby('group')['value'].agg(['sum', 'mean', 'max'])
+    np.sort(values)
+    rows = [{'label': str(i), 'value': float(value)} for i, value in enumerate(values[:50000])]
+    json.dumps(rows)
+
+
+# import a module from scratch, so that its module level code (loading and cleaning the data) runs again
+def fresh_import(name):
+    sys.modules.pop(name, None)
+    return importlib.import_module(name)
+
+
+def run(repeat):
+    import pandas as pd
+
+    from esg import cleaning, data
+
+    workdir = tempfile.mkdtemp(prefix='esg-bench-')
+    csv = make_fixture(os.path.join(workdir, 'df_esg.csv'))
+
+    #point the dashboards at the fixture and keep the figure cache out of the way
+    os.environ['ESG_CSV'] = csv
+    os.environ['ESG_SNAPSHOT_DIR'] = os.path.join(workdir, 'snapshots')
+    os.environ['ESG_FIGURE_CACHE'] = os.path.join(workdir, 'figures')
+    data.CSV_PATH = csv
+    data.SNAPSHOT_DIR = os.environ['ESG_SNAPSHOT_DIR']
+
+    results = {}
+    results['load csv'] = measure(lambda: pd.read_csv(csv), repeat)
+    results['build snapshot'] = measure(lambda: data.build_snapshot(), 1)
+    results['load snapshot'] = measure(lambda: data.load_esg(), repeat)
+
+    years = list(map(str, range(1990, 2019)))
+    df_esg = data.load_esg()
+    new_df = df_esg[df_esg['ind'].isin(['EN.ATM.CO2E.PC', 'EN.ATM.METH.PC', 'EN.ATM.NOXE.PC', 'NY.GDP.MKTP.KD.ZG',
+                                        'EG.FEC.RNEW.ZS', 'NY.ADJ.DRES.GN.ZS', 'NY.ADJ.DFOR.GN.ZS', 'AG.LND.FRST.ZS'])]
+    indicators = sorted(new_df['ind'].unique())
+    results['wb_ed cleaning'] = measure(
+        lambda: cleaning.drop_empty_rows(cleaning.drop_empty_years(new_df, years, indicators), years), repeat)
+    df_co2 = df_esg[df_esg['indicator'] == 'CO2 emissions (kt)']
+    results['co2emmissions cleaning'] = measure(
+        lambda: cleaning.drop_empty_columns(df_co2, list(map(str, range(1960, 2022)))), repeat)
+
+    #import wb_ed and create its app without the data, then import it again and load the data
+    results['create_app wb_ed'] = measure(lambda: fresh_import('wb_ed').create_app({'warm_up': 'none'}), 1)
+    results['import wb_ed'] = measure(lambda: fresh_import('wb_ed').load(), 1)
+    results['import co2emmissions'] = measure(lambda: fresh_import('co2emmissions'), 1)
+    wb_ed = sys.modules['wb_ed']
+    co2emmissions = sys.modules['co2emmissions']
+
+    #call the callbacks without the caches in front of them
+    update_output = inspect.unwrap(wb_ed.update_output)
+    get_graph = inspect.unwrap(co2emmissions.get_graph)
+
+    for level in ['country', 'sub-region', 'continent']:
+        results[f'update_dropdown {level}'] = measure(lambda: wb_ed.update_dropdown(level), repeat)
+
+    options = {'country': 'Germany', 'sub-region': 'Southern Europe', 'continent': 'Europe'}
+    for level, option in options.items():
+        results[f'update_output {level} year'] = measure(lambda: update_output(option, '2015'), repeat)
+        results[f'update_output {level} all years'] = measure(lambda: update_output(option, None), repeat)
+
+    results['get_graph'] = measure(lambda: get_graph(2015), repeat)
+
+    results['calibration'] = {'seconds': statistics.median(_calibration), 'peak_mb': measure(calibration_work, 1)['peak_mb']}
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# compare the results with the baseline and return the regressions as (stage, message). The baseline times are scaled
+# by the ratio of the calibration stage here and in the baseline, and are printed scaled.
+# tiny absolute differences are ignored as they are only noise
+def compare(results, baseline, tolerance, min_seconds=0.01, min_mb=0.5):
+    scale = 1.0
+    if 'calibration' in results and 'calibration' in baseline:
+        scale = results['calibration']['seconds'] / baseline['calibration']['seconds']
+    else:
+        print('no calibration in the baseline, the times are compared as they are')
+    print(f'this machine runs the calibration {scale:.2f} times as long as the baseline machine')
+
+    regressions = []
+    print(f"{'stage':<38}{'seconds':>10}{'baseline':>10}{'peak MB':>10}{'baseline':>10}")
+    for stage, result in results.items():
+        base = baseline.get(stage)
+        if base is None:
+            print(f"{stage:<38}{result['seconds']:>10.4f}{'-':>10}{result['peak_mb']:>10.2f}{'-':>10}")
+            continue
+        expected = base['seconds'] * (scale if stage != 'calibration' else 1.0)
+        print(f"{stage:<38}{result['seconds']:>10.4f}{expected:>10.4f}{result['peak_mb']:>10.2f}{base['peak_mb']:>10.2f}")
+        if stage == 'calibration':
+            continue
+        if result['seconds'] > expected * (1 + tolerance) and result['seconds'] - expected > min_seconds:
+            regressions.append((f'{stage} time', f"{stage}: {result['seconds']:.4f}s against {expected:.4f}s"))
+        if result['peak_mb'] > base['peak_mb'] * (1 + tolerance) and result['peak_mb'] - base['peak_mb'] > min_mb:
+            regressions.append((f'{stage} memory', f"{stage}: {result['peak_mb']:.2f}MB against {base['peak_mb']:.2f}MB"))
+    return regressions
+
+
+# run the suite in a new process, so that the imports are timed from scratch, and return its results
+def run_suite(repeat):
+    with tempfile.TemporaryDirectory(prefix='esg-bench-run-') as tmp:
+        path = os.path.join(tmp, 'results.json')
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--repeat', str(repeat), '--json', path], check=True)
+        with open(path) as f:
+            return json.load(f)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark of the esg dashboards on a local fixture')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs per stage')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline (0.25 = 25%%)')
+    parser.add_argument('--baseline', default=BASELINE, help='path of the baseline file')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--baseline-runs', type=int, default=3, help='runs of the suite a new baseline is the median of')
+    parser.add_argument('--attempts', type=int, default=3,
+                        help='runs of the suite at most; a stage only regresses when it does in every run')
+    parser.add_argument('--json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    #a run of the suite started by run_suite: only write the results
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(run(args.repeat), f)
+        sys.exit(0)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        runs = [run_suite(args.repeat) for _ in range(max(args.baseline_runs, 1))]
+        results = {stage: {key: statistics.median(result[stage][key] for result in runs) for key in ['seconds', 'peak_mb']}
+                   for stage in runs[0]}
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        compare(results, {}, args.tolerance)
+        print(f'baseline written to {args.baseline}')
+        sys.exit(0)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    #a process can run slower than another one on the same machine; a real regression shows in every run,
+    #so the suite runs again while some stage regressed, and only the stages that regressed every time are reported
+    regressions = None
+    for attempt in range(max(args.attempts, 1)):
+        if attempt:
+            print(f'\n{len(regressions)} stages regressed, running the suite again ({attempt + 1}/{args.attempts})')
+        found = dict(compare(run_suite(args.repeat), baseline, args.tolerance))
+        regressions = found if regressions is None else {key: found[key] for key in regressions if key in found}
+        if not regressions:
+            break
+    if regressions:
+        print('\nregressions:')
+        print('\n'.join(regressions.values()))
+        sys.exit(1)
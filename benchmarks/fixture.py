@@ -0,0 +1,43 @@
+#import necessary libraries
+import os
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#the indicators the dashboards use. They get data for every year from 1990 to 2020
+#so that every chart of wb_ed.py and co2emmissions.py has something to show
+DASHBOARD_INDICATORS = ["EN.ATM.CO2E.PC", "EN.ATM.CO2E.KT", "EN.ATM.METH.PC", "EN.ATM.NOXE.PC", "NY.GDP.MKTP.KD.ZG",
+                        "EG.FEC.RNEW.ZS", "NY.ADJ.DRES.GN.ZS", "NY.ADJ.DFOR.GN.ZS", "AG.LND.FRST.ZS"]
+
+
+# write a synthetic df_esg.csv with the same columns as the one df_esg.ipynb produces:
+# one row per country of all.csv and indicator of the framework file, random values from 1990 to 2020
+# and a share of missing values. The same seed always gives the same file
+def make_fixture(path, seed=0):
+    rng = np.random.default_rng(seed)
+
+    framework = pd.read_csv(os.path.join(ROOT, 'sovereignesg-framework_2022-12-12.csv'), encoding='utf-8-sig')
+    framework = framework[['pillar', 'group', 'ind', 'indicator']].dropna()
+    countries = pd.read_csv(os.path.join(ROOT, 'all.csv'), keep_default_na=False, na_values=[''])
+    countries = countries.rename(columns={'alpha-3': 'iso3', 'region': 'continent', 'name': 'country'})
+    countries = countries[countries['continent'].notna()]
+
+    years = list(map(str, range(1960, 2022)))
+    df = pd.DataFrame({'iso3': np.repeat(countries['iso3'].to_numpy(), len(framework)),
+                       'ind': np.tile(framework['ind'].to_numpy(), len(countries))})
+
+    values = rng.gamma(2.0, 3.0, size=(len(df), len(years)))
+    values[:, :30] = np.nan
+    values[:, -1] = np.nan
+    values[rng.random(values.shape) < 0.1] = np.nan
+    dashboard = df['ind'].isin(DASHBOARD_INDICATORS).to_numpy()
+    values[(rng.random(len(df)) < 0.1) & ~dashboard, :] = np.nan
+    values[df['ind'].eq('NY.GDP.MKTP.KD.ZG').to_numpy()] -= 4
+
+    df = pd.concat([df, pd.DataFrame(np.round(values, 2), columns=years)], axis=1)
+    df = df.merge(framework, on='ind', how='left')
+    df = df.merge(countries[['country', 'iso3', 'continent', 'sub-region']], on='iso3', how='left')
+    df.to_csv(path)
+    return path
@@ -0,0 +1 @@
+#helper package shared by the dashboards of the repository (wb_ed.py and top_10_co2_emmissions/co2emmissions.py)
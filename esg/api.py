@@ -0,0 +1,216 @@
+#read only http api on the flask server of a dashboard, serving the data the dashboard shows:
+#
+#    GET /api/v1/meta                                  version of the dataset, years, entities of every scope and indicators
+#    GET /api/v1/series?scope=country&entity=Germany&indicator=EN.ATM.CO2E.PC&start=2000&end=2010[&format=arrow]
+#                      [&metric=yoy|cagr|rolling[&window=5]]
+#
+#indicator can be repeated and takes the code (ind) or the name of an indicator; without scope and entity every row
+#of the indicators is returned and without indicator every indicator. metric returns a metric derived from the series
+#instead of their values (see esg/derived.py), over window years. The series are sent as json or, with
+#format=arrow or an Accept header of application/vnd.apache.arrow.stream, as an arrow ipc stream. They are streamed
+#in batches of rows, and every response carries an ETag made of the hash of the dataset and of the query, so a client
+#sending it back in If-None-Match with the same query gets a 304 until the dataset changes
+
+#import necessary libraries
+import hashlib
+import json
+import math
+
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+
+from esg.data import HAVE_ARROW
+
+#numpy and pyarrow are imported by the functions sending the data, so that importing this module (and the dashboards,
+#see create_app in wb_ed.py) does not load them
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+
+#rows sent per batch of a streamed response
+BATCH_ROWS = 500
+
+#end of stream marker of the arrow ipc stream format
+_ARROW_EOS = b'\xff\xff\xff\xff\x00\x00\x00\x00'
+
+
+class ApiError(Exception):
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+# labels of the indicators by code and by name, built once per store
+def _indicators(store):
+    codes = store.codes('ind')
+    names = store.codes('indicator')
+    pairs = sorted({(int(code), int(name)) for code, name in zip(codes, names) if code >= 0 and name >= 0})
+    return [(store.categories('ind')[code], store.categories('indicator')[name]) for code, name in pairs]
+
+
+# the derived metric and window a /series request asks for, None for the values of the series
+def _metric(source):
+    args = request.args
+    if 'metric' not in args:
+        return None
+    if source.get('derived') is None:
+        raise ApiError('this server has no derived metrics', 404)
+    try:
+        metric, window = source['derived'].key(args['metric'], args.get('window'))
+    except KeyError as e:
+        raise ApiError(e.args[0], 404)
+    except ValueError as e:
+        raise ApiError(str(e))
+    return metric, window
+
+
+# the rows, columns and years a /series request asks for
+def _query(source):
+    store, index = source['store'], source['index']
+    args = request.args
+
+    scope, entity = args.get('scope'), args.get('entity')
+    if (scope is None) != (entity is None):
+        raise ApiError('scope and entity go together')
+    if scope is not None and scope not in index.scopes:
+        raise ApiError(f'unknown scope {scope!r}, expected one of {list(index.scopes)}')
+    if scope is not None and entity not in store.categories(scope):
+        raise ApiError(f'unknown {scope} {entity!r}', 404)
+
+    names = {}
+    for code, name in source['indicators']:
+        names[code] = names[name] = name
+    requested = args.getlist('indicator')
+    unknown = [indicator for indicator in requested if indicator not in names]
+    if unknown:
+        raise ApiError(f'unknown indicators {unknown}', 404)
+    indicators = [names[indicator] for indicator in requested] or [name for _, name in source['indicators']]
+
+    years = store.years
+    try:
+        start = int(args.get('start', years[0]))
+        end = int(args.get('end', years[-1]))
+    except ValueError:
+        raise ApiError('start and end are years')
+    years = [year for year in years if start <= int(year) <= end]
+
+    rows = index.rows(scope, entity, list(dict.fromkeys(indicators)))
+    labels = [column for column in store.columns if column in store.keys]
+    return rows, labels, years
+
+
+# short hash of what a /series response holds: the rows, the years and the derived metric with its window.
+# it is part of the ETag, so a validator of one query never matches another one
+def _query_hash(rows, years, metric):
+    import numpy as np
+
+    digest = hashlib.sha256(np.asarray(rows, dtype=np.int64).tobytes())
+    digest.update(json.dumps([years, metric]).encode())
+    return digest.hexdigest()[:16]
+
+
+def _json_value(value):
+    return None if math.isnan(value) else value
+
+
+# the json body as a sequence of chunks: {"version": ..., "columns": [...], "data": [[...], ...]}
+def _stream_json(store, rows, labels, years, version):
+    import numpy as np
+
+    yield json.dumps({'version': version, 'columns': labels + years})[:-1] + ', "data": ['
+    positions = [store.years.index(year) for year in years]
+    for start in range(0, len(rows), BATCH_ROWS):
+        batch = rows[start:start + BATCH_ROWS]
+        keys = [np.asarray(store.keys[label])[batch] for label in labels]
+        #the float32 values are converted through their shortest text so that 7.54 stays 7.54
+        values = store.values[batch][:, positions]
+        lines = []
+        for row in range(len(batch)):
+            record = [key[row] if isinstance(key[row], str) else None for key in keys]
+            record += [_json_value(float(str(value))) for value in values[row]]
+            lines.append(json.dumps(record))
+        yield (',' if start else '') + ','.join(lines)
+    yield ']}'
+
+
+# the arrow ipc stream as a sequence of messages: the schema, one record batch per batch of rows and the end marker
+def _stream_arrow(store, rows, labels, years, version):
+    import numpy as np
+    import pyarrow as pa
+
+    schema = pa.schema([pa.field(label, pa.string()) for label in labels] +
+                       [pa.field(year, pa.float32()) for year in years],
+                       metadata={'version': version})
+    yield schema.serialize().to_pybytes()
+    positions = [store.years.index(year) for year in years]
+    for start in range(0, len(rows), BATCH_ROWS):
+        batch = rows[start:start + BATCH_ROWS]
+        arrays = [pa.array(np.asarray(store.keys[label])[batch], type=pa.string(), from_pandas=True) for label in labels]
+        values = store.values[batch][:, positions]
+        arrays += [pa.array(values[:, column], type=pa.float32(), from_pandas=True) for column in range(len(years))]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema).serialize().to_pybytes()
+    yield _ARROW_EOS
+
+
+# add the api to a flask server. source is a function returning the data to serve as a dict with the
+# CompactStore ('store'), its SeriesIndex ('index'), the hash of the dataset ('version') and optionally the
+# DerivedMetrics of the store ('derived')
+def register_api(server, source, prefix='/api/v1'):
+    api = Blueprint('esg_api', __name__)
+    cache = {}
+
+    # the data with the indicator labels, which are only computed again when the dataset changes
+    def data():
+        current = source()
+        if cache.get('version') != current['version']:
+            cache.clear()
+            cache.update(current, indicators=_indicators(current['store']))
+        return cache
+
+    def etag(current, kind):
+        return f'{current["version"][:32]}-{kind}'
+
+    def not_modified(tag):
+        return request.if_none_match.contains(tag)
+
+    @api.errorhandler(ApiError)
+    def error(e):
+        return jsonify(error=str(e)), e.status
+
+    @api.route('/meta')
+    def meta():
+        current = data()
+        tag = etag(current, 'meta')
+        if not_modified(tag):
+            return Response(status=304, headers={'ETag': f'"{tag}"'})
+        store = current['store']
+        response = jsonify(version=current['version'], years=store.years,
+                           scopes={scope: list(store.categories(scope)) for scope in current['index'].scopes},
+                           indicators=[{'ind': code, 'indicator': name} for code, name in current['indicators']])
+        response.set_etag(tag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    @api.route('/series')
+    def series():
+        current = data()
+        arrow = request.args.get('format') == 'arrow' or (
+            'format' not in request.args and request.accept_mimetypes.best == ARROW_MIMETYPE)
+        if arrow and not HAVE_ARROW:
+            raise ApiError('arrow responses need pyarrow on the server', 406)
+        rows, labels, years = _query(current)
+        metric = _metric(current)
+
+        tag = etag(current, f"{'arrow' if arrow else 'json'}-{_query_hash(rows, years, metric)}")
+        headers = {'ETag': f'"{tag}"', 'Cache-Control': 'no-cache', 'Vary': 'Accept'}
+        if not_modified(tag):
+            return Response(status=304, headers=headers)
+
+        #a derived metric has the rows of the store, so the rows found in the index of the store are its rows
+        store = current['store'] if metric is None else current['derived'].get(*metric).store
+
+        stream = _stream_arrow if arrow else _stream_json
+        body = stream(store, rows, labels, years, current['version'])
+        return Response(stream_with_context(body), mimetype=ARROW_MIMETYPE if arrow else 'application/json',
+                        headers=headers)
+
+    server.register_blueprint(api, url_prefix=prefix)
+    return server
@@ -0,0 +1,206 @@
+#bake the dashboards: every state they can show is rendered once and written as a json file, so that they can be
+#served without running any callback.
+#
+#    python -m esg.bake [-o baked] [--jobs 8] [--dashboards wb_ed co2emmissions] [--release YYYY-MM-DD]
+#
+#the inputs of the dashboards are finite: wb_ed shows a country, sub-region or continent for one year of 1990-2018 or
+#for all years and co2emmissions one year of 1990-2019. Every state is computed by the undecorated callback in a
+#process pool, serialized the way dash sends it and written to
+#
+#    baked/wb_ed/manifest.json                    version of the dataset, years and folder of every option
+#    baked/wb_ed/options/<level>.json             options of the dropdown for a level
+#    baked/wb_ed/output/<folder>/<year|all>.json  children of the output container for an option
+#    baked/co2emmissions/manifest.json
+#    baked/co2emmissions/graph/<year>.json        the figures of a year
+#
+#a dashboard is baked in a temporary folder which replaces the previous one at the end. Started with ESG_STATIC=1 the
+#dashboards fetch these files from the browser (assets/wb_ed.js and top_10_co2_emmissions/assets/co2.js), so no
+#callback runs on the server. The files are served under /baked by the dashboard itself or, with ESG_BAKED_URL set,
+#by any static file host the folder was copied to
+
+#import necessary libraries
+import argparse
+import inspect
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from esg.data import ROOT
+
+#where the baked files are written and read, the url the browser fetches them from and whether the dashboards serve them
+BAKED_DIR = os.environ.get('ESG_BAKED_DIR', os.path.join(ROOT, 'baked'))
+BAKED_URL = os.environ.get('ESG_BAKED_URL', '/baked').rstrip('/')
+STATIC = os.environ.get('ESG_STATIC') == '1'
+
+DASHBOARDS = ['wb_ed', 'co2emmissions']
+
+MANIFEST = 'manifest.json'
+
+#the dashboard modules loaded by a process of the pool, by name
+_modules = {}
+
+
+# the module of a dashboard with its data loaded. config is the configuration of wb_ed (see wb_ed.DEFAULT_CONFIG)
+def _dashboard(name, config=None):
+    if name not in _modules:
+        for path in [ROOT, os.path.join(ROOT, 'top_10_co2_emmissions')]:
+            if path not in sys.path:
+                sys.path.insert(0, path)
+        if name == 'wb_ed':
+            import wb_ed as module
+            module.config.update(config or {})
+            module.load()
+        else:
+            import co2emmissions as module
+        _modules[name] = module
+    return _modules[name]
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text)
+
+
+# render the states of a callback to path(state) and return the number of files and bytes written.
+# a state on which the callback fails gets no file: as with the live dashboard, the browser keeps the charts it shows
+def _render(callback, states, path):
+    from plotly.io.json import to_json_plotly
+
+    start = time.perf_counter()
+    written = 0
+    failed = []
+    for state in states:
+        try:
+            text = to_json_plotly(callback(*state))
+        except Exception as e:
+            failed.append(f'{" / ".join(map(str, state))}: {e!r}')
+            continue
+        written += _write(path(*state), text)
+    return {'files': len(states) - len(failed), 'bytes': written, 'failed': failed, 'seconds': time.perf_counter() - start}
+
+
+# render every year of one option of wb_ed in a process of the pool
+def render_option(out_dir, folder, option, years, config=None):
+    update_output = inspect.unwrap(_dashboard('wb_ed', config).update_output)
+    return _render(update_output, [(option, year) for year in years + [None]],
+                   lambda option, year: os.path.join(out_dir, 'output', folder, f'{year or "all"}.json'))
+
+
+# render the figures of one year of co2emmissions in a process of the pool
+def render_year(out_dir, year):
+    get_graph = inspect.unwrap(_dashboard('co2emmissions').get_graph)
+    return _render(get_graph, [(year,)], lambda year: os.path.join(out_dir, 'graph', f'{year}.json'))
+
+
+# submit the states of wb_ed to the pool and return the manifest and the futures
+def _bake_wb_ed(out_dir, pool, config):
+    wb_ed = _dashboard('wb_ed', config)
+    update_dropdown = inspect.unwrap(wb_ed.update_dropdown)
+
+    folders = {}
+    futures = []
+    for level in ['country', 'sub-region', 'continent']:
+        options = update_dropdown(level)
+        _write(os.path.join(out_dir, 'options', f'{level}.json'), json.dumps(options))
+        for option in options:
+            #an option is shown the same way whatever the level it was picked from
+            if option['value'] in folders:
+                continue
+            folder = folders[option['value']] = str(len(folders))
+            futures.append(pool.submit(render_option, out_dir, folder, option['value'], list(wb_ed.years), config))
+    return {'version': wb_ed.version, 'years': list(wb_ed.years), 'folders': folders}, futures
+
+
+def _bake_co2(out_dir, pool):
+    co2 = _dashboard('co2emmissions')
+    years = [year for year in map(str, range(1990, 2020)) if year in co2.co2_years]
+    futures = [pool.submit(render_year, out_dir, year) for year in years]
+    return {'version': co2.version, 'years': years}, futures
+
+
+# bake the dashboards in out_dir with a pool of jobs processes. config is the configuration of wb_ed.
+# returns the timing of every dashboard with the states that could not be rendered
+def bake(out_dir=None, dashboards=None, jobs=None, config=None):
+    out_dir = out_dir or BAKED_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    timings = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for name in dashboards or DASHBOARDS:
+            start = time.perf_counter()
+            target = os.path.join(out_dir, name)
+            tmp = f'{target}.{uuid.uuid4().hex}.tmp'
+            os.makedirs(tmp)
+            try:
+                if name == 'wb_ed':
+                    manifest, futures = _bake_wb_ed(tmp, pool, config)
+                else:
+                    manifest, futures = _bake_co2(tmp, pool)
+                results = [future.result() for future in futures]
+                _write(os.path.join(tmp, MANIFEST), json.dumps(manifest))
+
+                #the previous files are moved away first, so the folder is only missing for the time of a rename
+                old = f'{target}.{uuid.uuid4().hex}.old'
+                if os.path.exists(target):
+                    os.rename(target, old)
+                os.rename(tmp, target)
+                shutil.rmtree(old, ignore_errors=True)
+            except BaseException:
+                #stop the workers before removing the folder they write to
+                pool.shutdown(cancel_futures=True)
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise
+            timings.append({'dashboard': name, 'files': sum(result['files'] for result in results),
+                            'bytes': sum(result['bytes'] for result in results),
+                            'failed': [state for result in results for state in result['failed']],
+                            'busy': sum(result['seconds'] for result in results),
+                            'seconds': time.perf_counter() - start})
+    return timings
+
+
+# the manifest of a baked dashboard
+def read_manifest(name, directory=None):
+    path = os.path.join(directory or BAKED_DIR, name, MANIFEST)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except OSError:
+        raise FileNotFoundError(f'{path} does not exist: bake the dashboards with python -m esg.bake first')
+
+
+# what the browser needs to find the baked files of a dashboard, kept in a dcc.Store of its layout
+def baked_source(name, manifest, url=None):
+    return dict(manifest, url=f'{url or BAKED_URL}/{name}')
+
+
+# serve the baked files under /baked from the flask server of a dashboard
+def register_baked(server, directory=None, path='/baked'):
+    from flask import send_from_directory
+
+    directory = os.path.abspath(directory or BAKED_DIR)
+
+    def baked(filename):
+        return send_from_directory(directory, filename)
+
+    server.add_url_rule(f'{path}/<path:filename>', 'esg_baked', baked)
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='render every state of the dashboards to json files')
+    parser.add_argument('-o', '--output', default=BAKED_DIR, help='folder of the baked files (default: %(default)s)')
+    parser.add_argument('--dashboards', nargs='+', choices=DASHBOARDS, default=DASHBOARDS, help='dashboards to bake')
+    parser.add_argument('--jobs', type=int, help='worker processes (default: number of cores)')
+    parser.add_argument('--release', help='release of the release store to bake for wb_ed (see esg/releases.py)')
+    args = parser.parse_args()
+
+    for timing in bake(args.output, args.dashboards, args.jobs, {'release': args.release} if args.release else None):
+        print(f"{timing['dashboard']}: {timing['files']} files, {timing['bytes'] / 1e6:.1f} MB, "
+              f"{timing['busy']:.1f}s of work in {timing['seconds']:.1f}s", file=sys.stderr)
+        for state in timing['failed']:
+            print(f'  failed {state}', file=sys.stderr)
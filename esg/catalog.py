@@ -0,0 +1,130 @@
+#catalog of the indicators of the sovereign esg framework file, loaded one indicator at a time.
+#
+#the dashboards show a few indicators from their own store; any other indicator of the framework file is read on
+#demand by IndicatorCatalog.get. The rows of an indicator (one per country, one column per year) are read from the
+#snapshot of df_esg (see esg/data.py) and written once per host as a mapped store (see esg/mapped.py), so the other
+#workers open them memory mapped. The indicators in use are kept in an LRUCache (see esg/memo.py) with the
+#structures the queries run on, and the least recently used one is dropped when the cache is full, so a worker only
+#holds the indicators its users look at. The series the dashboards need without offering them, as the population, are
+#read the same way whether the framework file lists them or not
+
+#import necessary libraries
+import csv
+import logging
+import os
+import threading
+
+from esg.config import FRAMEWORK_PATH
+from esg.memo import LRUCache
+
+#how many indicators a worker keeps loaded
+CATALOG_SIZE = int(os.environ.get('ESG_CATALOG_SIZE', 16))
+
+#bump this number when the way the rows of an indicator are read or cleaned changes, so that the mapped stores get rebuilt
+CATALOG_REVISION = 1
+
+#the key columns kept for every row of an indicator
+KEYS = ['ind', 'indicator', 'country', 'continent', 'sub-region']
+
+logger = logging.getLogger(__name__)
+
+
+# the indicators of the framework file in its order, as dicts with the code (ind), pillar, group and name.
+# like esg.etl.read_framework, indicators with a row without pillar are left out. Only the csv module is used,
+# so the dropdown of the catalog is built without loading pandas
+def read_catalog(path=None):
+    with open(path or FRAMEWORK_PATH, encoding='utf-8-sig', newline='') as f:
+        rows = [row for row in csv.DictReader(f) if row.get('ind')]
+    undefined = {row['ind'] for row in rows if not row['pillar']}
+    entries = {}
+    for row in rows:
+        if row['ind'] not in undefined:
+            entries.setdefault(row['ind'], {key: row[key] for key in ['ind', 'pillar', 'group', 'indicator']})
+    return list(entries.values())
+
+
+# the options of a dropdown of the catalog: the name of every indicator after its pillar, the code as value
+def catalog_options(path=None):
+    return [{'label': f"{entry['pillar']}: {entry['indicator']}", 'value': entry['ind']} for entry in read_catalog(path)]
+
+
+# the indicators of the framework file for one version of the dataset. get(code) returns the QueryEngine
+# (see esg/query.py) of an indicator, loading it first if it is not in the cache. years are the year columns kept
+class IndicatorCatalog:
+
+    def __init__(self, version, years, csv_path=None, snapshot_dir=None, path=None, cache=None):
+        self.version = version
+        self.years = list(years)
+        self.csv_path = csv_path
+        self.snapshot_dir = snapshot_dir
+        self.entries = {entry['ind']: entry for entry in read_catalog(path)}
+        self.cache = cache if cache is not None else LRUCache(CATALOG_SIZE)
+        self._lock = threading.Lock()
+        self._loading = {}
+
+    def __contains__(self, code):
+        return code in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    # the name of an indicator
+    def name(self, code):
+        return self.entries[code]['indicator']
+
+    def get(self, code):
+        if code not in self.entries:
+            raise KeyError(f'{code!r} is not an indicator of the framework file')
+        return self._engine(code)
+
+    # the store of an indicator of the dataset, listed in the framework file or not, None when the dataset has no row
+    # of it. The dashboards read the series they need without offering them this way, as the population
+    def store(self, code):
+        store = self._engine(code).store
+        return store if len(store.values) else None
+
+    def _engine(self, code):
+        key = (self.version, code)
+        engine = self.cache.get(key)
+        if engine is not None:
+            return engine
+
+        #the requests asking for the same indicator wait for the first one to load it
+        with self._lock:
+            lock = self._loading.setdefault(code, threading.Lock())
+        with lock:
+            if key in self.cache:
+                return self.cache.get(key)
+            engine = self._load(code)
+            self.cache.set(key, engine)
+        return engine
+
+    # the rows of an indicator with a value in at least one of the years, as a store, and the queries on it
+    def _load(self, code):
+        from esg.cleaning import drop_empty_rows
+        from esg.cube import AggregateCube
+        from esg.data import load_esg
+        from esg.index import SeriesIndex
+        from esg.mapped import open_store, save_store
+        from esg.query import QueryEngine
+        from esg.ranking import RankingIndex
+        from esg.store import CompactStore
+
+        name = f'catalog-{code}'
+        store = open_store(name, self.version, self.snapshot_dir, CATALOG_REVISION)
+        if store is None:
+            df = load_esg(columns=KEYS + self.years, csv_path=self.csv_path, snapshot_dir=self.snapshot_dir,
+                          where={'ind': [code]})
+            df = drop_empty_rows(df, self.years).drop_duplicates().reset_index(drop=True)
+            store = CompactStore.from_frame(df, KEYS, self.years)
+            try:
+                save_store(store, name, self.version, self.snapshot_dir, CATALOG_REVISION)
+                store = open_store(name, self.version, self.snapshot_dir, CATALOG_REVISION) or store
+            except OSError as e:
+                logger.warning('could not write the mapped store of %s, keeping it in memory: %s', code, e)
+
+        return QueryEngine(store, SeriesIndex(store), AggregateCube.from_store(store), RankingIndex.from_store(store),
+                           version=self.version)
+
+    def info(self):
+        return dict(self.cache.info(), indicators=len(self.entries))
@@ -0,0 +1,24 @@
+#cleaning steps shared by the dashboards. Each step looks at the whole block of year columns at once
+#instead of looping over years, indicators and rows in python.
+
+
+# return the columns of the frame which do not have a single value
+def empty_columns(df, columns):
+    has_data = df[columns].notna().any().to_numpy()
+    return [column for column, keep in zip(columns, has_data) if not keep]
+
+
+# drop the columns which do not have a single value
+def drop_empty_columns(df, columns):
+    return df.drop(columns=empty_columns(df, columns))
+
+
+# drop the year columns for which none of the given indicators has any value.
+# an indicator which has no rows in the frame counts as empty, like in the loop this replaces
+def drop_empty_years(df, years, indicators, by='ind'):
+    return df.drop(columns=empty_columns(df[df[by].isin(indicators)], years))
+
+
+# drop the rows which do not have a single value in the given columns
+def drop_empty_rows(df, columns):
+    return df[df[columns].notna().any(axis=1).to_numpy()]
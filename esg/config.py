@@ -0,0 +1,15 @@
+#paths of the files shipped with the repository, shared by the modules that read them.
+#
+#only os is imported, so the registry of the entities and the catalog find their files without loading the etl
+#(and pandas) for a path. The framework file can be changed with ESG_FRAMEWORK
+
+#import necessary libraries
+import os
+
+#the root folder of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#the framework file (pillar, group and name of every indicator) and the country table (all.csv) the etl joins the raw
+#data with; the framework file is also the catalog of esg/catalog.py and all.csv the hierarchy of esg/entities.py
+FRAMEWORK_PATH = os.environ.get('ESG_FRAMEWORK', os.path.join(ROOT, 'sovereignesg-framework_2022-12-12.csv'))
+COUNTRIES_PATH = os.path.join(ROOT, 'all.csv')
@@ -0,0 +1,123 @@
+#import necessary libraries
+import numpy as np
+import pandas as pd
+
+#the statistics kept for every (level, group, indicator, year) cell of the cube
+STATS = ('sum', 'mean', 'count', 'nonnull', 'max')
+
+#the statistic kept as well when the cube is built with weights
+WEIGHTED = 'weighted'
+
+
+# aggregation cube (level x group x indicator x year) computed once at load time.
+# a level is a grouping column such as 'sub-region' or 'continent'. The level None has a single group
+# holding every row, which gives the totals of an indicator. Sums skip NaN values like pandas does,
+# count is the number of rows of the group and nonnull the number of rows with a value for the year.
+# weights, shaped like values, adds the statistic 'weighted': the mean of the rows weighted by the weight of every
+# row for the year, such as its population (see esg/population.py), over the rows with both a value and a weight
+class AggregateCube:
+
+    def __init__(self, levels, ind_codes, indicators, values, years, weights=None):
+        self.indicators = pd.Index(indicators)
+        self.years = list(years)
+        self._groups = {}
+        self._cells = {}
+        self._weighted = weights is not None
+
+        values = np.asarray(values, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.float64) if weights is not None else None
+        ind_codes = np.asarray(ind_codes, dtype=np.int64)
+        levels = dict(levels)
+        levels[None] = (np.zeros(len(ind_codes), dtype=np.int64), pd.Index([None]))
+
+        for level, (codes, groups) in levels.items():
+            self._groups[level] = pd.Index(groups)
+            self._cells[level] = self._aggregate(np.asarray(codes, dtype=np.int64), len(groups), ind_codes, values, weights)
+
+    # sum every statistic for all groups and indicators in one pass over the value block
+    def _aggregate(self, codes, n_groups, ind_codes, values, weights=None):
+        n_indicators, n_years = len(self.indicators), len(self.years)
+        valid = (codes >= 0) & (ind_codes >= 0)
+        cell = codes[valid] * n_indicators + ind_codes[valid]
+        values = values[valid]
+        notnull = ~np.isnan(values)
+
+        sums = np.zeros((n_groups * n_indicators, n_years))
+        np.add.at(sums, cell, np.where(notnull, values, 0))
+        nonnull = np.zeros((n_groups * n_indicators, n_years), dtype=np.int64)
+        np.add.at(nonnull, cell, notnull)
+        maxima = np.full((n_groups * n_indicators, n_years), np.nan)
+        np.fmax.at(maxima, cell, values)
+        count = np.bincount(cell, minlength=n_groups * n_indicators)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(nonnull > 0, sums / nonnull, np.nan)
+
+        shape = (n_groups, n_indicators, n_years)
+        cells = {'sum': sums.reshape(shape),
+                 'mean': means.reshape(shape),
+                 'nonnull': nonnull.reshape(shape),
+                 'max': maxima.reshape(shape),
+                 'count': np.repeat(count, n_years).reshape(shape)}
+
+        if weights is not None:
+            #only the rows with both a value and a positive weight count, in the numerator and in the denominator
+            weights = weights[valid]
+            weights = np.where(notnull & (weights > 0), weights, 0)
+            weighted_sums = np.zeros((n_groups * n_indicators, n_years))
+            np.add.at(weighted_sums, cell, weights * np.where(notnull, values, 0))
+            total_weights = np.zeros((n_groups * n_indicators, n_years))
+            np.add.at(total_weights, cell, weights)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                cells[WEIGHTED] = np.where(total_weights > 0, weighted_sums / total_weights, np.nan).reshape(shape)
+        return cells
+
+    # the levels of the cube, None included, and the statistics it keeps
+    @property
+    def levels(self):
+        return list(self._groups)
+
+    @property
+    def stats(self):
+        return STATS + (WEIGHTED,) if self._weighted else STATS
+
+    # build the cube from a CompactStore (see esg/store.py)
+    @classmethod
+    def from_store(cls, store, levels=('sub-region', 'continent'), indicator='indicator', weights=None):
+        return cls({level: (store.codes(level), store.categories(level)) for level in levels},
+                   store.codes(indicator), store.categories(indicator), store.values, store.years, weights)
+
+    # build the cube from a plain wide dataframe
+    @classmethod
+    def from_frame(cls, df, levels, years, indicator='indicator'):
+        categoricals = {level: pd.Categorical(df[level]) for level in levels}
+        indicators = pd.Categorical(df[indicator])
+        return cls({level: (c.codes, c.categories) for level, c in categoricals.items()},
+                   indicators.codes, indicators.categories, df[list(years)].to_numpy(dtype=np.float64), years)
+
+    # the groups of a level that have at least one row of the indicator, with one column per year.
+    # this is what df[df[indicator] == name].groupby(level)[years].<stat>() returns
+    def frame(self, level, indicator, stat='sum'):
+        cells = self._cells[level][stat][:, self.indicators.get_loc(indicator), :]
+        present = self._cells[level]['count'][:, self.indicators.get_loc(indicator), 0] > 0
+        return pd.DataFrame(cells[present], index=self._groups[level][present].rename(level), columns=self.years)
+
+    # groups of a level against several indicators for one year, like a groupby([level, indicator]) followed by a pivot
+    def pivot(self, level, indicators, year, stat='sum'):
+        positions = [self.indicators.get_loc(indicator) for indicator in indicators]
+        column = self.years.index(year)
+        cells = self._cells[level][stat][:, positions, column]
+        count = self._cells[level]['count'][:, positions, column]
+        cells = np.where(count > 0, cells, np.nan)
+        present = (count > 0).any(axis=1)
+        return pd.DataFrame(cells[present], index=self._groups[level][present].rename(level),
+                            columns=pd.Index(list(indicators), name='indicator'))
+
+    # one statistic of the indicator over every row for all years
+    def totals(self, indicator, stat='sum'):
+        return pd.Series(self._cells[None][stat][0, self.indicators.get_loc(indicator), :], index=self.years)
+
+    # a single cell of the cube
+    def value(self, level, group, indicator, year, stat='sum'):
+        group = 0 if level is None else self._groups[level].get_loc(group)
+        return self._cells[level][stat][group, self.indicators.get_loc(indicator), self.years.index(year)]
@@ -0,0 +1,153 @@
+#import necessary libraries
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+
+from esg.config import ROOT
+
+#pandas and pyarrow are only imported when a file is read or written, so that importing this module
+#(and the dashboards, see create_app in wb_ed.py) stays cheap.
+#pyarrow is needed to write and read the parquet snapshots. Without it we fall back to reading the csv file
+HAVE_ARROW = importlib.util.find_spec('pyarrow') is not None
+
+#the df_esg.csv file produced by df_esg.ipynb and the folder where we keep the columnar snapshots of it.
+#both can be changed with environment variables so that the boxes can keep the data anywhere on disk
+CSV_PATH = os.environ.get('ESG_CSV', os.path.join(ROOT, 'df_esg.csv'))
+SNAPSHOT_DIR = os.environ.get('ESG_SNAPSHOT_DIR', os.path.join(ROOT, 'snapshots'))
+
+#bump this number when the layout of the snapshot changes so that old snapshots get rebuilt
+SNAPSHOT_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+
+# compute the sha256 of a file reading it in blocks so that we never hold the whole file in memory
+def file_hash(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# write a file through a temporary file and a rename so that a reader never sees half a file
+def _atomic_write(path, write):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _read_manifest(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        return None
+    if not os.path.exists(os.path.join(snapshot_dir, manifest['file'])):
+        return None
+    return manifest
+
+
+def _write_manifest(snapshot_dir, manifest):
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    _atomic_write(os.path.join(snapshot_dir, MANIFEST), write)
+
+
+# parse the csv file once and store it as a parquet file named after the hash of the csv content
+def build_snapshot(csv_path=None, snapshot_dir=None, sha256=None):
+    csv_path = csv_path or CSV_PATH
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    sha256 = sha256 or file_hash(csv_path)
+    stat = os.stat(csv_path)
+    name = f'df_esg-{sha256[:16]}.parquet'
+
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    _atomic_write(os.path.join(snapshot_dir, name), lambda tmp: df.to_parquet(tmp, index=False))
+
+    manifest = {'version': SNAPSHOT_VERSION,
+                'sha256': sha256,
+                'file': name,
+                'csv': os.path.abspath(csv_path),
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'rows': int(df.shape[0]),
+                'columns': list(df.columns)}
+    _write_manifest(snapshot_dir, manifest)
+
+    #remove the snapshots of older versions of the csv file
+    for old in os.listdir(snapshot_dir):
+        if old.startswith('df_esg-') and old.endswith('.parquet') and old != name:
+            os.remove(os.path.join(snapshot_dir, old))
+
+    return manifest
+
+
+# return the manifest of an up to date snapshot, building it first if needed.
+# the csv file is only hashed again when its size or modification time changed,
+# and if the csv file is not on disk at all we keep serving the snapshot we already have
+def snapshot(csv_path=None, snapshot_dir=None):
+    csv_path = csv_path or CSV_PATH
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    manifest = _read_manifest(snapshot_dir)
+
+    if not os.path.exists(csv_path):
+        if manifest is None:
+            raise FileNotFoundError(f'no snapshot in {snapshot_dir} and no csv file at {csv_path}')
+        return manifest
+
+    stat = os.stat(csv_path)
+    if manifest is not None and manifest['size'] == stat.st_size and manifest['mtime'] == stat.st_mtime:
+        return manifest
+
+    sha256 = file_hash(csv_path)
+    if manifest is not None and manifest['sha256'] == sha256:
+        #same content, only the modification time changed
+        manifest.update(size=stat.st_size, mtime=stat.st_mtime)
+        _write_manifest(snapshot_dir, manifest)
+        return manifest
+
+    return build_snapshot(csv_path, snapshot_dir, sha256)
+
+
+# load the esg dataframe from the local snapshot, reading only the requested columns.
+# where keeps the rows whose column has one of the given values, for example {'ind': ['EN.ATM.CO2E.KT']}.
+# the snapshot applies it while reading, the csv file once it is read
+def load_esg(columns=None, csv_path=None, snapshot_dir=None, where=None):
+    import pandas as pd
+
+    if not HAVE_ARROW:
+        df = pd.read_csv(csv_path or CSV_PATH, usecols=columns)
+        for column, values in (where or {}).items():
+            df = df[df[column].isin(values)].reset_index(drop=True)
+        return df[columns] if columns else df
+
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    manifest = snapshot(csv_path, snapshot_dir)
+    filters = [(column, 'in', list(values)) for column, values in where.items()] if where else None
+    return pd.read_parquet(os.path.join(snapshot_dir, manifest['file']), columns=columns, filters=filters)
+
+
+# the version of the dataset is the hash of the csv file it was built from
+def dataset_version(csv_path=None, snapshot_dir=None):
+    if not HAVE_ARROW:
+        return file_hash(csv_path or CSV_PATH)
+    return snapshot(csv_path, snapshot_dir)['sha256']
+
+
+# build the snapshot from the command line: python -m esg.data [path/to/df_esg.csv]
+if __name__ == '__main__':
+    manifest = build_snapshot(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(json.dumps(manifest, indent=2))
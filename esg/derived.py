@@ -0,0 +1,142 @@
+#metrics derived from the year columns of every series: change over a year, compound annual growth and moving means.
+#
+#a metric is computed for every row of a CompactStore (see esg/store.py) at once, with array operations over the whole
+#(row x year) block, and kept as a store with the same rows and labels as the original one, so its series are queried
+#and charted like the raw ones (see esg/query.py). A metric is only computed the first time it is asked for and the
+#QueryEngine of the most recently used ones is kept in an LRUCache (see esg/memo.py). NaN values propagate: a derived
+#value is NaN when the values it is made of are missing. A window is at most the number of years of the store
+#
+#    yoy      change from the year before, in % of the absolute value of the year before (NaN when it is 0)
+#    cagr     compound annual growth rate over window years, in %, for two positive values only
+#    rolling  mean of the values of the window years up to the year, NaN when less than half of them are known
+#
+#numpy is imported by the functions computing the metrics, so that importing this module (and the dashboards, see
+#create_app in wb_ed.py) does not load it
+
+#import necessary libraries
+import os
+import threading
+
+from esg.memo import LRUCache
+
+#how many derived metrics a worker keeps computed
+DERIVED_SIZE = int(os.environ.get('ESG_DERIVED_SIZE', 8))
+
+#the metrics and their default window in years
+METRICS = {'yoy': 1, 'cagr': 5, 'rolling': 3}
+
+
+# the value of every row window years before each year of the block, NaN when that year is not one of the years
+def _lagged(values, years, window):
+    import numpy as np
+
+    positions = {int(year): position for position, year in enumerate(years)}
+    source = np.array([positions.get(int(year) - window, -1) for year in years], dtype=np.int64)
+    lagged = values[:, np.maximum(source, 0)]
+    lagged[:, source < 0] = np.nan
+    return lagged
+
+
+def year_over_year(values, years, window=1):
+    import numpy as np
+
+    previous = _lagged(values, years, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(previous != 0, (values - previous) / np.abs(previous) * 100, np.nan)
+
+
+def compound_growth(values, years, window=5):
+    import numpy as np
+
+    start = _lagged(values, years, window)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where((values > 0) & (start > 0), (np.power(values / start, 1 / window) - 1) * 100, np.nan)
+
+
+# the sums and counts of the known values of a window are differences of cumulative sums over every year from the
+# first to the last of the store, so the cost does not depend on the window
+def rolling_mean(values, years, window=3):
+    import numpy as np
+
+    span = np.array([int(year) for year in years], dtype=np.int64)
+    span -= span.min()
+    full = np.full((values.shape[0], span.max() + 1), np.nan)
+    full[:, span] = values
+    known = ~np.isnan(full)
+
+    #a leading column of zeros, so that the window ending at column end sums the columns start to end
+    sums = np.zeros((full.shape[0], full.shape[1] + 1))
+    np.cumsum(np.where(known, full, 0), axis=1, out=sums[:, 1:])
+    counts = np.zeros(sums.shape, dtype=np.int64)
+    np.cumsum(known, axis=1, out=counts[:, 1:])
+
+    end = span + 1
+    start = np.maximum(end - window, 0)
+    sums = sums[:, end] - sums[:, start]
+    counts = counts[:, end] - counts[:, start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts * 2 >= window, sums / counts, np.nan)
+
+
+_FUNCTIONS = {'yoy': year_over_year, 'cagr': compound_growth, 'rolling': rolling_mean}
+
+
+# the derived metrics of a store for one version of the dataset. get(metric, window) returns the QueryEngine of a
+# metric, computing it first if it is not in the cache
+class DerivedMetrics:
+
+    def __init__(self, store, version=None, cache=None):
+        self.store = store
+        self.version = version
+        self.cache = cache if cache is not None else LRUCache(DERIVED_SIZE)
+        self._lock = threading.Lock()
+        self._computing = {}
+
+    # the metric and its window, checked: a window longer than the years of the store gives only NaN
+    def key(self, metric, window=None):
+        if metric not in METRICS:
+            raise KeyError(f'unknown metric {metric!r}, expected one of {list(METRICS)}')
+        message = f'the window is a number of years from 1 to {len(self.store.years)}'
+        try:
+            window = METRICS[metric] if window is None else int(window)
+        except (TypeError, ValueError):
+            raise ValueError(message)
+        if not 1 <= window <= len(self.store.years):
+            raise ValueError(message)
+        return metric, window
+
+    def get(self, metric, window=None):
+        metric, window = self.key(metric, window)
+        key = (self.version, metric, window)
+        engine = self.cache.get(key)
+        if engine is not None:
+            return engine
+
+        #the requests asking for the same metric wait for the first one to compute it
+        with self._lock:
+            lock = self._computing.setdefault((metric, window), threading.Lock())
+        with lock:
+            if key in self.cache:
+                return self.cache.get(key)
+            engine = self._compute(metric, window)
+            self.cache.set(key, engine)
+        return engine
+
+    # the store of a metric with the structures the queries run on
+    def _compute(self, metric, window):
+        import numpy as np
+
+        from esg.cube import AggregateCube
+        from esg.index import SeriesIndex
+        from esg.query import QueryEngine
+        from esg.ranking import RankingIndex
+        from esg.store import CompactStore
+
+        values = _FUNCTIONS[metric](np.asarray(self.store.values, dtype=np.float64), self.store.years, window)
+        store = CompactStore(self.store.keys, np.ascontiguousarray(values, dtype=np.float32), self.store.years,
+                             self.store.columns, self.store.index)
+        return QueryEngine(store, SeriesIndex(store), AggregateCube.from_store(store), RankingIndex.from_store(store),
+                           version=(self.version, metric, window))
+
+    def info(self):
+        return dict(self.cache.info(), metrics=list(METRICS))
@@ -0,0 +1,118 @@
+#registry of the entities of the dashboards: the countries, their sub-regions and their continents.
+#
+#the hierarchy (country -> sub-region -> continent) is read from all.csv, the country table the etl joins df_esg
+#with (see esg/etl.py). Every entity gets an integer code within its level, in alphabetical order, and the parent of
+#every entity is kept as an array of codes, so the level, the parent and the children of a name are dictionary or
+#array lookups and the rows of a store are rolled up to a level with a single gather. The sorted dropdown options of
+#every level are built once
+
+#import necessary libraries
+import csv
+
+import numpy as np
+import pandas as pd
+
+from esg.config import COUNTRIES_PATH
+
+#the levels from the finest to the coarsest. A name found at several levels belongs to the finest
+LEVELS = ('country', 'sub-region', 'continent')
+
+
+# the (country, sub-region, continent) rows of all.csv, without the countries that have no name
+def read_hierarchy(path=None):
+    with open(path or COUNTRIES_PATH, encoding='utf-8-sig', newline='') as f:
+        return [(row['name'], row['sub-region'] or None, row['region'] or None)
+                for row in csv.DictReader(f) if row['name']]
+
+
+# the entities of a list of (country, sub-region, continent) rows. A country listed twice keeps its first parents
+class EntityRegistry:
+
+    def __init__(self, rows):
+        rows = list({row[0]: row for row in reversed(list(rows))}.values())
+        self._names = {level: pd.Index(sorted({row[depth] for row in rows if row[depth] is not None}), name=level)
+                       for depth, level in enumerate(LEVELS)}
+
+        #the code of the parent of every entity of a level, -1 when it has none
+        self._parents = {}
+        for depth, level in enumerate(LEVELS[:-1]):
+            parents = {row[depth]: row[depth + 1] for row in rows if row[depth] is not None}
+            codes = self._names[LEVELS[depth + 1]].get_indexer([parents[name] for name in self._names[level]])
+            self._parents[level] = codes.astype(np.int64)
+
+        self._levels = {}
+        for level in reversed(LEVELS):
+            self._levels.update(dict.fromkeys(self._names[level], level))
+
+        self._children = {}
+        for level, parents in self._parents.items():
+            coarser = LEVELS[LEVELS.index(level) + 1]
+            order = np.argsort(parents, kind='stable')
+            bounds = np.searchsorted(parents[order], np.arange(len(self._names[coarser]) + 1))
+            self._children[coarser] = [tuple(self._names[level][order[start:end]])
+                                       for start, end in zip(bounds[:-1], bounds[1:])]
+
+        self._options = {level: [{'label': name, 'value': name} for name in names] for level, names in self._names.items()}
+
+    # the registry of the countries of a CompactStore (see esg/store.py), with their sub-region and continent as in
+    # all.csv. The countries all.csv does not know keep the sub-region and continent of their rows in the store
+    @classmethod
+    def from_store(cls, store, path=None):
+        known = {row[0]: row for row in read_hierarchy(path)}
+        countries, first = np.unique(store.codes('country'), return_index=True)
+        names = store.categories('country')[countries[countries >= 0]]
+        first = first[countries >= 0]
+        rows = []
+        for name, row in zip(names, first):
+            if name in known:
+                rows.append(known[name])
+            else:
+                rows.append((name,) + tuple(cls._label(store, level, row) for level in LEVELS[1:]))
+        return cls(rows)
+
+    @staticmethod
+    def _label(store, level, row):
+        code = store.codes(level)[row]
+        return store.categories(level)[code] if code >= 0 else None
+
+    def __contains__(self, name):
+        return name in self._levels
+
+    # the finest level of a name, None when it is not an entity
+    def level(self, name):
+        return self._levels.get(name)
+
+    # the names of a level in alphabetical order; the position of a name is its code
+    def names(self, level):
+        return self._names[level]
+
+    def code(self, level, name):
+        return self._names[level].get_loc(name)
+
+    # the sub-region of a country or the continent of a sub-region, None for a continent or an entity without one
+    def parent(self, name):
+        level = self._levels[name]
+        if level not in self._parents:
+            return None
+        code = self._parents[level][self.code(level, name)]
+        return self._names[LEVELS[LEVELS.index(level) + 1]][code] if code >= 0 else None
+
+    # the countries of a sub-region or the sub-regions of a continent, in alphabetical order
+    def children(self, name):
+        level = self._levels[name]
+        if level not in self._children:
+            return ()
+        return self._children[level][self.code(level, name)]
+
+    # the options of the dropdown of a level, shared by all calls so they must not be modified
+    def options(self, level):
+        return self._options.get(level)
+
+    # the code at a level of the entity of every row of a store and the names of the codes, for the roll ups of the
+    # aggregate cube (see esg/cube.py). The country codes of the rows are followed up the parent arrays
+    def row_codes(self, store, level):
+        codes = self._names['country'].get_indexer(store.categories('country'))[store.codes('country')]
+        codes[store.codes('country') < 0] = -1
+        for finer in LEVELS[:LEVELS.index(level)]:
+            codes = np.where(codes >= 0, self._parents[finer][np.maximum(codes, 0)], -1)
+        return codes, self._names[level]
@@ -0,0 +1,253 @@
+#etl turning the raw data file of the world bank sovereign esg release into df_esg.csv, the way df_esg.ipynb does:
+#the indicators are joined with the framework file (pillar, group, indicator) and the countries with all.csv
+#(country, continent, sub-region), rows of undefined indicators or unknown countries are dropped and the values
+#are rounded to two decimals. The total population (SP.POP.TOTL) is kept as well although the framework file does not
+#list it, as it weights the per capita indicators of the regions (see esg/population.py).
+#
+#    python -m esg.etl sovereignesg-data_2022-12-12.csv [-o df_esg.csv] [--chunksize 20000]
+#    python -m esg.etl sovereignesg-data_*.csv [--output-dir releases] [--jobs 8]
+#
+#the raw file is read in chunks and every chunk is joined against the two small lookup tables and appended to
+#the output, so the memory used depends on the chunk size and not on the size of the release.
+#
+#with several releases (or --output-dir / --jobs) every release is split into byte ranges of whole lines, about one
+#per worker, and the partitions run in a process pool. Every line of the raw file is parsed by a single partition
+#and the partitions of a release follow each other in the raw file, so they are concatenated in their order and
+#numbered again: the result is the same file as a single process would write, stored as df_esg_YYYY-MM-DD.csv in the
+#output directory
+
+#import necessary libraries
+import argparse
+import io
+import os
+import re
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from esg.config import COUNTRIES_PATH, FRAMEWORK_PATH, ROOT
+from esg.data import CSV_PATH
+from esg.population import POPULATION
+
+#where the parallel mode writes one df_esg file per release
+RELEASES_DIR = os.path.join(ROOT, 'releases')
+
+#number of rows of the raw file read at a time
+CHUNKSIZE = 20000
+
+#the indicators kept although the framework file does not list them, with their pillar, group and complete name
+EXTRA_INDICATORS = [{'ind': POPULATION, 'pillar': 'Social', 'group': 'Demography', 'indicator': 'Population, total'}]
+
+
+# the framework table: one row per indicator with its pillar, group and complete name.
+# indicators without a pillar are left out, so that an inner join drops them as the notebook does. The extra
+# indicators the framework file does not list follow its own
+def read_framework(path=None):
+    framework = pd.read_csv(path or FRAMEWORK_PATH)
+    framework = framework[['ind', 'pillar', 'group', 'indicator']]
+    undefined = framework.loc[framework['pillar'].isna(), 'ind']
+    framework = framework[framework['ind'].notna() & ~framework['ind'].isin(undefined)]
+    extra = pd.DataFrame([entry for entry in EXTRA_INDICATORS if entry['ind'] not in set(framework['ind'])],
+                         columns=framework.columns)
+    return pd.concat([framework, extra], ignore_index=True)
+
+
+# the country table of all.csv renamed to the columns of df_esg, without the codes that have no name
+def read_countries(path=None):
+    countries = pd.read_csv(path or COUNTRIES_PATH)
+    countries = countries.rename(columns={'alpha-3': 'iso3', 'region': 'continent', 'name': 'country'})
+    countries = countries[['country', 'iso3', 'continent', 'sub-region']]
+    return countries[countries['country'].notna()]
+
+
+# the year columns of the raw file, read from its header
+def year_columns(path):
+    return [column for column in pd.read_csv(path, nrows=0).columns if column.isdigit()]
+
+
+# clean one chunk of the raw file: join it with the lookup tables and round the values.
+# the inner joins keep the order of the chunk, so the chunks give the same rows in the same order as the whole file
+def transform(chunk, framework, countries, years):
+    chunk = chunk.merge(framework, on='ind', how='inner')
+    chunk = chunk.merge(countries, on='iso3', how='inner')
+    chunk[years] = chunk[years].round(2)
+    return chunk
+
+
+# the lines of a byte range of a file, read as a file of their own
+class _ByteRange(io.RawIOBase):
+
+    def __init__(self, path, start, end):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._left = end - start
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        size = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._left)])
+        self._left -= size
+        return size
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+# stream the raw file, or the lines of the byte range start to end of it, into a csv file and return the number of
+# rows written. The first column of the output is the running row number, as written by DataFrame.to_csv in the
+# notebook. The output is written to a temporary file renamed at the end, so readers never see half a file
+def _stream(raw_path, out_path, framework, countries, chunksize, start=None, end=None):
+    years = year_columns(raw_path)
+
+    #'..' marks the missing values of the world bank files. Parsing it as NaN keeps the year columns numeric
+    options = dict(usecols=['iso3', 'ind'] + years, na_values=['..'], dtype={year: 'float64' for year in years},
+                   chunksize=chunksize)
+    if start is None:
+        source = raw_path
+    else:
+        source = io.TextIOWrapper(io.BufferedReader(_ByteRange(raw_path, start, end)), encoding='utf-8', newline='')
+        options.update(header=None, names=list(pd.read_csv(raw_path, nrows=0).columns))
+
+    tmp = f'{out_path}.{uuid.uuid4().hex}.tmp'
+    rows = 0
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as f, pd.read_csv(source, **options) as chunks:
+            for chunk in chunks:
+                chunk = transform(chunk[['iso3', 'ind'] + years], framework, countries, years)
+                chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+                chunk.to_csv(f, header=f.tell() == 0)
+                rows += len(chunk)
+        os.replace(tmp, out_path)
+    finally:
+        if start is not None:
+            source.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return rows
+
+
+# build df_esg.csv from one raw file and return the number of rows written
+def run(raw_path, out_path=None, framework_path=None, countries_path=None, chunksize=CHUNKSIZE):
+    return _stream(raw_path, out_path or CSV_PATH, read_framework(framework_path), read_countries(countries_path), chunksize)
+
+
+# the date of a release, taken from the name of its file (sovereignesg-data_YYYY-MM-DD.csv)
+def release_name(raw_path):
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(raw_path))
+    return match.group(1) if match else os.path.splitext(os.path.basename(raw_path))[0]
+
+
+# the byte ranges of the partitions of a raw file: after the header, about parts ranges of the same size, each of
+# them ending at the end of a line, none for a file without rows. The values of the raw files hold no line breaks, so a line is a row
+def byte_ranges(raw_path, parts):
+    size = os.path.getsize(raw_path)
+    with open(raw_path, 'rb') as f:
+        f.readline()
+        first = f.tell()
+        bounds = [first]
+        for part in range(1, parts):
+            f.seek(max(first + (size - first) * part // parts - 1, bounds[-1]))
+            f.readline()
+            if f.tell() > bounds[-1]:
+                bounds.append(min(f.tell(), size))
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# one partition of the parallel mode: the rows of a byte range of a release.
+# it runs in a worker process and returns its timing
+def run_partition(raw_path, part, start, end, out_path, framework_path=None, countries_path=None, chunksize=CHUNKSIZE):
+    began = time.perf_counter()
+    rows = _stream(raw_path, out_path, read_framework(framework_path), read_countries(countries_path), chunksize, start, end)
+    return {'release': release_name(raw_path), 'partition': f'part {part + 1}', 'bytes': end - start, 'rows': rows,
+            'seconds': time.perf_counter() - began}
+
+
+# concatenate the partition files of a release in their order, with a single header, and number the rows again.
+# the files are read line by line, so the merge does not hold the partitions in memory either
+def merge_partitions(release, paths, out_path):
+    began = time.perf_counter()
+    tmp = f'{out_path}.{uuid.uuid4().hex}.tmp'
+    rows = 0
+    try:
+        with open(tmp, 'w', encoding='utf-8', newline='') as out:
+            for path in paths:
+                with open(path, encoding='utf-8', newline='') as f:
+                    header = f.readline()
+                    if header and out.tell() == 0:
+                        out.write(header)
+                    for line in f:
+                        out.write(f"{rows},{line.split(',', 1)[1]}")
+                        rows += 1
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return {'release': release, 'partition': 'merge', 'rows': rows, 'seconds': time.perf_counter() - began}
+
+
+# build df_esg_<release>.csv in out_dir for every raw file, splitting every release into byte ranges over a process
+# pool (one range per worker). Returns the timings of the partitions and of the merges, sorted by release
+def run_releases(raw_paths, out_dir=None, framework_path=None, countries_path=None, chunksize=CHUNKSIZE, jobs=None):
+    out_dir = out_dir or RELEASES_DIR
+    os.makedirs(out_dir, exist_ok=True)
+    parts = jobs or os.cpu_count() or 1
+    releases = sorted(raw_paths, key=release_name)
+
+    work_dir = os.path.join(out_dir, f'.partitions-{uuid.uuid4().hex}')
+    os.makedirs(work_dir)
+    try:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            partitions = {}
+            for raw_path in releases:
+                partitions[raw_path] = []
+                for part, (start, end) in enumerate(byte_ranges(raw_path, parts)):
+                    path = os.path.join(work_dir, f'{release_name(raw_path)}-{part}.csv')
+                    partitions[raw_path].append((path, pool.submit(run_partition, raw_path, part, start, end, path,
+                                                                   framework_path, countries_path, chunksize)))
+            timings = [future.result() for raw_path in releases for _, future in partitions[raw_path]]
+
+            merges = [pool.submit(merge_partitions, release_name(raw_path), [path for path, _ in partitions[raw_path]],
+                                  os.path.join(out_dir, f'df_esg_{release_name(raw_path)}.csv'))
+                      for raw_path in releases]
+            timings += [future.result() for future in merges]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return sorted(timings, key=lambda timing: (timing['release'], timing['partition'] == 'merge'))
+
+
+# print the timings of run_releases as a table
+def print_summary(timings, wall, file=sys.stderr):
+    print(f"{'release':<14}{'partition':<14}{'rows':>10}{'seconds':>10}", file=file)
+    for timing in timings:
+        print(f"{timing['release']:<14}{timing['partition']:<14}{timing['rows']:>10}{timing['seconds']:>10.2f}", file=file)
+    busy = sum(timing['seconds'] for timing in timings)
+    print(f'{len(timings)} tasks, {busy:.1f}s of work in {wall:.1f}s of wall time', file=file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='build df_esg.csv from raw sovereign esg data files')
+    parser.add_argument('raw', nargs='+', help='path of sovereignesg-data_YYYY-MM-DD.csv, several paths for the parallel mode')
+    parser.add_argument('-o', '--output', default=CSV_PATH, help='path of the output csv of a single release (default: %(default)s)')
+    parser.add_argument('--output-dir', help=f'folder of the df_esg_YYYY-MM-DD.csv files of the parallel mode (default: {RELEASES_DIR})')
+    parser.add_argument('--jobs', type=int, help='worker processes of the parallel mode (default: number of cores)')
+    parser.add_argument('--framework', default=FRAMEWORK_PATH, help='path of the framework file')
+    parser.add_argument('--countries', default=COUNTRIES_PATH, help='path of all.csv')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='rows read at a time')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if len(args.raw) > 1 or args.output_dir or args.jobs:
+        timings = run_releases(args.raw, args.output_dir, args.framework, args.countries, args.chunksize, args.jobs)
+        print_summary(timings, time.perf_counter() - start)
+    else:
+        rows = run(args.raw[0], args.output, args.framework, args.countries, args.chunksize)
+        print(f'{rows} rows written to {args.output} in {time.perf_counter() - start:.1f}s', file=sys.stderr)
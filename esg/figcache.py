@@ -0,0 +1,186 @@
+#import necessary libraries
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+
+from esg.data import ROOT
+
+#fcntl is only available on unix. Without it the eviction of one process can overlap with another one,
+#which only means that a few more files than needed get removed
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#where the figures are stored and how much disk space they can take
+CACHE_DIR = os.environ.get('ESG_FIGURE_CACHE', os.path.join(ROOT, 'cache', 'figures'))
+CACHE_MB = int(os.environ.get('ESG_FIGURE_CACHE_MB', 256))
+
+logger = logging.getLogger(__name__)
+
+#bump this number when the way the figures are stored changes, so that the cached figures get built again
+FIGURE_REVISION = 1
+
+
+# the revision of the code building the figures, part of the key of every stored figure: FIGURE_REVISION and a hash
+# of the source of the esg package and of the given modules (the dashboard of the callback). The cache outlives the
+# deploys, so a deploy changing the code of the views or of the figures never serves the figures of the old code
+@functools.lru_cache(maxsize=None)
+def code_revision(*paths):
+    package = os.path.dirname(os.path.abspath(__file__))
+    sources = sorted(os.path.join(package, name) for name in os.listdir(package) if name.endswith('.py'))
+    digest = hashlib.sha256(str(FIGURE_REVISION).encode('utf-8'))
+    for path in sources + sorted(paths):
+        try:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        except OSError:
+            digest.update(path.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+# cache of serialized callback results kept as json files on the local disk, so that every worker process
+# of the host reads what any of them computed. A file is written to a temporary name and renamed in place,
+# so readers never see half a file. When the folder grows beyond max_bytes the least recently used files
+# (by modification time, which is refreshed on every hit) are removed until it is back to 80% of max_bytes.
+# the folder is only created by the first set, so importing the dashboards writes nothing to the disk. The cache is
+# best effort: a file that cannot be written is logged and skipped and the callback still returns its result
+class FigureCache:
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else CACHE_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], digest + '.json')
+
+    # the json text stored for the key or None
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        #the file can be evicted by another worker in between: the data read is still served
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def set(self, key, data):
+        path = self._path(key)
+        tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning('could not store a figure in %s: %s', self.directory, e)
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+
+        # look at the size of the folder again once we wrote a tenth of the limit since the last check
+        with self._lock:
+            self._written += len(data)
+            check = self._written > self.max_bytes // 10
+            if check:
+                self._written = 0
+        if check:
+            try:
+                self.evict()
+            except OSError as e:
+                logger.warning('could not evict figures from %s: %s', self.directory, e)
+
+    # the (mtime, size, path) of every stored file, none while nothing was stored
+    def _files(self):
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            try:
+                entries = list(os.scandir(folder.path))
+            except OSError:
+                continue
+            for entry in entries:
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    # remove the least recently used files until the folder is below 80% of the limit
+    def evict(self):
+        if not os.path.isdir(self.directory):
+            return
+        lock = open(os.path.join(self.directory, '.lock'), 'w')
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            files = self._files()
+            total = sum(size for _, size, _ in files)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(files):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                total -= size
+                if total <= self.max_bytes * 0.8:
+                    break
+        finally:
+            lock.close()
+
+    def info(self):
+        files = self._files()
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'files': len(files),
+                    'bytes': sum(size for _, size, _ in files), 'max_bytes': self.max_bytes}
+
+    # decorator which stores the serialized result of a callback, keyed by its name, the revision of the code of its
+    # module and of the esg package, the version of the dataset and its arguments. On a hit the json is returned
+    # parsed, which Dash sends as it is. A file that is not valid json is computed and stored again
+    def memoize(self, name, version=None):
+        def decorator(func):
+            revision = code_revision(func.__code__.co_filename)
+
+            @functools.wraps(func)
+            def wrapper(*args):
+                key = (name, revision, version() if callable(version) else version, args)
+                data = self.get(key)
+                if data is not None:
+                    try:
+                        return json.loads(data)
+                    except ValueError:
+                        logger.warning('the stored figure of %s%r is not valid json, computing it again', name, args)
+                #plotly is only imported when a result is stored, so that importing the dashboards does not load it
+                from plotly.io.json import to_json_plotly
+
+                result = func(*args)
+                self.set(key, to_json_plotly(result))
+                return result
+            return wrapper
+        return decorator
@@ -0,0 +1,93 @@
+#figures of the wb_ed dashboard built with plotly.graph_objects from plain arrays.
+#
+#the look shared by every figure (black background, white font, centred title, light green bars) is a plotly
+#template registered once as 'esg_dark', so a figure only carries its data, its titles and its axis ranges.
+#the builders write the traces the way plotly.express did (hover texts, legend titles, stacked bars), without
+#its handling of dataframes and arguments, which took most of the time of a callback on these small tables
+
+#import necessary libraries
+import plotly.graph_objects as go
+import plotly.io as pio
+
+TEMPLATE = 'esg_dark'
+
+LIGHT_GREEN = '#7FFF00'  # HEX color code for light green
+
+#number of points above which the lines are drawn with webgl
+WEBGL_POINTS = 1000
+
+
+#the parts of the default plotly template that bar and line charts on cartesian axes use. The rest (3d scenes,
+#maps, polar charts, colorscales) would be validated and sent to the browser with every figure for nothing
+LAYOUT_KEYS = ['autotypenumbers', 'colorway', 'font', 'hovermode', 'hoverlabel', 'paper_bgcolor', 'plot_bgcolor',
+               'xaxis', 'yaxis', 'shapedefaults', 'annotationdefaults', 'title']
+TRACE_TYPES = ['bar', 'scatter', 'scattergl']
+
+
+# the default plotly template with the colors of the dashboard
+def _template():
+    plotly = pio.templates['plotly'].to_plotly_json()
+    template = go.layout.Template(layout={key: plotly['layout'][key] for key in LAYOUT_KEYS},
+                                  data={kind: plotly['data'][kind] for kind in TRACE_TYPES})
+    template.layout.update(plot_bgcolor='black', paper_bgcolor='black', font={'color': 'white'},
+                           title={'x': 0.5}, margin={'t': 60}, legend={'tracegroupgap': 0})
+    template.data.bar[0].marker.color = LIGHT_GREEN
+    return template
+
+
+pio.templates[TEMPLATE] = _template()
+
+
+# the x axis of the figures over all years: one tick per year and half a year of space on both sides
+def year_axis(years):
+    first, last = min(years), max(years)
+    return {'range': [first - 0.5, last + 0.5], 'tickmode': 'linear', 'tick0': first, 'dtick': 1, 'tickangle': 45}
+
+
+def _figure(traces, title, xlabel, ylabel, xaxis=None, yaxis=None, **layout):
+    xaxis = dict(xaxis or {}, title={'text': xlabel})
+    yaxis = dict(yaxis or {}, title=dict((yaxis or {}).get('title', {}), text=ylabel))
+    if not isinstance(title, dict):
+        title = {'text': title}
+    #the layout is passed as a dict so that the template is only validated once
+    return go.Figure(traces, dict(layout, template=TEMPLATE, title=title, xaxis=xaxis, yaxis=yaxis))
+
+
+def _hover(xlabel, ylabel, legend_title=None, name=None):
+    prefix = f'{legend_title}={name}<br>' if legend_title is not None else ''
+    return f'{prefix}{xlabel}=%{{x}}<br>{ylabel}=%{{y}}<extra></extra>'
+
+
+# bar chart of one series
+def bar(x, y, title, xlabel, ylabel, xaxis=None, yaxis=None, **layout):
+    trace = go.Bar(x=x, y=y, hovertemplate=_hover(xlabel, ylabel))
+    return _figure([trace], title, xlabel, ylabel, xaxis, yaxis, **layout)
+
+
+# bar chart of several series stacked on each other. series maps the name of every series to its values
+# and colors the name to the color of its bars
+def stacked_bars(x, series, title, xlabel, ylabel, colors=None, legend_title='variable', xaxis=None, yaxis=None, **layout):
+    colors = colors or {}
+    traces = [go.Bar(x=x, y=y, name=name, marker={'color': colors.get(name, LIGHT_GREEN)},
+                     hovertemplate=_hover(xlabel, ylabel, legend_title, name))
+              for name, y in series.items()]
+    legend = dict(layout.pop('legend', {}), title={'text': legend_title})
+    return _figure(traces, title, xlabel, ylabel, xaxis, yaxis, barmode='relative', legend=legend, **layout)
+
+
+# line chart with markers of one series
+def line(x, y, title, xlabel, ylabel, marker_color=None, xaxis=None, yaxis=None, **layout):
+    trace = go.Scatter(x=x, y=y, mode='lines+markers', marker={'color': marker_color},
+                       hovertemplate=_hover(xlabel, ylabel))
+    return _figure([trace], title, xlabel, ylabel, xaxis, yaxis, **layout)
+
+
+# line chart with markers of several series, one line per entry of series (name: values).
+# as with plotly.express, charts of more than WEBGL_POINTS points are drawn with webgl
+def lines(x, series, title, xlabel, ylabel, legend_title='variable', marker_color=None, xaxis=None, yaxis=None, **layout):
+    scatter = go.Scattergl if len(x) * len(series) > WEBGL_POINTS else go.Scatter
+    traces = [scatter(x=x, y=y, name=name, mode='lines+markers', marker={'color': marker_color},
+                      hovertemplate=_hover(xlabel, ylabel, legend_title, name))
+              for name, y in series.items()]
+    legend = dict(layout.pop('legend', {}), title={'text': legend_title})
+    return _figure(traces, title, xlabel, ylabel, xaxis, yaxis, legend=legend, **layout)
@@ -0,0 +1,66 @@
+#import necessary libraries
+import numpy as np
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+# index of a CompactStore (see esg/store.py) built once at load time.
+# it maps (scope, entity, indicator) to the positions of the matching rows, where the scope is
+# 'country', 'sub-region' or 'continent' and the entity one of its values. The scope None with the entity None
+# covers every row of an indicator. A lookup costs a dictionary access and the rows it returns,
+# instead of a boolean mask over the whole dataframe. codes maps a scope to the (codes, names) of the entity of every
+# row, as EntityRegistry.row_codes returns them (see esg/entities.py), in place of the labels of the store
+class SeriesIndex:
+
+    def __init__(self, store, scopes=('country', 'sub-region', 'continent'), indicator='indicator', codes=None):
+        self.store = store
+        self.scopes = tuple(scopes)
+        self._rows = {}
+
+        ind_codes = store.codes(indicator).astype(np.int64)
+        indicators = store.categories(indicator)
+
+        self._add(None, np.zeros(len(ind_codes), dtype=np.int64), [None], ind_codes, indicators)
+        codes = codes or {}
+        for scope in self.scopes:
+            scope_codes, entities = codes.get(scope) or (store.codes(scope), store.categories(scope))
+            self._add(scope, np.asarray(scope_codes).astype(np.int64), entities, ind_codes, indicators)
+
+    # group the rows by (entity, indicator) with one stable sort so that every group keeps the order of the store
+    def _add(self, scope, codes, entities, ind_codes, indicators):
+        valid = np.flatnonzero((codes >= 0) & (ind_codes >= 0))
+        if len(valid) == 0:
+            return
+        key = codes[valid] * len(indicators) + ind_codes[valid]
+        order = np.argsort(key, kind='stable')
+        rows, key = valid[order], key[order]
+
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+        stops = np.r_[starts[1:], len(key)]
+        for start, stop in zip(starts, stops):
+            entity, indicator = divmod(int(key[start]), len(indicators))
+            self._rows[(scope, entities[entity], indicators[indicator])] = rows[start:stop]
+
+    # positions of the rows for one indicator or a list of indicators, in the order of the store
+    def rows(self, scope, entity, indicators):
+        if isinstance(indicators, str):
+            return self._rows.get((scope, entity, indicators), _EMPTY)
+        parts = [self._rows.get((scope, entity, indicator), _EMPTY) for indicator in indicators]
+        return np.sort(np.concatenate(parts))
+
+    # the matching rows of the wide dataframe, as the boolean mask on the same columns would return them
+    def take(self, scope, entity, indicators, columns=None):
+        frame = self.store.frame.iloc[self.rows(scope, entity, indicators)]
+        return frame if columns is None else frame[columns]
+
+    # the year values of the matching rows, one row per entity
+    def values(self, scope, entity, indicators):
+        return self.store.values[self.rows(scope, entity, indicators)]
+
+    # the year array of a single (entity, indicator) pair or None if there is no such row
+    def series(self, scope, entity, indicator):
+        rows = self.rows(scope, entity, indicator)
+        return self.store.values[rows[0]] if len(rows) else None
+
+    def __contains__(self, key):
+        return key in self._rows
@@ -0,0 +1,91 @@
+#import necessary libraries
+import json
+import os
+import shutil
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from esg.data import SNAPSHOT_DIR
+from esg.store import CompactStore
+
+#bump this number when the layout of the files changes so that old ones get rebuilt
+MAPPED_VERSION = 1
+
+LABELS = 'labels.json'
+
+
+# folder of the mapped store called name for a version of the dataset, for example snapshots/wb_ed-<sha256[:16]>
+def store_dir(name, version, snapshot_dir=None):
+    return os.path.join(snapshot_dir or SNAPSHOT_DIR, f'{name}-{version[:16]}')
+
+
+# write a CompactStore as plain .npy files: the float32 values (one row per (entity, indicator) pair, one column
+# per year), the integer codes of every key column and the row index, plus a small json file with the labels.
+# revision is bumped by the caller when the way it builds the store changes, so that old files are not used.
+# the files are written in a temporary folder renamed at the end, and the folders of older versions are removed
+def save_store(store, name, version, snapshot_dir=None, revision=0):
+    path = store_dir(name, version, snapshot_dir)
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    os.makedirs(tmp)
+    try:
+        np.save(os.path.join(tmp, 'values.npy'), np.ascontiguousarray(store.values, dtype=np.float32))
+        for position, column in enumerate(store.keys):
+            np.save(os.path.join(tmp, f'codes-{position}.npy'), store.codes(column))
+
+        # a default index is not written, it is rebuilt as a RangeIndex
+        index = store.index
+        default = isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1
+        if not default:
+            np.save(os.path.join(tmp, 'index.npy'), index.to_numpy())
+
+        labels = {'version': MAPPED_VERSION, 'revision': revision, 'dataset': version, 'years': store.years, 'columns': store.columns,
+                  'keys': {column: list(store.categories(column)) for column in store.keys},
+                  'default_index': default, 'index_name': index.name}
+        with open(os.path.join(tmp, LABELS), 'w') as f:
+            json.dump(labels, f)
+
+        #files of an older revision are replaced. If another worker wrote the same revision first we keep its files
+        if os.path.exists(path) and open_store(name, version, snapshot_dir, revision) is None:
+            shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            pass
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    prefix = f'{name}-'
+    for old in os.listdir(parent):
+        if old.startswith(prefix) and os.path.join(parent, old) != path and not old.endswith('.tmp'):
+            shutil.rmtree(os.path.join(parent, old), ignore_errors=True)
+    return path
+
+
+# open a mapped store read only or return None if it was not written for this version of the dataset.
+# the arrays are memory mapped, so every worker of the host reads the same pages of the os page cache
+# and opening the store takes the same time whatever the size of the dataset
+def open_store(name, version, snapshot_dir=None, revision=0):
+    path = store_dir(name, version, snapshot_dir)
+    try:
+        with open(os.path.join(path, LABELS)) as f:
+            labels = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if labels.get('version') != MAPPED_VERSION or labels.get('revision') != revision or labels.get('dataset') != version:
+        return None
+
+    values = np.load(os.path.join(path, 'values.npy'), mmap_mode='r')
+    keys = {}
+    for position, (column, categories) in enumerate(labels['keys'].items()):
+        codes = np.load(os.path.join(path, f'codes-{position}.npy'), mmap_mode='r')
+        keys[column] = pd.Categorical.from_codes(codes, categories=pd.Index(categories, dtype=object))
+
+    if labels['default_index']:
+        index = pd.RangeIndex(values.shape[0], name=labels['index_name'])
+    else:
+        index = pd.Index(np.load(os.path.join(path, 'index.npy'), mmap_mode='r'), name=labels['index_name'])
+    return CompactStore(keys, values, labels['years'], labels['columns'], index)
@@ -0,0 +1,77 @@
+#import necessary libraries
+import functools
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+# a thread safe dictionary with a maximum size which evicts the least recently used entry when it is full.
+# it counts the hits, the misses and the evictions so that we can see how well it works
+class LRUCache:
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def info(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'size': len(self._data), 'maxsize': self.maxsize}
+
+    def __len__(self):
+        return len(self._data)
+
+    # whether the key is cached, without counting a hit or a miss nor refreshing the entry
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+
+# decorator which keeps the results of a function in an LRUCache.
+# the key is made of the version of the dataset and the arguments of the call, so a new dataset never
+# returns results of the old one. version can be a value or a function returning it
+def memoize(maxsize=256, version=None):
+    def decorator(func):
+        cache = LRUCache(maxsize)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (version() if callable(version) else version, args, tuple(sorted(kwargs.items())))
+            result = cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = func(*args, **kwargs)
+                cache.set(key, result)
+            return result
+
+        wrapper.cache = cache
+        wrapper.cache_info = cache.info
+        wrapper.cache_clear = cache.clear
+        return wrapper
+    return decorator
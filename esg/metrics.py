@@ -0,0 +1,216 @@
+#latency metrics of the dash callbacks in the prometheus text format.
+#
+#every instrumented callback records its duration labelled by callback and branch, and the split of that time
+#in three phases: 'figure' (the calls building the figures), 'selection' (everything else the callback does) and
+#'serialization' (what the flask request takes after the callback returned, mostly turning the result into json).
+#register_metrics(app.server) adds the /metrics endpoint that prometheus scrapes.
+#startup_phase times and logs the phases of the start of a dashboard (imports, data loading, ...)
+
+#import necessary libraries
+import contextlib
+import functools
+import logging
+import threading
+import time
+
+from flask import Response, g, has_request_context
+
+#upper bounds of the histogram buckets in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# histogram with labels. For every combination of label values it keeps the count of observations per bucket,
+# their sum and their number, which is what prometheus needs to compute quantiles such as the p99
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames, buckets=BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][position] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def collect(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: {'buckets': list(s['buckets']), 'sum': s['sum'], 'count': s['count']}
+                      for key, s in self._series.items()}
+        for key, s in sorted(series.items()):
+            labels = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key))
+            prefix = labels + ',' if labels else ''
+            for bound, count in zip(self.buckets, s['buckets']):
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {s["count"]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {s["sum"]}')
+            lines.append(f'{self.name}_count{{{labels}}} {s["count"]}')
+        return lines
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# the metrics of the process. Counters of the caches are added with add_collector
+class Registry:
+
+    def __init__(self):
+        self.histograms = []
+        self.collectors = {}
+
+    def histogram(self, name, documentation, labelnames, buckets=BUCKETS):
+        histogram = Histogram(name, documentation, labelnames, buckets)
+        self.histograms.append(histogram)
+        return histogram
+
+    # collector is a function returning (name, type, help, {labels: value}) with labels as ((label, value), ...).
+    # a collector added again under the same key replaces the previous one, so reloading a module does not count twice
+    def add_collector(self, key, collector):
+        self.collectors[key] = collector
+
+    def render(self):
+        lines = []
+        for histogram in self.histograms:
+            lines.extend(histogram.collect())
+
+        # collectors can share a metric name (one per cache), which prometheus wants in a single block
+        metrics = {}
+        for collector in list(self.collectors.values()):
+            name, kind, documentation, samples = collector()
+            metrics.setdefault(name, (kind, documentation, {}))[2].update(samples)
+        for name, (kind, documentation, samples) in sorted(metrics.items()):
+            lines.extend([f'# HELP {name} {documentation}', f'# TYPE {name} {kind}'])
+            for labels, value in sorted(samples.items()):
+                labels = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+                lines.append(f'{name}{{{labels}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+CALLBACK_SECONDS = REGISTRY.histogram('esg_callback_seconds', 'Duration of the dash callbacks',
+                                      ['callback', 'branch'])
+PHASE_SECONDS = REGISTRY.histogram('esg_callback_phase_seconds', 'Duration of the phases of the dash callbacks',
+                                   ['callback', 'branch', 'phase'])
+
+logger = logging.getLogger(__name__)
+
+#duration in seconds of the startup phases, by phase
+_startup = {}
+
+
+# time a phase of the startup of a dashboard, log it and export it as esg_startup_seconds.
+# a phase that raises is recorded too, up to the error
+@contextlib.contextmanager
+def startup_phase(name):
+    start = time.perf_counter()
+    failed = True
+    try:
+        yield
+        failed = False
+    finally:
+        duration = time.perf_counter() - start
+        _startup[name] = duration
+        if failed:
+            logger.warning('startup phase %r failed after %.3fs', name, duration)
+        else:
+            logger.info('startup phase %r took %.3fs', name, duration)
+
+
+REGISTRY.add_collector('startup', lambda: ('esg_startup_seconds', 'gauge', 'Duration of the startup phases',
+                                           {(('phase', name),): seconds for name, seconds in list(_startup.items())}))
+
+#time spent building figures in the callback running in the current thread
+_local = threading.local()
+
+
+# proxy of a module (plotly.express, esg.figures) whose functions add their duration to the 'figure' phase of the running callback
+class TimedModule:
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        attr = getattr(self._module, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                if getattr(_local, 'figure', None) is not None:
+                    _local.figure += time.perf_counter() - start
+        return timed
+
+
+# decorator recording the duration of a callback. branch is a function of the callback arguments
+# that returns the label of the branch, for example 'country / year' for update_output.
+# log is called with the arguments of every call made by a request, for example AccessLog.record (see esg/warm.py)
+def instrument(callback, branch=None, log=None):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args):
+            label = branch(*args) if branch is not None else 'default'
+            if log is not None and has_request_context():
+                log(*args)
+            _local.figure = 0.0
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                duration = time.perf_counter() - start
+                figure, _local.figure = _local.figure, None
+                CALLBACK_SECONDS.observe(duration, callback=callback, branch=label)
+                PHASE_SECONDS.observe(figure, callback=callback, branch=label, phase='figure')
+                PHASE_SECONDS.observe(duration - figure, callback=callback, branch=label, phase='selection')
+                if has_request_context():
+                    g.esg_callback = (callback, label, duration)
+        return wrapper
+    return decorator
+
+
+# add the /metrics endpoint to the flask server of a dash app and time the serialization of the callback responses
+def register_metrics(server, path='/metrics', registry=REGISTRY):
+
+    @server.before_request
+    def _start_request():
+        g.esg_request_start = time.perf_counter()
+
+    @server.after_request
+    def _end_request(response):
+        if 'esg_callback' in g and 'esg_request_start' in g:
+            callback, label, duration = g.esg_callback
+            serialization = max(time.perf_counter() - g.esg_request_start - duration, 0.0)
+            PHASE_SECONDS.observe(serialization, callback=callback, branch=label, phase='serialization')
+        return response
+
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    server.add_url_rule(path, 'esg_metrics', metrics)
+    return server
+
+
+# collector exporting the hit and miss counters of a cache that has an info() method (see esg/memo.py and esg/figcache.py)
+def cache_collector(name, cache):
+    def collect():
+        info = cache.info()
+        return ('esg_cache_requests_total', 'counter', 'Lookups of the result caches',
+                {(('cache', name), ('result', 'hit')): info['hits'],
+                 (('cache', name), ('result', 'miss')): info['misses']})
+    return collect
@@ -0,0 +1,63 @@
+#population of the countries, used to weight the per capita indicators when they are rolled up to a region.
+#
+#the sum or the plain mean of a per capita indicator over the countries of a sub-region or a continent means nothing:
+#a region's per capita value is the mean of its countries weighted by their population. The population is the total
+#population of the World Bank (SP.POP.TOTL) when the dataset has it. The framework file does not list it, so a
+#df_esg.csv built by the notebook lacks it: the population of a country for a year is then derived from its CO2
+#emissions, as the total emissions (EN.ATM.CO2E.KT, kilotons) over the emissions per capita (EN.ATM.CO2E.PC,
+#metric tons per person). The derived value only fills the years the real series misses. A country with neither
+#for a year has no population that year and is left out of the weighted means of that year (see esg/cube.py)
+
+#import necessary libraries
+import logging
+
+import numpy as np
+
+#the population series and the indicators the population is derived from when it is missing
+POPULATION = 'SP.POP.TOTL'
+TOTAL = 'EN.ATM.CO2E.KT'
+PER_CAPITA = 'EN.ATM.CO2E.PC'
+
+logger = logging.getLogger(__name__)
+
+
+# the values of one indicator of a store (see esg/store.py) as a (country x year) block over the given countries
+# and years. Countries without a row of the indicator get NaN
+def _by_country(store, code, countries, years):
+    block = np.full((len(countries), len(years)), np.nan)
+    if store is None or code not in store.categories('ind'):
+        return block
+    rows = np.flatnonzero(store.codes('ind') == store.categories('ind').get_loc(code))
+    positions = countries.get_indexer(store.categories('country')[store.codes('country')[rows]])
+    found = positions >= 0
+    columns = [store.years.index(year) for year in years if year in store.years]
+    kept = [years.index(year) for year in years if year in store.years]
+    block[np.ix_(positions[found], kept)] = store.values[rows[found]][:, columns]
+    return block
+
+
+# the population of every row of store for every year of the store, as a float64 block shaped like store.values.
+# populations is the store holding the population series and totals the one holding the total CO2 emissions; both
+# default to store itself, and a store without the indicator counts as missing
+def row_population(store, totals=None, populations=None):
+    countries = store.categories('country')
+    population = _by_country(store if populations is None else populations, POPULATION, countries, store.years)
+    population[~(population > 0)] = np.nan
+
+    #kilotons to metric tons, over metric tons per person, where the population series has no value
+    per_capita = _by_country(store, PER_CAPITA, countries, store.years)
+    total = _by_country(store if totals is None else totals, TOTAL, countries, store.years)
+    missing = np.isnan(population)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        population[missing] = np.where(per_capita > 0, total * 1000 / per_capita, np.nan)[missing]
+
+    codes = store.codes('country')
+    weights = population[np.maximum(codes, 0)]
+    weights[codes < 0] = np.nan
+
+    unweighted = np.isnan(weights).all(axis=1)
+    logger.info('population of %d of %d country years read from %s, %d derived from the CO2 emissions; '
+                '%d of %d rows have no population for any year and are left out of the weighted means',
+                (~missing).sum(), missing.size, POPULATION, (missing & ~np.isnan(population)).sum(),
+                unweighted.sum(), len(weights))
+    return weights
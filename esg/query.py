@@ -0,0 +1,187 @@
+#declarative queries on the cleaned esg data.
+#
+#a Query describes what a chart needs: the indicators, the rows (a scope such as 'continent' and its entities),
+#the years and the level of the result rows. At the level 'country' every row of the store is a row of the result;
+#at a coarser level ('sub-region', 'continent' or None for all rows) the rows are aggregated with a statistic.
+#top=n keeps the n largest values of a single year. The QueryEngine plans every query on the structures built at
+#load time: the AggregateCube for the aggregates of a whole level (see esg/cube.py), the RankingIndex for the top n
+#(see esg/ranking.py), the SeriesIndex for the rows of entities (see esg/index.py) and a scan of the store for
+#anything else. Results are kept in an LRUCache (see esg/memo.py), so charts sharing a query compute it once.
+#
+#a result is a dataframe with one row per (label, indicator), where the label is the value of the level, and one
+#column per year. over_years and at_year reshape it into what the figures plot
+
+#import necessary libraries
+import logging
+
+import numpy as np
+import pandas as pd
+
+from esg.memo import LRUCache
+
+#the finest level: one result row per row of the store
+ROW_LEVEL = 'country'
+
+PLANS = ('cube', 'ranking', 'index', 'scan')
+
+logger = logging.getLogger(__name__)
+
+
+# what a chart asks for. indicators is a name or a list of names, entities a value or a list of values of the scope
+# column, years a year, a list of years or a range of integers (None for all years). level is the column that labels
+# the rows of the result and stat how the rows are aggregated at a level coarser than ROW_LEVEL. The stat 'weighted'
+# (the population weighted mean, see esg/cube.py) is only kept by the cube, so it needs a whole level without scope
+class Query:
+
+    def __init__(self, indicators, scope=None, entities=None, years=None, level=ROW_LEVEL, stat='sum', top=None):
+        if (scope is None) != (entities is None):
+            raise ValueError('scope and entities go together')
+        self.indicators = (indicators,) if isinstance(indicators, str) else tuple(indicators)
+        self.scope = scope
+        self.entities = None if entities is None else (entities,) if isinstance(entities, str) else tuple(entities)
+        self.years = None if years is None else (str(years),) if isinstance(years, (str, int)) else tuple(map(str, years))
+        self.level = level
+        self.stat = stat if level != ROW_LEVEL else None
+        self.top = top
+        if top is not None and (self.years is None or len(self.years) != 1):
+            raise ValueError('top needs a single year')
+
+    def key(self):
+        return (self.indicators, self.scope, self.entities, self.years, self.level, self.stat, self.top)
+
+    def __eq__(self, other):
+        return isinstance(other, Query) and self.key() == other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={value!r}' for name, value in zip(
+            ['indicators', 'scope', 'entities', 'years', 'level', 'stat', 'top'], self.key()) if value is not None or name == 'level')
+        return f'Query({fields})'
+
+
+# plans and runs queries on a CompactStore (see esg/store.py) and the structures built from it.
+# version is the version of the dataset, part of the key of the cached results, so a cache can outlive the engine
+class QueryEngine:
+
+    def __init__(self, store, index=None, cube=None, ranking=None, cache=None, version=None):
+        self.store = store
+        self.index = index
+        self.cube = cube
+        self.ranking = ranking
+        self.cache = cache if cache is not None else LRUCache(256)
+        self.version = version
+        self.plans = dict.fromkeys(PLANS, 0)
+
+    # the structure that answers a query
+    def plan(self, query):
+        if query.scope is None and query.level != ROW_LEVEL and query.top is None and self.cube is not None \
+                and query.level in self.cube.levels and query.stat in self.cube.stats:
+            return 'cube'
+        if query.level == ROW_LEVEL and query.top is not None and self.ranking is not None and len(query.indicators) == 1 \
+                and (query.scope is None or (query.scope in self.ranking.scopes and len(query.entities) == 1)):
+            return 'ranking'
+        if query.level == ROW_LEVEL and query.top is None and self.index is not None \
+                and (query.scope is None or query.scope in self.index.scopes):
+            return 'index'
+        return 'scan'
+
+    # the result of a query. It is shared with the cache, so it must not be modified
+    def run(self, query):
+        key = (self.version, query.key())
+        result = self.cache.get(key)
+        if result is None:
+            plan = self.plan(query)
+            self.plans[plan] += 1
+            logger.debug('%r runs on the %s', query, plan)
+            result = getattr(self, f'_{plan}')(query, self._years(query))
+            self.cache.set(key, result)
+        return result
+
+    def _years(self, query):
+        if query.years is None:
+            return self.store.years
+        return [year for year in query.years if year in self.store.years]
+
+    # the labels of a key column for some rows of the store
+    def _labels(self, column, rows):
+        return np.asarray(pd.Categorical.from_codes(self.store.codes(column)[rows], self.store.categories(column)))
+
+    # the rows of the store whose key column has one of the values
+    def _matching(self, column, values):
+        categories = self.store.categories(column)
+        return np.isin(self.store.codes(column), [categories.get_loc(value) for value in values if value in categories])
+
+    # the result frame of rows of the store, labelled by their country and indicator
+    def _rows(self, rows, years):
+        labels = pd.MultiIndex.from_arrays([self._labels(ROW_LEVEL, rows), self._labels('indicator', rows)],
+                                           names=[ROW_LEVEL, 'indicator'])
+        positions = [self.store.years.index(year) for year in years]
+        return pd.DataFrame(self.store.values[rows][:, positions], index=labels, columns=years)
+
+    def _cube(self, query, years):
+        frames = {indicator: self.cube.frame(query.level, indicator, query.stat)[years] for indicator in query.indicators}
+        result = pd.concat(frames, names=['indicator'])
+        return result.swaplevel().rename_axis([query.level, 'indicator'])
+
+    def _ranking(self, query, years):
+        entity = query.entities[0] if query.entities else None
+        return self._rows(self.ranking.top(query.indicators[0], years[0], query.scope, entity, query.top), years)
+
+    def _index(self, query, years):
+        parts = [self.index.rows(query.scope, entity, query.indicators) for entity in query.entities or [None]]
+        return self._rows(np.concatenate(parts), years)
+
+    # every row of the store is looked at: the rows of the scope and indicators are aggregated with pandas
+    def _scan(self, query, years):
+        mask = self._matching('indicator', query.indicators)
+        if query.scope is not None:
+            mask &= self._matching(query.scope, query.entities)
+        rows = np.flatnonzero(mask)
+
+        if query.level == ROW_LEVEL:
+            result = self._rows(rows, years)
+        elif query.stat not in ('sum', 'mean', 'count', 'nonnull', 'max'):
+            raise ValueError(f'{query!r} can only be answered by an aggregate cube keeping {query.stat!r}')
+        else:
+            #the level None puts every row in a single group
+            frame = self.store.frame.iloc[rows]
+            level = frame[query.level] if query.level is not None else pd.Series(0, index=frame.index)
+            grouped = frame.groupby([level.rename(query.level), 'indicator'], observed=True)[years]
+            if query.stat == 'count':
+                sizes = grouped.size()
+                result = pd.DataFrame({year: sizes for year in years})
+            else:
+                result = grouped.agg({'nonnull': 'count'}.get(query.stat, query.stat))
+            if query.level is None:
+                result.index = result.index.set_levels([None], level=0)
+
+        #like the RankingIndex and nlargest: the top largest values, then the rows without a value in their order
+        if query.top is not None:
+            result = result.sort_values(years[0], ascending=False, kind='stable', na_position='last').head(query.top)
+        return result
+
+    def info(self):
+        return dict(self.cache.info(), plans=dict(self.plans))
+
+
+# the values of a result over the years: one row per year (as an integer) and one column per value of the level
+# columns ('indicator' or the level of the query). The other level is dropped, so it must have a single value.
+# labels reorders the columns, the missing ones are filled with NaN
+def over_years(result, columns='indicator', labels=None):
+    table = result.droplevel([name for name in result.index.names if name != columns]).T
+    table.index = table.index.astype(int).rename('year')
+    table.columns.name = None
+    return table if labels is None else table.reindex(columns=list(labels))
+
+
+# the values of a result for one year. Without columns: a series indexed by the level index (the other level is
+# dropped). With columns: a table with a row per value of index and a column per value of columns, in labels order
+def at_year(result, year, index, columns=None, labels=None):
+    values = result[year]
+    if columns is None:
+        return values.droplevel([name for name in result.index.names if name != index])
+    table = values.unstack(columns)
+    table.columns.name = columns
+    return table if labels is None else table.reindex(columns=list(labels))
@@ -0,0 +1,106 @@
+#import necessary libraries
+import numpy as np
+import pandas as pd
+
+_EMPTY = np.empty(0, dtype=np.int64)
+
+
+# ranking of the rows of every indicator for every year, computed once at load time.
+# for each (indicator, year) we keep the positions of all rows with a value, from the largest value to the smallest,
+# globally and within every group of the scope columns ('sub-region', 'continent', ...).
+# ties keep the order of the rows like nlargest does, so top(n) returns the same rows as nlargest(n, year)
+class RankingIndex:
+
+    def __init__(self, scopes, ind_codes, indicators, values, years, entities=None):
+        self.indicators = pd.Index(indicators)
+        self.years = list(years)
+        self.entities = entities
+        self._groups = {scope: pd.Index(groups) for scope, (codes, groups) in scopes.items()}
+        self._global = {}
+        self._scoped = {}
+
+        values = np.asarray(values)
+        ind_codes = np.asarray(ind_codes)
+        for position, indicator in enumerate(self.indicators):
+            rows = np.flatnonzero(ind_codes == position)
+            block = values[rows]
+
+            # sort every year column from the largest to the smallest value, NaN values last
+            order = np.argsort(np.where(np.isnan(block), np.inf, -block), axis=0, kind='stable')
+            ranked = rows[order]
+            counts = (~np.isnan(block)).sum(axis=0)
+            self._global[indicator] = (np.ascontiguousarray(ranked.T), counts)
+
+            for scope, (codes, groups) in scopes.items():
+                self._scoped[(scope, indicator)] = self._split(ranked, np.asarray(codes), len(groups), values)
+
+    # regroup a ranked block by the group of every row. The stable sort keeps the ranking inside every group
+    @staticmethod
+    def _split(ranked, codes, n_groups, values):
+        n_years = ranked.shape[1]
+        group = codes[ranked]
+        order = np.argsort(group, axis=0, kind='stable')
+        grouped = np.take_along_axis(ranked, order, axis=0)
+        group = np.take_along_axis(group, order, axis=0)
+
+        # where every group starts in each year column and how many of its rows have a value
+        starts = np.stack([np.searchsorted(group[:, year], np.arange(n_groups + 1)) for year in range(n_years)], axis=1)
+        has_value = ~np.isnan(values[grouped, np.arange(n_years)])
+        valid = np.zeros((n_groups + 1, n_years), dtype=np.int64)
+        np.add.at(valid, (np.where(group >= 0, group, n_groups), np.broadcast_to(np.arange(n_years), group.shape)), has_value)
+        return np.ascontiguousarray(grouped.T), starts, valid
+
+    # the scope columns the rows are also ranked within
+    @property
+    def scopes(self):
+        return list(self._groups)
+
+    # build the rankings from a CompactStore (see esg/store.py). codes maps a scope to the (codes, names) of the group
+    # of every row, as EntityRegistry.row_codes returns them (see esg/entities.py), in place of the labels of the store
+    @classmethod
+    def from_store(cls, store, scopes=('sub-region', 'continent'), indicator='indicator', entity='country', codes=None):
+        codes = codes or {}
+        return cls({scope: codes.get(scope) or (store.codes(scope), store.categories(scope)) for scope in scopes},
+                   store.codes(indicator), store.categories(indicator), store.values, store.years,
+                   pd.Categorical.from_codes(store.codes(entity), store.categories(entity)))
+
+    # build the rankings from a plain wide dataframe
+    @classmethod
+    def from_frame(cls, df, scopes, years, indicator='indicator', entity='country'):
+        categoricals = {scope: pd.Categorical(df[scope]) for scope in scopes}
+        indicators = pd.Categorical(df[indicator])
+        return cls({scope: (c.codes, c.categories) for scope, c in categoricals.items()},
+                   indicators.codes, indicators.categories, df[list(years)].to_numpy(dtype=np.float64), years,
+                   pd.Categorical(df[entity]))
+
+    # positions of all rows of the indicator for the year from the largest to the smallest value, followed by
+    # the rows without a value, and the number of rows with a value.
+    # with a scope and an entity (for example 'continent' and 'Europe') only the rows of that group are returned
+    def _ranked(self, indicator, year, scope=None, entity=None):
+        column = self.years.index(str(year))
+        if scope is None:
+            ranked, counts = self._global[indicator]
+            return ranked[column], counts[column]
+
+        if entity not in self._groups[scope]:
+            return _EMPTY, 0
+        group = self._groups[scope].get_loc(entity)
+        grouped, starts, valid = self._scoped[(scope, indicator)]
+        return grouped[column, starts[group, column]:starts[group + 1, column]], valid[group, column]
+
+    # positions of all rows with a value for the indicator and year, from the largest to the smallest value
+    def ranking(self, indicator, year, scope=None, entity=None):
+        ranked, valid = self._ranked(indicator, year, scope, entity)
+        return ranked[:valid]
+
+    # positions of the n rows with the largest values. Like nlargest, when fewer than n rows have a value the rows
+    # without one follow in the order of the rows, up to n
+    def top(self, indicator, year, scope=None, entity=None, n=10):
+        ranked, _ = self._ranked(indicator, year, scope, entity)
+        return ranked[:n]
+
+    # the rank (1 for the largest value) of an entity, or None if it has no value for that year
+    def rank_of(self, name, indicator, year, scope=None, entity=None):
+        ranked = self.ranking(indicator, year, scope, entity)
+        found = np.flatnonzero(np.asarray(self.entities[ranked]) == name)
+        return int(found[0]) + 1 if len(found) else None
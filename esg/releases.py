@@ -0,0 +1,227 @@
+#store of several releases of df_esg, as built by esg/etl.py (releases/df_esg_YYYY-MM-DD.csv).
+#
+#    python -m esg.releases add releases/df_esg_*.csv        add releases, oldest first
+#    python -m esg.releases list
+#    python -m esg.releases diff 2021-06-30 2022-12-12 [-o changes.csv]
+#    python -m esg.releases show 2021-06-30 [-o df_esg.csv]
+#
+#the first release is kept whole and every later one only keeps the cells (iso3, ind, year) whose value changed
+#since the releases before it, plus its list of rows and their labels. A release is read back "as of" its name by
+#taking the last value written for every cell, so reading one release never loads the others whole.
+#the dashboards are pinned to a release with ESG_RELEASE=YYYY-MM-DD: the release is written once as a csv file
+#which then goes through the usual snapshot (see esg/data.py)
+
+#import necessary libraries
+import argparse
+import json
+import os
+import sys
+
+import pandas as pd
+
+from esg.data import HAVE_ARROW, ROOT, SNAPSHOT_DIR, _atomic_write, file_hash
+from esg.etl import release_name
+
+#where the store keeps its files and the release the dashboards show (the latest df_esg.csv when empty)
+STORE_DIR = os.environ.get('ESG_RELEASE_STORE', os.path.join(ROOT, 'releases', 'store'))
+RELEASE = os.environ.get('ESG_RELEASE') or None
+
+#bump this number when the layout of the store changes
+STORE_VERSION = 1
+
+MANIFEST = 'manifest.json'
+
+#the columns identifying a row and a cell
+KEY = ['iso3', 'ind']
+CELL = KEY + ['year']
+
+#the files are parquet when pyarrow is installed and csv otherwise
+EXTENSION = 'parquet' if HAVE_ARROW else 'csv'
+
+
+def _write_table(df, path):
+    def write(tmp):
+        if HAVE_ARROW:
+            df.to_parquet(tmp, index=False)
+        else:
+            df.to_csv(tmp, index=False)
+    _atomic_write(path, write)
+
+
+def _read_table(path, columns=None):
+    if HAVE_ARROW:
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_csv(path, usecols=columns, dtype={'year': str})
+
+
+def read_manifest(store_dir=None):
+    try:
+        with open(os.path.join(store_dir or STORE_DIR, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'version': STORE_VERSION, 'releases': []}
+    if manifest.get('version') != STORE_VERSION:
+        raise ValueError(f'the release store in {store_dir or STORE_DIR} has version {manifest.get("version")}, '
+                         f'expected {STORE_VERSION}: build it again')
+    return manifest
+
+
+def _write_manifest(manifest, store_dir):
+    def write(tmp):
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+    _atomic_write(os.path.join(store_dir, MANIFEST), write)
+
+
+# the names of the releases of the store, oldest first
+def releases(store_dir=None):
+    return [release['name'] for release in read_manifest(store_dir)['releases']]
+
+
+def _entry(manifest, name):
+    for position, release in enumerate(manifest['releases']):
+        if release['name'] == name:
+            return position, release
+    raise KeyError(f'release {name} is not in the store, known releases: {[r["name"] for r in manifest["releases"]]}')
+
+
+# the values of a wide release frame as a series indexed by (iso3, ind, year)
+def _cells(df, years):
+    cells = df.melt(id_vars=KEY, value_vars=years, var_name='year', value_name='value')
+    return cells.set_index(CELL)['value']
+
+
+# the last value written for every cell by the releases up to position (included)
+def _state(manifest, position, store_dir):
+    tables = [_read_table(os.path.join(store_dir, release['cells'])) for release in manifest['releases'][:position + 1]]
+    cells = pd.concat(tables, ignore_index=True)
+    cells = cells.drop_duplicates(CELL, keep='last')
+    return cells.set_index(CELL)['value']
+
+
+# add a release to the store. Releases are added oldest first, so that every one is stored against the ones before it
+def add_release(path, name=None, store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    name = name or release_name(path)
+    os.makedirs(store_dir, exist_ok=True)
+    manifest = read_manifest(store_dir)
+    if manifest['releases'] and name <= manifest['releases'][-1]['name']:
+        raise ValueError(f'release {name} is not newer than {manifest["releases"][-1]["name"]}: releases are added oldest first')
+
+    df = pd.read_csv(path).drop(columns=['Unnamed: 0'], errors='ignore')
+    if df.duplicated(KEY).any():
+        raise ValueError(f'{path} has several rows for the same (iso3, ind)')
+    years = [column for column in df.columns if column.isdigit()]
+
+    #the cells that are new or that changed since the releases before. Missing values count as equal
+    cells = _cells(df, years)
+    if manifest['releases']:
+        previous = _state(manifest, len(manifest['releases']) - 1, store_dir).reindex(cells.index)
+        changed = ~((cells == previous) | (cells.isna() & previous.isna()))
+    else:
+        changed = cells.notna()
+    cells = cells[changed].rename('value').reset_index()
+
+    entry = {'name': name, 'source': os.path.basename(path), 'sha256': file_hash(path),
+             'columns': list(df.columns), 'years': years, 'rows': f'rows-{name}.{EXTENSION}',
+             'cells': f'cells-{name}.{EXTENSION}', 'changed': len(cells)}
+    _write_table(df.drop(columns=years), os.path.join(store_dir, entry['rows']))
+    _write_table(cells, os.path.join(store_dir, entry['cells']))
+    manifest['releases'].append(entry)
+    _write_manifest(manifest, store_dir)
+    return entry
+
+
+# the wide frame of a release as it was added, with the rows in their order and the running index
+def read_release(name, store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    manifest = read_manifest(store_dir)
+    position, release = _entry(manifest, name)
+
+    rows = _read_table(os.path.join(store_dir, release['rows']))
+    values = _state(manifest, position, store_dir).unstack('year')
+    values = values.reindex(index=pd.MultiIndex.from_frame(rows[KEY]), columns=release['years'])
+
+    df = pd.concat([rows, pd.DataFrame(values.to_numpy(), columns=release['years'])], axis=1)
+    return df[release['columns']]
+
+
+# the cells whose value differs between two releases, with their value in both (NaN when missing).
+# only the cells written by the releases after the older one can differ, plus the cells of the rows
+# that are in one of the two releases only
+def diff(old, new, store_dir=None):
+    store_dir = store_dir or STORE_DIR
+    manifest = read_manifest(store_dir)
+    (old_position, old_release), (new_position, new_release) = _entry(manifest, old), _entry(manifest, new)
+    low, high = sorted([old_position, new_position])
+
+    old_state = _state(manifest, old_position, store_dir)
+    new_state = _state(manifest, new_position, store_dir)
+    old_rows = pd.MultiIndex.from_frame(_read_table(os.path.join(store_dir, old_release['rows']), KEY))
+    new_rows = pd.MultiIndex.from_frame(_read_table(os.path.join(store_dir, new_release['rows']), KEY))
+
+    #the cells written in between, of the rows of both releases, and the cells of the rows of one release only
+    between = [_read_table(os.path.join(store_dir, release['cells']), CELL)
+               for release in manifest['releases'][low + 1:high + 1]]
+    between = pd.concat(between) if between else pd.DataFrame(columns=CELL)
+    between = between[pd.MultiIndex.from_frame(between[KEY]).isin(old_rows.intersection(new_rows))]
+    only = old_rows.symmetric_difference(new_rows)
+    others = [state.index[state.index.droplevel('year').isin(only)].to_frame(index=False)
+              for state in [old_state, new_state]]
+    index = pd.MultiIndex.from_frame(pd.concat([between] + others).drop_duplicates())
+
+    #cells of rows or years that a release does not have are missing in it
+    def values(state, rows, years):
+        missing = ~index.droplevel('year').isin(rows) | ~index.get_level_values('year').isin(years)
+        return state.reindex(index).mask(missing)
+
+    changes = pd.DataFrame({old: values(old_state, old_rows, old_release['years']),
+                            new: values(new_state, new_rows, new_release['years'])}, index=index)
+    same = (changes[old] == changes[new]) | (changes[old].isna() & changes[new].isna())
+    return changes[~same].reset_index()
+
+
+# the csv file and the snapshot folder the dashboards read for a release. With no release (the default)
+# they read df_esg.csv as before. The csv file of a release is written once from the store
+def release_paths(name=None, store_dir=None):
+    name = name or RELEASE
+    if name is None:
+        return None, None
+    store_dir = store_dir or STORE_DIR
+    csv_path = os.path.join(store_dir, 'asof', f'df_esg_{name}.csv')
+    if not os.path.exists(csv_path):
+        os.makedirs(os.path.dirname(csv_path), exist_ok=True)
+        df = read_release(name, store_dir)
+        _atomic_write(csv_path, lambda tmp: df.to_csv(tmp))
+    return csv_path, os.path.join(SNAPSHOT_DIR, f'release-{name}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='store of the releases of df_esg')
+    parser.add_argument('--store', default=STORE_DIR, help='folder of the store (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add = commands.add_parser('add', help='add releases, oldest first')
+    add.add_argument('paths', nargs='+', help='df_esg_YYYY-MM-DD.csv files')
+    commands.add_parser('list', help='list the releases')
+    changes = commands.add_parser('diff', help='cells that changed between two releases')
+    changes.add_argument('old')
+    changes.add_argument('new')
+    changes.add_argument('-o', '--output', help='csv file to write the changes to')
+    show = commands.add_parser('show', help='a release as it was added')
+    show.add_argument('name')
+    show.add_argument('-o', '--output', help='csv file to write the release to')
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        for path in sorted(args.paths, key=release_name):
+            entry = add_release(path, store_dir=args.store)
+            print(f"{entry['name']}: {entry['changed']} cells stored", file=sys.stderr)
+    elif args.command == 'list':
+        for release in read_manifest(args.store)['releases']:
+            print(f"{release['name']}  {release['changed']:>10} cells  {release['source']}")
+    elif args.command == 'diff':
+        result = diff(args.old, args.new, args.store)
+        result.to_csv(args.output or sys.stdout, index=False)
+    else:
+        result = read_release(args.name, args.store)
+        result.to_csv(args.output or sys.stdout)
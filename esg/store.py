@@ -0,0 +1,49 @@
+#import necessary libraries
+import numpy as np
+import pandas as pd
+
+
+# in-memory store of the cleaned esg data.
+# every row is one (entity, indicator) pair: the text columns (country, indicator, ind, sub-region, continent)
+# are kept as integer coded categoricals and the values of all years as one dense float32 block.
+# the wide dataframe the dashboards work with is a view on top of these arrays and it is built only once
+class CompactStore:
+
+    def __init__(self, keys, values, years, columns=None, index=None):
+        self.keys = keys
+        self.values = values
+        self.years = list(years)
+        self.columns = list(columns) if columns is not None else list(keys) + self.years
+        self.index = index if index is not None else pd.RangeIndex(values.shape[0])
+        self._frame = None
+
+    # build the store from a wide dataframe, keeping the order of its columns and its index
+    @classmethod
+    def from_frame(cls, df, key_columns, years):
+        keys = {column: pd.Categorical(df[column]) for column in key_columns}
+        values = np.ascontiguousarray(df[list(years)].to_numpy(dtype=np.float32))
+        columns = [column for column in df.columns if column in keys or column in years]
+        return cls(keys, values, years, columns, df.index)
+
+    # the integer code of every row for a key column and the labels these codes point to
+    def codes(self, column):
+        return self.keys[column].codes
+
+    def categories(self, column):
+        return self.keys[column].categories
+
+    # the wide view: the float32 block is shared with the store and the key columns are inserted next to it
+    @property
+    def frame(self):
+        if self._frame is None:
+            frame = pd.DataFrame(self.values, columns=self.years, index=self.index, copy=False)
+            for position, column in enumerate(self.columns):
+                if column in self.keys:
+                    frame.insert(position, column, pd.Series(self.keys[column], index=self.index))
+            self._frame = frame
+        return self._frame
+
+    # memory held by the store in bytes
+    def nbytes(self):
+        keys = sum(key.codes.nbytes + key.categories.memory_usage(deep=True) for key in self.keys.values())
+        return keys + self.values.nbytes
@@ -0,0 +1,235 @@
+#warm up of the caches of a callback after the start of a worker.
+#
+#the first users after a deploy or a restart would otherwise pay for the figures of the most common selections.
+#CacheWarmer computes a list of selections in a background thread through the caches of the callback (see esg/memo.py
+#and esg/figcache.py), so they are served from memory afterwards. Its work is limited by a cpu budget: the thread
+#only uses a share of one core and stops once it spent a number of cpu seconds, so the requests arriving meanwhile
+#are not slowed down much. The selections come from a configured list and from the access log that the callback
+#writes (AccessLog, buffered in memory and written by a background thread), hottest first. The progress is logged and exported on /metrics as esg_warm_up_selections
+#and esg_warm_up_cpu_seconds
+
+#import necessary libraries
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, deque
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#where the selections of the users are logged (in the cache folder of the user, outside the repository), how large the
+#log grows before it is rotated, how often the buffered entries are written and the budget of the warm up
+ACCESS_LOG = os.environ.get('ESG_ACCESS_LOG') or os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'esg', 'access.log')
+ACCESS_LOG_MB = int(os.environ.get('ESG_ACCESS_LOG_MB', 8))
+ACCESS_LOG_FLUSH = float(os.environ.get('ESG_ACCESS_LOG_FLUSH', 5))
+WARM_UP_SELECTIONS = os.environ.get('ESG_WARM_UP_SELECTIONS') or None
+WARM_UP_LIMIT = int(os.environ.get('ESG_WARM_UP_LIMIT', 100))
+WARM_UP_CPU = float(os.environ.get('ESG_WARM_UP_CPU', 0.5))
+WARM_UP_SECONDS = float(os.environ.get('ESG_WARM_UP_SECONDS', 120))
+
+logger = logging.getLogger(__name__)
+
+
+# append only log of the arguments of a callback, one json list per line. record() only appends the line to a
+# buffer in memory; a background thread of every process writes the buffer every flush_seconds (and at exit) in a
+# single write in append mode, so the workers of the host share the file. At most max_buffered lines wait, the oldest
+# are dropped beyond. When the log grows beyond max_bytes it is renamed to <path>.1, replacing the previous one,
+# under a lock file (<path>.lock) so that a single worker rotates it. The log keeps between one and two times
+# max_bytes of history
+class AccessLog:
+
+    def __init__(self, path=None, max_bytes=None, flush_seconds=None, max_buffered=10000):
+        self.path = path or ACCESS_LOG
+        self.max_bytes = max_bytes if max_bytes is not None else ACCESS_LOG_MB * 1024 * 1024
+        self.flush_seconds = ACCESS_LOG_FLUSH if flush_seconds is None else flush_seconds
+        self._buffer = deque(maxlen=max_buffered)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+
+    def record(self, *args):
+        line = json.dumps(list(args)) + '\n'
+        with self._lock:
+            self._buffer.append(line)
+            #a worker forked from a process that already logged starts its own writer
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name='access-log', daemon=True).start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    # write the buffered lines to the log
+    def flush(self):
+        with self._lock:
+            lines = ''.join(self._buffer)
+            self._buffer.clear()
+        if not lines:
+            return
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(lines)
+                    rotate = f.tell() > self.max_bytes
+                if rotate:
+                    self._rotate()
+        except OSError as e:
+            #losing entries of the log is better than failing the callback
+            logger.debug('could not write the access log %s: %s', self.path, e)
+
+    # rename the log to <path>.1 unless another worker did it meanwhile
+    def _rotate(self):
+        with open(f'{self.path}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if os.path.getsize(self.path) > self.max_bytes:
+                    os.replace(self.path, f'{self.path}.1')
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    # the arguments logged most often, as tuples, with their count
+    def hottest(self, limit=None):
+        self.flush()
+        counts = Counter()
+        for path in [f'{self.path}.1', self.path]:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            counts[tuple(json.loads(line))] += 1
+                        except (ValueError, TypeError):
+                            continue
+            except OSError:
+                continue
+        return counts.most_common(limit)
+
+
+# the selections of a json file holding a list of argument lists, for example [["Europe", "2018"], ["Germany", null]]
+def read_selections(path):
+    with open(path, encoding='utf-8') as f:
+        return [tuple(selection) for selection in json.load(f)]
+
+
+# the selections to warm: the configured ones first, then the hottest of the access log, then the defaults,
+# without duplicates and without the ones valid() rejects, at most limit of them
+def hot_selections(configured=None, access_log=None, defaults=None, valid=None, limit=None):
+    limit = WARM_UP_LIMIT if limit is None else limit
+    candidates = [tuple(selection) for selection in configured or []]
+    if access_log is not None:
+        candidates += [selection for selection, _ in access_log.hottest()]
+    candidates += [tuple(selection) for selection in defaults or []]
+
+    selections = []
+    for selection in dict.fromkeys(candidates):
+        if len(selections) >= limit:
+            break
+        if valid is None or valid(*selection):
+            selections.append(selection)
+    return selections
+
+
+# computes the selections of a callback in a background thread. func is the cached callback without its metrics
+# (so the warm up does not count as user latency) and selections a list of argument tuples or a function returning
+# it, called in the thread. cpu_share is the share of one core the thread uses and cpu_seconds what it spends at most
+class CacheWarmer:
+
+    def __init__(self, func, selections, cpu_share=None, cpu_seconds=None, name='warm-up'):
+        self.func = func
+        self.selections = selections
+        self.cpu_share = min(max(WARM_UP_CPU if cpu_share is None else cpu_share, 0.01), 1.0)
+        self.cpu_seconds = WARM_UP_SECONDS if cpu_seconds is None else cpu_seconds
+        self.name = name
+        self.state = 'pending'
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.cpu = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name=self.name, daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run(self):
+        self.state = 'running'
+        start = time.perf_counter()
+        try:
+            selections = self.selections() if callable(self.selections) else self.selections
+        except Exception:
+            logger.exception('%s: could not list the selections to warm', self.name)
+            self.state = 'failed'
+            return
+        self.total = len(selections)
+        logger.info('%s: warming %d selections with %.0f%% of a core for at most %.1f cpu seconds',
+                    self.name, self.total, self.cpu_share * 100, self.cpu_seconds)
+
+        reported = 0
+        for selection in selections:
+            if self._stop.is_set() or self.cpu >= self.cpu_seconds:
+                break
+            cpu = time.thread_time()
+            try:
+                self.func(*selection)
+            except Exception as e:
+                #the live callback fails on the same selection, there is nothing to cache
+                self.failed += 1
+                logger.debug('%s: %r failed: %r', self.name, selection, e)
+            cpu = time.thread_time() - cpu
+            self.cpu += cpu
+            self.done += 1
+
+            #report every tenth of the work
+            if self.done * 10 // self.total > reported:
+                reported = self.done * 10 // self.total
+                logger.info('%s: %d/%d selections warmed (%d failed), %.1f cpu seconds',
+                            self.name, self.done, self.total, self.failed, self.cpu)
+
+            #sleep long enough for the thread to use cpu_share of a core, which also lets the requests take the GIL
+            if self.cpu_share < 1.0:
+                self._stop.wait(cpu * (1 - self.cpu_share) / self.cpu_share)
+
+        self.state = 'stopped' if self.done < self.total else 'done'
+        logger.info('%s: %s after %d/%d selections (%d failed), %.1f cpu seconds in %.1fs', self.name, self.state,
+                    self.done, self.total, self.failed, self.cpu, time.perf_counter() - start)
+
+    def info(self):
+        return {'state': self.state, 'total': self.total, 'done': self.done, 'failed': self.failed,
+                'cpu_seconds': self.cpu, 'cpu_share': self.cpu_share, 'max_cpu_seconds': self.cpu_seconds}
+
+
+# collector exporting the progress of a CacheWarmer on /metrics (see esg/metrics.py).
+# warmer is a function returning the current warmer or None, as a worker only creates it when it starts
+def warm_up_collectors(name, warmer):
+    def selections():
+        current = warmer()
+        info = current.info() if current is not None else {'total': 0, 'done': 0, 'failed': 0}
+        return ('esg_warm_up_selections', 'gauge', 'Selections of the cache warm up',
+                {(('cache', name), ('state', state)): info[state] for state in ['total', 'done', 'failed']})
+
+    def cpu():
+        current = warmer()
+        return ('esg_warm_up_cpu_seconds', 'gauge', 'Cpu time spent by the cache warm up',
+                {(('cache', name),): current.cpu if current is not None else 0.0})
+    return selections, cpu
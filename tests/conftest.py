@@ -0,0 +1,30 @@
+#the tests run the dashboards on the synthetic dataset of the benchmarks (see benchmarks/fixture.py).
+#the environment is set before any module of the repository is imported, as they read it at import
+
+#import necessary libraries
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'top_10_co2_emmissions'))
+
+from benchmarks.fixture import make_fixture  # noqa: E402
+
+#the fixture, its snapshots, the figure cache and the access log are kept in a folder removed after the tests
+WORKDIR = tempfile.mkdtemp(prefix='esg-tests-')
+
+os.environ['ESG_CSV'] = make_fixture(os.path.join(WORKDIR, 'df_esg.csv'))
+os.environ['ESG_SNAPSHOT_DIR'] = os.path.join(WORKDIR, 'snapshots')
+os.environ['ESG_FIGURE_CACHE'] = os.path.join(WORKDIR, 'figures')
+os.environ['ESG_ACCESS_LOG'] = os.path.join(WORKDIR, 'access.log')
+os.environ['ESG_WARM_CACHE'] = '0'
+os.environ.pop('ESG_RELEASE', None)
+os.environ.pop('ESG_STATIC', None)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(WORKDIR, ignore_errors=True)
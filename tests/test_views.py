@@ -0,0 +1,158 @@
+#regression test of the figures of the dashboards against the pandas code they replaced.
+#
+#the callbacks read their data from the series index, the aggregate cube and the rankings (see esg/index.py,
+#esg/cube.py and esg/ranking.py). Here the same figures are computed from df_esg.csv with plain pandas, as the
+#original callbacks did (boolean masks, nlargest and groupby), and the data of every trace must match: the labels
+#exactly and the values up to the float32 precision of the store. The sub-regions and continents compare per capita
+#indicators as means weighted by population (see esg/population.py), computed here with groupby as well
+
+#import necessary libraries
+import numpy as np
+import pandas as pd
+import pytest
+
+import co2emmissions
+import wb_ed
+from esg.data import CSV_PATH
+from esg.entities import read_hierarchy
+
+#the indicators of wb_ed and the years it shows
+INDICATORS = ['EN.ATM.CO2E.PC', 'EN.ATM.METH.PC', 'EN.ATM.NOXE.PC', 'NY.GDP.MKTP.KD.ZG', 'EG.FEC.RNEW.ZS',
+              'NY.ADJ.DRES.GN.ZS', 'NY.ADJ.DFOR.GN.ZS', 'AG.LND.FRST.ZS']
+KEYS = ['ind', 'indicator', 'country', 'continent', 'sub-region']
+YEARS = list(map(str, range(1990, 2019)))
+
+#the selections compared: a few countries and every sub-region and continent, for some years and all years
+HIERARCHY = read_hierarchy()
+SELECTIONS = (['Germany', 'China', 'Greece', 'Brazil', 'Nigeria']
+              + sorted({row[1] for row in HIERARCHY if row[1]}) + sorted({row[2] for row in HIERARCHY if row[2]}))
+PERIODS = ['1990', '2005', '2018', None]
+
+#relative tolerance of the values, as the store keeps them as float32
+RTOL = 1e-5
+
+
+# the cleaned data of wb_ed computed with pandas from df_esg.csv: the rows of its indicators with a value in one of
+# the years with any value, without duplicates, and the population of every country and year
+@pytest.fixture(scope='module')
+def reference():
+    df_esg = pd.read_csv(CSV_PATH)
+    df = df_esg[df_esg['ind'].isin(INDICATORS)]
+    years = [year for year in YEARS if df[year].notna().any()]
+    df = df.dropna(subset=years, how='all')[KEYS + years].drop_duplicates().reset_index(drop=True)
+
+    #the total population where the dataset has it, else the total CO2 emissions over the emissions per capita
+    def by_country(code):
+        rows = df_esg[df_esg['ind'] == code].drop_duplicates('country')
+        return rows.set_index('country')[years].astype(float)
+
+    per_capita = by_country('EN.ATM.CO2E.PC')
+    derived = by_country('EN.ATM.CO2E.KT').reindex(per_capita.index) * 1000 / per_capita.where(per_capita > 0)
+    population = by_country('SP.POP.TOTL')
+    population = population.where(population > 0).combine_first(derived)
+    return df, years, population
+
+
+# the mean of an indicator per group of the level weighted by population, one column per group
+def weighted_means(reference, level, indicator):
+    df, years, population = reference
+    rows = df[df['indicator'] == indicator]
+    values = rows.set_index('country')[years]
+    weights = population.reindex(values.index)
+    weights = weights.where(values.notna() & (weights > 0))
+    groups = rows[level].to_numpy()
+    sums = (values * weights).groupby(groups).sum()
+    totals = weights.groupby(groups).sum()
+    return (sums / totals.where(totals > 0)).T
+
+
+# the series of the traces of the figures, by trace: its name, labels (x or the labels of a pie) and values
+def traces(figures):
+    series = []
+    for figure in figures:
+        for trace in figure.data:
+            labels = trace.labels if trace.type == 'pie' else trace.x
+            values = trace.values if trace.type == 'pie' else trace.y
+            series.append((trace.name, [str(label) for label in labels],
+                           np.asarray(values, dtype=np.float64)))
+    return series
+
+
+def assert_same(figures, expected):
+    found = traces(figures)
+    assert [(name, labels) for name, labels, _ in found] == [(name, labels) for name, labels, _ in expected]
+    for (name, _, values), (_, _, expected_values) in zip(found, expected):
+        np.testing.assert_allclose(values, expected_values, rtol=RTOL, err_msg=str(name))
+
+
+def bar(series, name=None):
+    return name, [str(label) for label in series.index], series.to_numpy(dtype=np.float64)
+
+
+# the figures of update_output for a selection
+def output_figures(option, year):
+    return [graph.children.figure for row in wb_ed.update_output(option, year) for graph in row.children]
+
+
+# the figures update_output should show for a selection, computed from the reference data
+def expected_output(reference, option, year):
+    df, years, _ = reference
+    level = 'country' if option in set(df['country']) else 'sub-region' if option in set(df['sub-region']) else 'continent'
+    gases = [wb_ed.CO2, wb_ed.METHANE, wb_ed.NITROUS_OXIDE]
+
+    def top_10(indicator, scope=None):
+        rows = df[df['indicator'] == indicator]
+        if scope is not None:
+            rows = rows[rows[scope] == option]
+        return rows.nlargest(10, year).set_index('country')[year]
+
+    def history(indicator):
+        rows = df[(df['country'] == option) & (df['indicator'] == indicator)]
+        values = rows[years].iloc[0] if len(rows) else pd.Series(np.nan, index=years)
+        return pd.Series(values.to_numpy(dtype=np.float64), index=[int(year) for year in years])
+
+    def members(indicator):
+        rows = df[(df[level] == option) & (df['indicator'] == indicator)]
+        return [bar(pd.Series(row[years].to_numpy(dtype=np.float64), index=[int(year) for year in years]), row['country'])
+                for _, row in rows.iterrows()]
+
+    def groups(indicator):
+        means = weighted_means(reference, level, indicator)
+        means.index = [int(year) for year in means.index]
+        return [bar(means[group], group) for group in means.columns]
+
+    if level == 'country' and year is not None:
+        row = df[df['country'] == option].set_index('indicator')[year].reindex(gases)
+        return [bar(row)] + [bar(top_10(indicator)) for indicator in gases]
+    if level == 'sub-region' and year is not None:
+        return [bar(top_10(indicator, level)) for indicator in [wb_ed.CO2, wb_ed.GDP_GROWTH, wb_ed.RENEWABLES,
+                                                                 wb_ed.FOREST_DEPLETION]]
+    if level == 'continent' and year is not None:
+        means = {gas: weighted_means(reference, 'continent', gas).loc[year] for gas in gases}
+        continents = sorted(set().union(*(mean.index for mean in means.values())))
+        return ([bar(top_10(wb_ed.CO2, level))]
+                + [bar(means[gas].reindex(continents), gas) for gas in gases]
+                + [bar(top_10(indicator, level)) for indicator in [wb_ed.RENEWABLES, wb_ed.RESOURCES_DEPLETION]])
+    if level == 'country':
+        short_labels = {wb_ed.CO2: 'CO2', wb_ed.METHANE: 'Methane', wb_ed.NITROUS_OXIDE: 'Nitrous oxide'}
+        return ([bar(history(gas), short_labels[gas]) for gas in gases]
+                + [bar(history(indicator)) for indicator in [wb_ed.RENEWABLES, wb_ed.GDP_GROWTH, wb_ed.FOREST_AREA]])
+    return groups(wb_ed.CO2) + members(wb_ed.CO2) + members(wb_ed.METHANE) + members(wb_ed.NITROUS_OXIDE)
+
+
+@pytest.mark.parametrize('year', PERIODS)
+@pytest.mark.parametrize('option', SELECTIONS)
+def test_update_output(reference, option, year):
+    if option not in set(reference[0][['country', 'sub-region', 'continent']].to_numpy().ravel()):
+        pytest.skip(f'{option} has no data in the fixture')
+    assert_same(output_figures(option, year), expected_output(reference, option, year))
+
+
+@pytest.mark.parametrize('year', ['1990', '2005', '2018'])
+def test_get_graph(year):
+    #the data of the co2 dashboard as the original callback computed it from its cleaned frame
+    df = co2emmissions.newdf_co2
+    top = df.nlargest(10, year).set_index('country')[year] / 1000000
+    volumes = (df[co2emmissions.years].sum(axis=0) / 1000000).apply(lambda x: round(x, 2))
+    continents = (df.groupby('continent')[year].sum() / 1000000).apply(lambda x: round(x, 2))
+    assert_same(co2emmissions.get_graph(year), [bar(top, ''), bar(volumes, ''), bar(continents, '')])
@@ -0,0 +1,46 @@
+// clientside version of get_graph in co2emmissions.py, used when the app runs with ESG_CLIENTSIDE=1.
+// data is built by clientside_data(): the figures of the first year are copied and only their data
+// and titles are replaced with the values of the entered year, so no request reaches the server.
+// get_baked is used when the app runs with ESG_STATIC=1: the figures of every year were rendered by
+// python -m esg.bake and baked is their manifest (years and url), so only a json file is fetched
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    co2: {
+        get_graph: function (enteredYear, data) {
+            var year = String(enteredYear);
+            if (!data || !data.top.hasOwnProperty(year)) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            // top 10 emmitting countries for that year
+            var fig1 = JSON.parse(JSON.stringify(data.figures[0]));
+            fig1.data[0].x = data.top[year].x;
+            fig1.data[0].y = data.top[year].y;
+            fig1.layout.title.text = 'Top 10 emmitting countries in year ' + year + ' in CO2 Gigatons';
+
+            // the global emmissions are the same for every year
+            var fig2 = data.figures[1];
+
+            // emmissions per continent for that year
+            var fig3 = JSON.parse(JSON.stringify(data.figures[2]));
+            fig3.data[0].labels = data.pie[year].labels;
+            fig3.data[0].values = data.pie[year].values;
+            fig3.data[0].hovertemplate = fig3.data[0].hovertemplate.replace('<br>' + data.year + '=', '<br>' + year + '=');
+            fig3.layout.title.text = 'Pie plot of CO2 emmissions per continent in Gigatons in year ' + year;
+
+            return [fig1, fig2, fig3];
+        },
+
+        get_baked: function (enteredYear, baked) {
+            var year = String(enteredYear);
+            if (baked.years.indexOf(year) < 0) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+            return fetch(baked.url + '/graph/' + year + '.json?v=' + baked.version).then(function (response) {
+                if (!response.ok) {
+                    throw new Error('could not fetch the figures of ' + year + ': ' + response.status);
+                }
+                return response.json();
+            });
+        }
+    }
+});
@@ -1,29 +1,38 @@
 #import necessary libraries
-import pandas as pd
 import dash
-from dash import Input, Output, dcc, html
+from dash import ClientsideFunction, Input, Output, State, dcc, html
 import plotly.express as px
-import numpy as np
-
-
-#store the df_esg file into a dataframe
-file = "https://raw.githubusercontent.com/Ale3isk/esg/main/df_esg.csv"
-df_esg = pd.read_csv(file)
+from plotly.io.json import to_json_plotly
+import json
+import os
+import sys
+
+#make the esg package of the repository root importable when the script is run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from esg.cleaning import drop_empty_columns
+from esg.cube import AggregateCube
+from esg.bake import STATIC, baked_source, read_manifest, register_baked
+from esg.data import dataset_version, load_esg
+from esg.figcache import FigureCache
+from esg.memo import memoize
+from esg.metrics import TimedModule, cache_collector, instrument, register_metrics, REGISTRY
+from esg.ranking import RankingIndex
+from esg.releases import release_paths
 
 #we define a years variable so that we have the range of years from 1961 to 2021
 years = list(map(str,range(1960,2022)))
 
+#store the df_esg file into a dataframe. It is read from the local snapshot (see esg/data.py)
+#and we only read the columns that this dashboard uses
+#with ESG_RELEASE=YYYY-MM-DD the dashboard shows that release of the release store (see esg/releases.py)
+csv_path, snapshot_dir = release_paths()
+df_esg = load_esg(columns=['Unnamed: 0'] + years + ['indicator', 'country', 'continent'], csv_path=csv_path, snapshot_dir=snapshot_dir)
+
 #we will extract the part of the dataframe which contains the CO2 emmissions in kilotons
 df_co2 = df_esg[df_esg['indicator'] == 'CO2 emissions (kt)']
 
-#we will remove all the columns for which the sum of nan values for CO2 emmissions is equal to the total count of the column.
-for i in years:
-    count = 0
-    for value in df_co2[i]:
-        if np.isnan(value):
-            count+=1
-    if count == len(df_co2[i]):
-        df_co2.drop([i], axis = 1, inplace = True)
+#we will remove all the year columns which do not have any value for CO2 emmissions (see esg/cleaning.py)
+df_co2 = drop_empty_columns(df_co2, years)
 
 #drop duplicates
 df_co2 = df_co2.drop_duplicates()
@@ -42,6 +51,22 @@ newdf_co2 = df_co2.dropna(subset = years, how = 'all')
 #change the name of the United Kingdom to UK as the string occupies a lot of space
 newdf_co2.loc[67,'country'] = 'UK'
 
+#sum the emmissions of every year per continent and globally once, so that get_graph only reads them (see esg/cube.py)
+co2_years = [year for year in map(str, range(1960, 2022)) if year in newdf_co2.columns]
+cube = AggregateCube.from_frame(newdf_co2, ['continent'], co2_years)
+
+#rank the countries for every year once so that the top 10 chart only slices the ranking (see esg/ranking.py)
+ranking = RankingIndex.from_frame(newdf_co2, [], co2_years)
+
+#the figures only depend on the year and the dataset, so we keep the most recent ones in memory (see esg/memo.py)
+version = dataset_version(csv_path, snapshot_dir)
+
+#behind the memory cache, the figures are kept on the local disk and shared by all workers of the host (see esg/figcache.py)
+figure_cache = FigureCache()
+
+#the plotly.express calls are timed as the 'figure' phase of get_graph (see esg/metrics.py)
+px = TimedModule(px)
+
 # initiate a dash app
 app = dash.Dash(__name__)
 
@@ -87,18 +112,21 @@ app.layout = html.Div(
     )
 
 
-# Add controls to build the interaction
-@app.callback(
-    [Output(component_id='bar-plot', component_property='figure'),
-     Output(component_id='pie-plot', component_property='figure'),
-     Output(component_id='bar-plot2', component_property='figure')],
-    [Input(component_id='input-yr', component_property='value')])
+# the outputs of the interaction
+outputs = [Output(component_id='bar-plot', component_property='figure'),
+           Output(component_id='pie-plot', component_property='figure'),
+           Output(component_id='bar-plot2', component_property='figure')]
+
+
+@instrument('get_graph', branch=lambda entered_year: 'year')
+@memoize(maxsize=int(os.environ.get('ESG_CACHE_SIZE', 512)), version=version)
+@figure_cache.memoize('co2emmissions.get_graph', version)
 def get_graph(entered_year):
     # select data
     df_plot = newdf_co2[[str(entered_year), 'country']]
 
     # top 10 emmitting countries for that year
-    g1 = newdf_co2.nlargest(10, str(entered_year))
+    g1 = newdf_co2.iloc[ranking.top('CO2 emissions (kt)', str(entered_year))].copy()
     # convert kilotons to gigatons divide by a million as there are a million kilotons in one gigaton
     g1[str(entered_year)] = g1[str(entered_year)] / 1000000
 
@@ -113,7 +141,7 @@ def get_graph(entered_year):
     fig1.update_layout()
 
     # select data
-    g2 = newdf_co2[years].sum(axis=0).reset_index().rename(columns={"index": 'year', 0: 'volume'})
+    g2 = cube.totals('CO2 emissions (kt)')[years].reset_index().rename(columns={"index": 'year', 0: 'volume'})
     # convert kilotons to gigatons divide by a million as there are a million kilotons in one gigaton
     g2['volume'] = g2['volume'] / 1000000
     g2['volume'] = g2['volume'].apply(lambda x: round(x,2))
@@ -126,7 +154,7 @@ def get_graph(entered_year):
                    title='Global emmissions in CO2 Gigatons')
     fig2.update_layout()
 
-    g3 = newdf_co2.groupby('continent')[str(entered_year)].sum().reset_index()
+    g3 = cube.frame('continent', 'CO2 emissions (kt)')[[str(entered_year)]].reset_index()
     g3[str(entered_year)] = (g3[str(entered_year)] / 1000000).apply(lambda x: round(x, 2))
 
     fig3 = px.pie(g3, 'continent',
@@ -136,6 +164,52 @@ def get_graph(entered_year):
     return fig1, fig2, fig3
 
 
+# the data that the browser needs to switch between years on its own (see assets/co2.js).
+# the figures of the first year are used as templates and for every year we send the top 10 countries
+# and the emmissions per continent, computed exactly as in get_graph
+def clientside_data():
+    shown_years = [year for year in map(str, range(1990, 2020)) if year in co2_years]
+    figures = json.loads(to_json_plotly(get_graph(shown_years[0])))
+
+    top = {}
+    pie = {}
+    continents = cube.frame('continent', 'CO2 emissions (kt)')
+    for year in shown_years:
+        g1 = newdf_co2.iloc[ranking.top('CO2 emissions (kt)', year)]
+        top[year] = {'x': g1['country'].tolist(), 'y': (g1[year] / 1000000).tolist()}
+        pie[year] = {'labels': continents.index.tolist(),
+                     'values': (continents[year] / 1000000).apply(lambda x: round(x, 2)).tolist()}
+
+    return {'year': shown_years[0], 'figures': figures, 'top': top, 'pie': pie}
+
+
+# Add controls to build the interaction.
+# with ESG_CLIENTSIDE=1 the data of all years is sent once with the layout and the figures are built in the browser,
+# so changing the year does not reach the server. With ESG_STATIC=1 the browser fetches the figures of the year
+# baked by esg/bake.py. Otherwise get_graph runs on the server for every year entered
+if os.environ.get('ESG_CLIENTSIDE') == '1':
+    app.layout.children.append(dcc.Store(id='co2-data', data=clientside_data()))
+    app.clientside_callback(ClientsideFunction(namespace='co2', function_name='get_graph'),
+                            outputs,
+                            [Input(component_id='input-yr', component_property='value'),
+                             Input(component_id='co2-data', component_property='data')])
+elif STATIC:
+    app.layout.children.append(dcc.Store(id='baked', data=baked_source('co2emmissions', read_manifest('co2emmissions'))))
+    app.clientside_callback(ClientsideFunction(namespace='co2', function_name='get_baked'),
+                            outputs,
+                            [Input(component_id='input-yr', component_property='value')],
+                            [State(component_id='baked', component_property='data')])
+    register_baked(app.server)
+else:
+    app.callback(outputs, [Input(component_id='input-yr', component_property='value')])(get_graph)
+
+
+#latency histograms of get_graph and counters of its caches are served on /metrics (see esg/metrics.py)
+register_metrics(app.server)
+REGISTRY.add_collector('co2emmissions.get_graph', cache_collector('co2emmissions.get_graph', get_graph.cache))
+REGISTRY.add_collector('co2emmissions.figures', cache_collector('co2emmissions.figures', figure_cache))
+
+
 # run the app
 if __name__ == '__main__':
     app.run_server(debug=True)
@@ -1,1361 +1,785 @@
 #import necessary libraries
-import pandas as pd
-import dash
-from dash import dcc, html
-from dash.dependencies import Input, Output
-import plotly.express as px
-
-#import the csv file from github https://raw.githubusercontent.com/Ale3isk/esg/main/df_esg.csv
-df_esg = pd.read_csv("https://raw.githubusercontent.com/Ale3isk/esg/main/df_esg.csv")
-
-#we will create a list of the years that we need mapping each year as a string
-years = [i for i in map(str, range(1990,2019))]
-
-#filter the main dataframe by extracting all rows with the relevant indicators
-new_df = df_esg[df_esg['ind'].isin(["EN.ATM.CO2E.PC",
-                                     "EN.ATM.METH.PC",
-                                     "EN.ATM.NOXE.PC",
-                                     "NY.GDP.MKTP.KD.ZG",
-                                    "EG.FEC.RNEW.ZS",
-                                    "NY.ADJ.DRES.GN.ZS",
-                                    "NY.ADJ.DFOR.GN.ZS",
-                                    "AG.LND.FRST.ZS"])].reset_index()
-
-#drop all year columns from 1960 up to 1989 as the World Bank dataset does not include any date for these years
-new_df = new_df.drop(['index','Unnamed: 0',"iso3",'group','pillar'], axis = 1).drop(list(map(str,range(1960,1990))),axis = 1).reset_index()
-
-# we will delete all years for which there is no data for any of our environmental indicators
-# create a list of the indicators
-indicators = ["EN.ATM.CO2E.PC",
-              "EN.ATM.METH.PC",
-              "EN.ATM.NOXE.PC",
-              "NY.GDP.MKTP.KD.ZG",
-              "EG.FEC.RNEW.ZS",
-              "NY.ADJ.DRES.GN.ZS",
-              "NY.ADJ.DFOR.GN.ZS"
-              "AG.LND.FRST.ZS"]
-
-# iterate through each year
-for year in years:
-
-    # for each year we set the variable count as 0
-    count = 0
-
-    # iterate through each indicator on each year
-    for indicator in indicators:
-
-        # if the sum of all NaN values in the series of the corresponding year and indicator
-        # is equal to the length of the series then we add +1 in the count variable
-        # the inner for loop will iterate across all indicators doing the same check
-        if pd.isna(new_df[new_df['ind'] == indicator][year]).sum() == new_df[new_df['ind'] == indicator].shape[0]:
-            count += 1
-
-    # if the count of the resulting inner loop is equal to the length of the indicators list
-    # then we delete the column as there's no data for any indicator in that year.
-    if count == len(indicators):
-        new_df.drop([year], axis=1, inplace=True)
-
-#let's delete the year 2021 as well as our indicators do not have any data in that column
-new_df.drop(['index','2021'], axis = 1,inplace = True)
-
-#create a list of the dataframe's indexes.
-rows = list(new_df.index)
-
-#reverse the list so that we can iterate inversely and be able to execute the for loop without resulting errors.
-rows.reverse()
-
-# loop through the list of rows
-for row in rows:
-    # set the count variable to 0 on each outer loop
-    count = 0
-
-    # loop through each row and the years 1990 to 2018
-    for value in new_df.loc[row, '1990':'2018']:
-        # if a value is NaN
-        if pd.isna(value):
-            # add 1 to the count variable
-            count += 1
-    # if the resulting value of the count variable is equal to 36 (the length of each row) then that means that
-    # the row contains nan values and therefore we will delete it.
-    if count == len(new_df.loc[row, '1990':'2018']):
-        # if the sum of nan values equals the length of the row, delete the row and repeat the loop
-        new_df.drop(row, inplace=True)
-
-#reset the index
-new_df.reset_index(inplace = True)
-
-#delete the column "index" which was created after resetting the index
-new_df.drop(['index'],axis = 1, inplace = True)
-
-#delete columns corresponding to years 2019 and 2020
-new_df.drop(['2019','2020'],axis = 1, inplace = True)
-
-#redefine the years from 1990 to 2018
-years = list(map(str,range(1990,2019)))
-
-#check if there are duplicates and remove any:
-if new_df.shape[0] != new_df.drop_duplicates().shape[0]:
-    new_df = new_df.drop_duplicates()
-
-# create a dash application
-app = dash.Dash(__name__)
-
-app.layout = html.Div(style={'backgroundColor': 'black', 'color': '#7FFF00', 'width': '100%'}, children=[
-
-    html.H1(children='A comparative depiction of environmental data (World Bank Data)', style={'textAlign': 'center'}),
-
-    html.H1('Country | Sub-region | Continent', style={'textAlign': 'center'}),
-
-    dcc.RadioItems(options=['country',
-                            'sub-region',
-                            'continent'
-                            ],
-                   value='country',
-                   id='controls-and-radio-item',
-                   inline=True,
-                   ),
-
-    dcc.RadioItems(options=['Year',
-                            'All years'
-                            ],
-                   value='Year',
-                   id='controls-and-radio-item2',
-                   inline=True
-                   ),
-
-    dcc.Dropdown(id='dropdown-selection',
-                 style={
-
-                     'width': '99.8%',  # set width as 80%
-                     'padding': '3px',  # set padding as 3px
-                     'fontsize': '20px',  # set font size as 20px
-                     'textAlignLast': 'center',  # set text-align-last as center
-                     'backgroundColor': 'black',  # set background color as black
-                     'color': 'black'  # set text color as white
-                 }
-
-                 ),
-
-    dcc.Dropdown(id='Year',
-                 options=[{'label': year, 'value': year} for year in new_df[years].columns],
-                 placeholder='select-year',
-                 style={
-
-                     'width': '99.8%',  # set width as 80%
-                     'padding': '3px',  # set padding as 3px
-                     'fontsize': '20px',  # set font size as 20px
-                     'textAlignLast': 'center',  # set text-align-last as center
-                     'backgroundColor': 'black',  # set background color as black
-                     'color': 'black'  # set text color as white
-                 }
-
-                 ),
-
-    html.Div([
-        html.Div(id='output-container',
-                 className='chart-grid',
-                 style={'display': 'flex'})
-    ])
-
-]
-                      )
-
-
-@app.callback(
-    Output('dropdown-selection', 'options'),
-    [Input('controls-and-radio-item', 'value')]
-)
-def update_dropdown(selected_option):
-    if selected_option == 'country':
-        return [{'label': country, 'value': country} for country in sorted(new_df['country'].unique())]
-
-    elif selected_option == 'sub-region':
-        return [{'label': sub_region, 'value': sub_region} for sub_region in sorted(new_df['sub-region'].unique())]
-    elif selected_option == 'continent':
-        return [{'label': continent, 'value': continent} for continent in sorted(new_df['continent'].unique())]
-
-
-@app.callback(
-    Output(component_id='Year', component_property='disabled'),
-    Input(component_id='controls-and-radio-item2', component_property='value')
-)
-def update_period(selected_option):
-    if selected_option == 'Year':
-        return False
-    else:
-        return True
-
-
-@app.callback(
-    Output(component_id='output-container', component_property='children'),
-    [Input(component_id='dropdown-selection', component_property='value'),
-     Input(component_id='Year', component_property='value')])
-def update_output(option, year):
-    light_green_color = '#7FFF00'  # HEX color code for light green
-
-    # OPTION 1: USER SELECTS COUNTRY AND YEAR
-
-    if option in new_df['country'].unique() and year in years:
-
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 1: EMMISSIONS DATA PER YEAR FOR SELECTED COUNTRY AND YEAR
-        # --------------------------------------------------------------------------------------
-
-        # get the dataframe for the country and the year
-        my_check = new_df[new_df['country'] == option].set_index('indicator')[year].transpose().reset_index()
-
-        my_check.head()
-
-        # get the piece of the dataframe for the emmissions indicators
-        my_check = my_check[my_check['indicator'].isin(["CO2 emissions (metric tons per capita)",
-                                                        "Methane emissions (metric tons of CO2 equivalent per capita)",
-                                                        "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"])]
-
-        # we will change the x labels' names
-        xlabels = ["CO2", "Methane", "Nitrous oxide"]
-
-        # set the plot
-        figure1 = px.bar(my_check,
-                         x="indicator",
-                         y=year,
-                         labels={"indicator": "Indicator", year: "Metric tons per capita"},
-                         title=f"Bar plot of Greenhous Gasses Emmissions per capita for {option}"
-                         )
-
-        # Update x-axis labels
-        figure1.update_xaxes(tickvals=[0, 1, 2], ticktext=xlabels)
-
-        # Update layout to change background color and label color
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Greenhouse Gas Emissions in {option} per capita for ' + year, 'x': 0.5}
-            # Add title and align it to the center
-        })
-
-        # Update traces to change bar color
-        light_green_color = '#7FFF00'  # HEX color code for light green
-        figure1.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure1.update_yaxes(range=[0, my_check[year].max() + 2])  # update y axes limits range
-
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
-
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 2 TOP 10 COUNTRIES CO2 EMMISSIONS PER CAPITA FOR SELECTED YEAR
-        # --------------------------------------------------------------------------------------
-
-        my_check2 = new_df.set_index('indicator')[[year, 'country']].reset_index()
-
-        my_check2 = my_check2[my_check2['indicator'].isin(["CO2 emissions (metric tons per capita)",
-                                                           "Methane emissions (metric tons of CO2 equivalent per capita)",
-                                                           "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"])]
-
-        g1 = my_check2[my_check2['indicator'] == "CO2 emissions (metric tons per capita)"].nlargest(10, year)
-
-        figure2 = px.bar(g1,
-                         x="country",
-                         y=year,
-                         title="Top 10 countries CO2 emmissions metric tons per capita for " + year,
-                         labels={'country': 'Country',
-                                 year: 'Metric tons per capita'
-                                 }
-                         )
-
-        # Update layout to change background color and label color
-        figure2.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': 'Top 10 countries CO2 emmissions per capita for ' + year, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        # Update traces to change bar color
-        light_green_color = '#7FFF00'  # HEX color code for light green
-        figure2.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure2.update_yaxes(range=[0, g1[year].max() + 7])  # update y axes limits range\
-
-        # set the first dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
-
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 3 TOP 10 COUNTRIES METHANE EMMISSIONS (CO2 METRIC TONS EQUIVALENT PER CAPITA)
-        # --------------------------------------------------------------------------------------
-
-        my_check3 = new_df.set_index('indicator')[[year, 'country']].reset_index()
-
-        g2 = my_check3[
-            my_check3['indicator'] == "Methane emissions (metric tons of CO2 equivalent per capita)"].nlargest(10, year)
-
-        figure3 = px.bar(g2,
-                         x="country",
-                         y=year,
-                         title="Top 10 countries methane emmissions per capita for " + year,
-                         labels={'country': 'Country',
-                                 year: 'Metric tons of CO2 equivalent per capita'
-                                 }
-                         )
-
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': 'Top 10 countries methane emmissions per capita for ' + year, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        # Update traces to change bar color
-        light_green_color = '#7FFF00'  # HEX color code for light green
-        figure3.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure3.update_yaxes(range=[0, g2[year].max() + 5])  # update y axes limits range\
-
-        # set the first dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
-
-        # -----------------------------------------------------------------------------------------------
-        # GRAPH NO 4 TOP 10 COUNTRIES NITROUS OXIDE EMMISSIONS (METRIC TONS OF CO2 EQUIVALENT PER CAPITA)
-        # -----------------------------------------------------------------------------------------------
-
-        my_check4 = new_df.set_index('indicator')[[year, 'country']].reset_index()
-
-        g3 = my_check4[
-            my_check4['indicator'] == "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"].nlargest(10,
-                                                                                                                     year)
-
-        figure4 = px.bar(g3,
-                         x="country",
-                         y=year,
-                         title=f"Top 10 countries nitrous oxide emissions per capita for " + year,
-                         labels={'country': 'Country',
-                                 year: 'Metric tons of CO2 equivalent per capita'
-                                 }
-                         )
-
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Top 10 countries nitrus oxide emmissions per capita for ' + year, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        # Update traces to change bar color
-        light_green_color = '#7FFF00'  # HEX color code for light green
-        figure4.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure4.update_yaxes(range=[0, g3[year].max() + 5])  # update y axes limits range
-
-        # set the first dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
-
-        # -----------------------------------------------------------------------------------------------
-        # RETURN THE GRAPHS
-        # -----------------------------------------------------------------------------------------------
-
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
-
-    # OPTION 2: USER SELECTS SUB-REGION AND YEAR
-    elif option in new_df['sub-region'].unique() and year in years:
-
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 1: TOP 10 CO2 EMMISSIONS DATA PER SUB-REGION PER YEAR
-        # --------------------------------------------------------------------------------------
-
-        my_check1 = new_df[(new_df['sub-region'] == option) & (
-                    new_df['indicator'] == "CO2 emissions (metric tons per capita)")].set_index('indicator')[
-            ['country', year]].nlargest(10, year)
-
-        if len(my_check1['country']) < 10:
-
-            title1 = f"{my_check1.index[0]} in {option}<br> for {year}"
-
-        else:
-
-            title1 = f"Top 10 {option} in {my_check1.index[0]}<br> in {year}"
-
-        figure1 = px.bar(my_check1,
-                         x='country',
-                         y=year,
-                         title=title1,
-                         labels={'country': 'Country', year: "Metric tons per capita"
-                                 }
-                         )
-
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': title1, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        figure1.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure1.update_yaxes(range=[0, my_check1[year].max() + 5])  # update y axes limits range
-
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
+import logging
+import os
+import threading
 
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 2: TOP 10 COUNTRIES GDP GROWTH (ANNUAL %) PER SUB-REGION AND YEAR
-        # --------------------------------------------------------------------------------------
-
-        my_check2 = \
-        new_df[(new_df['sub-region'] == option) & (new_df['indicator'] == "GDP growth (annual %)")].set_index(
-            'indicator')[['country', year]].nlargest(10, year)
-
-        if len(my_check2['country']) < 10:
-
-            title2 = f"{my_check2.index[0]} in {option} for {year}"
-
-        else:
-
-            title2 = f"Top 10 countries in {option} in {my_check2.index[0]} in {year}"
-
-        figure2 = px.bar(my_check2,
-                         x='country',
-                         y=year,
-                         title=title2,
-                         labels={'country': 'Country', year: "GDP growth (annual %)"
-                                 }
-                         )
-
-        figure2.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': title2, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        figure2.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure2.update_yaxes(range=[-5, my_check2[year].max() + 5])  # update y axes limits range
-
-        # set the second dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
+import dash
+from dash import ClientsideFunction, dcc, html
+from dash.dependencies import Input, Output, State
+
+from esg.api import register_api
+from esg.bake import STATIC, baked_source, read_manifest, register_baked
+from esg.catalog import CATALOG_SIZE, catalog_options
+from esg.derived import DERIVED_SIZE
+from esg.figcache import FigureCache
+from esg.memo import LRUCache, memoize
+from esg.metrics import TimedModule, cache_collector, instrument, register_metrics, startup_phase, REGISTRY
+from esg.warm import WARM_UP_SELECTIONS, AccessLog, CacheWarmer, hot_selections, read_selections, warm_up_collectors
+
+logger = logging.getLogger(__name__)
+
+#pandas, numpy and plotly.express as well as the dataset are only loaded by load(), on the first callback or in the
+#warm up started by create_app, so that importing this module and creating the app stay cheap.
+#the configuration of create_app can be changed with environment variables:
+#    ESG_WARM_UP  'background' loads the data in a thread while the server already starts (default),
+#                 'startup' loads it before create_app returns and 'none' waits for the first callback
+#    ESG_RELEASE  the release of the release store to show (see esg/releases.py), df_esg.csv when not set
+#    ESG_STATIC   '1' serves the states baked by esg/bake.py from the browser, so no callback and no warm up run
+#    ESG_WARM_CACHE          '0' does not compute the hottest selections once the data is loaded (see esg/warm.py)
+#    ESG_WARM_UP_SELECTIONS  json file of [option, year] pairs the cache warm up computes first
+DEFAULT_CONFIG = {'warm_up': os.environ.get('ESG_WARM_UP', 'background'), 'release': os.environ.get('ESG_RELEASE') or None,
+                  'csv_path': None, 'snapshot_dir': None, 'static': STATIC,
+                  'warm_cache': os.environ.get('ESG_WARM_CACHE', '1') != '0', 'warm_selections': WARM_UP_SELECTIONS}
+
+config = dict(DEFAULT_CONFIG)
+
+#the years that the dashboard shows
+years = list(map(str, range(1990, 2019)))
+
+#bump this number when the cleaning in load() changes, so that the mapped store of the cleaned data is rebuilt
+STORE_REVISION = 2
+
+_loaded = False
+_load_lock = threading.Lock()
+
+
+# import the heavy libraries, load and clean the dataset and build the structures that the callbacks read.
+# only the first call does the work, the others wait for it and return
+def load():
+    global _loaded, np, figures, Query, at_year, over_years, years, new_df, store, entities, index, cube, ranking, queries, catalog, derived, version
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+
+        with startup_phase('import libraries'):
+            import numpy as np
+
+            from esg import figures
+            from esg.catalog import IndicatorCatalog
+            from esg.cleaning import drop_empty_rows, drop_empty_years
+            from esg.cube import AggregateCube
+            from esg.data import dataset_version, load_esg
+            from esg.derived import DerivedMetrics
+            from esg.entities import EntityRegistry
+            from esg.index import SeriesIndex
+            from esg.mapped import open_store, save_store
+            from esg.population import POPULATION, TOTAL, row_population
+            from esg.query import Query, QueryEngine, at_year, over_years
+            from esg.ranking import RankingIndex
+            from esg.store import CompactStore
+
+            #the figure builders are timed as the 'figure' phase of the callbacks (see esg/metrics.py)
+            figures = TimedModule(figures)
+
+        #a release of the release store is read from its own csv file and snapshot folder
+        csv_path, snapshot_dir = config['csv_path'], config['snapshot_dir']
+        if config['release']:
+            from esg.releases import release_paths
+            csv_path, snapshot_dir = release_paths(config['release'])
+
+        #the hash of the dataset keys the caches of update_output and the mapped store
+        version = dataset_version(csv_path, snapshot_dir)
+
+        #the cleaned data is kept in memory mapped files (see esg/mapped.py) that all workers of the host share,
+        #so only the first worker started for a version of the dataset loads and cleans it
+        with startup_phase('open mapped store'):
+            store = open_store('wb_ed', version, snapshot_dir, STORE_REVISION)
+
+        if store is None:
+            with startup_phase('load data'):
+                #load the df_esg dataset from the local snapshot (see esg/data.py) reading only the columns we need.
+                #the snapshot is built once from df_esg.csv, originally published on https://raw.githubusercontent.com/Ale3isk/esg/main/df_esg.csv
+                df_esg = load_esg(columns=['ind'] + list(map(str, range(1990, 2022))) + ['indicator', 'country', 'continent', 'sub-region'],
+                                  csv_path=csv_path, snapshot_dir=snapshot_dir)
+
+            with startup_phase('clean data'):
+                #we will create a list of the years that we need mapping each year as a string
+                years = [i for i in map(str, range(1990,2019))]
+
+                #filter the main dataframe by extracting all rows with the relevant indicators
+                new_df = df_esg[df_esg['ind'].isin(["EN.ATM.CO2E.PC",
+                                                     "EN.ATM.METH.PC",
+                                                     "EN.ATM.NOXE.PC",
+                                                     "NY.GDP.MKTP.KD.ZG",
+                                                    "EG.FEC.RNEW.ZS",
+                                                    "NY.ADJ.DRES.GN.ZS",
+                                                    "NY.ADJ.DFOR.GN.ZS",
+                                                    "AG.LND.FRST.ZS"])].reset_index()
+
+                #the year columns from 1960 up to 1989 are not loaded as the World Bank dataset does not include any date for these years
+                new_df = new_df.drop(['index'], axis = 1).reset_index()
+
+                # we will delete all years for which there is no data for any of our environmental indicators
+                # create a list of the indicators
+                indicators = ["EN.ATM.CO2E.PC",
+                              "EN.ATM.METH.PC",
+                              "EN.ATM.NOXE.PC",
+                              "NY.GDP.MKTP.KD.ZG",
+                              "EG.FEC.RNEW.ZS",
+                              "NY.ADJ.DRES.GN.ZS",
+                              "NY.ADJ.DFOR.GN.ZS",
+                              "AG.LND.FRST.ZS"]
+
+                # we delete the years for which none of the indicators above has any data (see esg/cleaning.py)
+                new_df = drop_empty_years(new_df, years, indicators)
+
+                #let's delete the year 2021 as well as our indicators do not have any data in that column
+                new_df.drop(['index','2021'], axis = 1,inplace = True)
+
+                #delete all rows which have NaN values for every year from 1990 to 2018
+                new_df = drop_empty_rows(new_df, new_df.loc[:, '1990':'2018'].columns)
 
-        # -----------------------------------------------------------------------------------------------------------------------
-        # GRAPH NO 3: TOP 10 COUNTRIES RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION) PER SUB-REGION AND YEAR
-        # -----------------------------------------------------------------------------------------------------------------------
+                #reset the index
+                new_df.reset_index(inplace = True)
+
+                #delete the column "index" which was created after resetting the index
+                new_df.drop(['index'],axis = 1, inplace = True)
+
+                #delete columns corresponding to years 2019 and 2020
+                new_df.drop(['2019','2020'],axis = 1, inplace = True)
+
+                #redefine the years from 1990 to 2018
+                years = list(map(str,range(1990,2019)))
+
+                #check if there are duplicates and remove any:
+                if new_df.shape[0] != new_df.drop_duplicates().shape[0]:
+                    new_df = new_df.drop_duplicates()
+
+            with startup_phase('write mapped store'):
+                #keep the cleaned data in a compact store (see esg/store.py): the text columns become integer coded categoricals
+                #and the values of the years float32
+                store = CompactStore.from_frame(new_df, ['ind', 'indicator', 'country', 'continent', 'sub-region'], years)
+                try:
+                    save_store(store, 'wb_ed', version, snapshot_dir, STORE_REVISION)
+                    store = open_store('wb_ed', version, snapshot_dir, STORE_REVISION) or store
+                except OSError as e:
+                    logger.warning('could not write the mapped store, keeping the data in memory: %s', e)
 
-        my_check3 = new_df[(new_df['sub-region'] == option) & (new_df[
-                                                                   'indicator'] == "Renewable energy consumption (% of total final energy consumption)")].set_index(
-            'indicator')[['country', year]].nlargest(10, year)
+        #new_df is the wide view of the store that the callbacks use
+        years = store.years
+        new_df = store.frame
 
-        if len(my_check3['country']) < 10:
-            title3 = f"Renewable energy consumption in<br> {option} for {year}"
+        #every other indicator of the framework file is loaded when a user picks it (see esg/catalog.py)
+        catalog = IndicatorCatalog(version, years, csv_path, snapshot_dir, cache=catalog_cache)
 
-        else:
-            title3 = f"{option} Top 10 in renewable energy consumption<br> in {year}"
+        with startup_phase('derive population'):
+            #the population of the country of every row, read from the catalog or derived from the total CO2 emissions
+            #where the dataset has no population (see esg/population.py)
+            population = row_population(store, catalog.store(TOTAL), catalog.store(POPULATION))
 
-        figure3 = px.bar(my_check3,
-                         x='country',
-                         y=year,
-                         title=title3,
-                         labels={'country': 'Country', year: '% of total energy consumption'
-                                 }
-                         )
+        with startup_phase('build indexes'):
+            #code the countries, sub-regions and continents of the store and their hierarchy as in all.csv, so that the
+            #callbacks classify a selection and list the options with lookups (see esg/entities.py)
+            entities = EntityRegistry.from_store(store)
 
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': title3, 'x': 0.5}
-        })  # Add title and align it to the center
+            #the sub-region and the continent of every row in the registry. The index, the cube and the rankings all group
+            #the rows with these codes, so the totals of a group and its top 10 cover the same countries
+            groups = {level: entities.row_codes(store, level) for level in ['sub-region', 'continent']}
 
-        figure3.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure3.update_yaxes(range=[0, my_check3[year].max() + 5])  # update y axes limits range
+            #index the rows of the store by (scope, entity, indicator) so that the callbacks look up the rows they need (see esg/index.py)
+            index = SeriesIndex(store, codes=groups)
 
-        # set the third dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
+            #sum the values of every indicator per sub-region and per continent once, as well as their means weighted by
+            #population, so that the callbacks only read them (see esg/cube.py)
+            cube = AggregateCube(groups, store.codes('indicator'), store.categories('indicator'), store.values, years, population)
 
-        # ------------------------------------------------------------------------------------
-        # GRAPH NO 4: TOP 10 COUNTRIES NET FOREST DEPLETION (% OF GNI) PER SUB-REGION AND YEAR
-        # ------------------------------------------------------------------------------------
+            #rank the countries of every indicator and year globally, per sub-region and per continent once,
+            #so that the top 10 charts only slice the rankings (see esg/ranking.py)
+            ranking = RankingIndex.from_store(store, codes=groups)
 
-        my_check4 = new_df[(new_df['sub-region'] == option) & (
-                    new_df['indicator'] == "Adjusted savings: net forest depletion (% of GNI)")].set_index('indicator')[
-            ['country', year]].nlargest(10, year)
+            #the views of update_output ask for their data with queries planned on these structures (see esg/query.py)
+            queries = QueryEngine(store, index, cube, ranking, query_cache, version)
 
-        if len(my_check4['country']) < 10:
-            title4 = f"Net forest depletion in {option}<br> for {year}"
+        #growth rates and moving means of every series are computed when they are first asked for (see esg/derived.py)
+        derived = DerivedMetrics(store, version, cache=derived_cache)
 
-        else:
-            title4 = f"{option} Top 10 in<br> net forest depletion {year}"
-
-        figure4 = px.bar(my_check4,
-                         x='country',
-                         y=year,
-                         title=title4,
-                         labels={'country': 'Country', year: '(% of GNI)'
-                                 }
-                         )
-
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': title4, 'x': 0.5}
-        })  # Add title and align it to the center
-
-        figure4.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure4.update_yaxes(range=[-5, my_check4[year].max() + 5])  # update y axes limits range
-
-        # set the fourth dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
-
-        # -----------------------------------------------------------------------------------------------
-        # RETURN THE GRAPHS
-        # -----------------------------------------------------------------------------------------------
-
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
-
-    # OPTION 3: USER SELECTS CONTINENT AND YEAR
-
-    elif option in new_df['continent'].unique() and year in years:
-
-        # ------------------------------------------------------------------------------------
-        # GRAPH NO 1: TOP 10 COUNTRIES CO2 EMMISSIONS PER CONTINENT FOR SELECTED YEAR
-        # ------------------------------------------------------------------------------------
-
-        # create a dataframe where the chosen continent and year are selected. We also filter by indicator to get the CO2 emmissions
-        my_check1 = new_df[(new_df['continent'] == option) & (
-                    new_df['indicator'] == "CO2 emissions (metric tons per capita)")].set_index("indicator")[
-            [year, 'country']].nlargest(10, year)
-
-        figure1 = px.bar(my_check1,
-                         x='country',
-                         y=year,
-                         title=f"{option}: CO2 emmissions Top 10 in {year}",
-                         labels={'country': 'Country', year: "Metric tons per capita"
-                                 }
-                         )
-
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f"{option}: CO2 emmissions Top 10 in {year}", 'x': 0.5}
-            # Add title and align it to the center
-        })
-
-        figure1.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure1.update_yaxes(range=[0, my_check1[year].max() + 20])  # update y axes limits range
-
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
-
-        # ------------------------------------------------------------------------------------
-        # GRAPH NO 2: CUMULATIVE GHG EMMISSIONS PER CONTINENT FOR SELECTED YEAR
-        # ------------------------------------------------------------------------------------
-
-        # create a new dataframe where we filter by the necessary indicators
-        my_check2 = new_df[new_df['indicator'].isin(["CO2 emissions (metric tons per capita)",
-                                                     "Methane emissions (metric tons of CO2 equivalent per capita)",
-                                                     "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"])]
-
-        # group by continent and indicator and sum the values for the corresponding year for each indicator
-        grouped_my_check2 = my_check2.groupby(['continent', 'indicator'])[year].sum()
-
-        # re-asign table to a dataframe and reset the index
-        grouped_my_check2 = pd.DataFrame(grouped_my_check2).reset_index()
-
-        # create a pivot table with continent as the index, indicator as the column and the values for each indicator and reset the index
-        grouped_my_check2 = grouped_my_check2.pivot(index='continent', columns='indicator', values=year).reset_index()
-
-        # create a figure object
-        figure2 = px.bar(grouped_my_check2,
-                         x='continent',
-                         y=["CO2 emissions (metric tons per capita)",
-                            "Methane emissions (metric tons of CO2 equivalent per capita)",
-                            "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"
-                            ],
-
-                         color_discrete_map={'CO2 emissions (metric tons per capita)': 'white',
-                                             'Methane emissions (metric tons of CO2 equivalent per capita)': '#7FFF00',
-                                             'Nitrous oxide emissions (metric tons of CO2 equivalent per capita)': 'yellow'}
-                         )
-
-        # Update layout
-        figure2.update_layout({'plot_bgcolor': 'black',  # Change background color to black
-                               'paper_bgcolor': 'black',  # Change plot area color to black
-                               'font': {'color': 'white'},  # Change label color to white
-                               },
-                              title='Cumulative GHG emmissions in all continents ',
-                              xaxis_title='Continent',
-                              yaxis_title='Metric tons per capita*',
-                              yaxis=dict(titlefont=dict(size=18), tickfont=dict(size=14)))
-
-        # Add sub-note annotation
-        figure2.add_annotation(xref='paper',
-                               yref='paper',
-                               x=0.5,
-                               y=-0.3,
-                               text='*Values for Methane and Nitrus Oxide emmissions correspond to metric tons of CO2 equivalent per capita',
-                               showarrow=False,
-                               font=dict(size=12)
-                               )
-
-        # figure2.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure2.update_yaxes(range=[0, my_check2[year].max() + 500])  # update y axes limits range
-
-        # set the second dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
-
-        # -----------------------------------------------------------------------------------------------
-        # GRAPH NO 3: TOP 10 COUNTRIES RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION)
-        # -----------------------------------------------------------------------------------------------
-
-        # Renewable energy consumption (% of total final energy consumption)
-
-        my_check3 = new_df[(new_df['ind'] == "EG.FEC.RNEW.ZS") & (new_df['continent'] == option)][
-            [year, 'country']].nlargest(10, year)
-
-        figure3 = px.bar(my_check3,
-                         x='country',
-                         y=year,
-                         title=f"{option}: Renewable energy consumption<br> in {year}",
-                         labels={'country': 'Country', year: "(% of total final energy consumption)"
-                                 }
-                         )
-
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f"{option}: Renewable energy consumption<br> in {year}", 'x': 0.5}
-            # Add title and align it to the center
-        })
-
-        figure3.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure3.update_yaxes(range=[0, 100])  # update y axes limits range
-
-        # set the third dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
-
-        # -----------------------------------------------------------------------------------------------
-        # GRAPH NO 4: TOP 10 COUNTRIES ADJUSTED SAVINGS: NATURAL RESOURCES DEPLETION (% OF GNI)
-        # -----------------------------------------------------------------------------------------------
-
-        # Adjusted savings: natural resources depletion (% of GNI)
-
-        my_check4 = new_df[(new_df['ind'] == "NY.ADJ.DRES.GN.ZS") & (new_df['continent'] == option)][
-            [year, 'country']].nlargest(10, year)
-
-        figure4 = px.bar(my_check4,
-                         x='country',
-                         y=year,
-                         title=f"{option}: Top 10 Adjusted Savings:<br>Natural Resources Depletion in {year}",
-                         labels={'country': 'Country', year: "(% of GNI)"
-                                 }
-                         )
-
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f"{option}: Top 10 Adjusted Savings:<br>Natural Resources Depletion in {year}", 'x': 0.5}
-            # Add title and align it to the center
-        })
-
-        figure4.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure4.update_yaxes(range=[0, 40])  # update y axes limits range
-
-        # set the fourth dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
-
-        # -----------------------------------------------------------------------------------------------
-        # RETURN THE GRAPHS
-        # -----------------------------------------------------------------------------------------------
-
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
-
-
-    # OPTION 4: USER SELECTS COUNTRY AND ALL YEARS
-
-    elif option in new_df['country'].unique() and year not in years:
-
-        # --------------------------------------------------------------------------------------
-        # GRAPH NO 1: EVOLUTION OF GHG EMMISSIONS PER CAPITA THROUGHOUT THE YEARS
-        # --------------------------------------------------------------------------------------
-
-        # create a series of all CO2 metric tons per capita values across all years. Reset the index.
-        my_check1 = \
-        new_df[(new_df['country'] == option) & (new_df['indicator'].isin(["CO2 emissions (metric tons per capita)",
-                                                                          "Methane emissions (metric tons of CO2 equivalent per capita)",
-                                                                          "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"]))][
-            years].reset_index()
-
-        # drop the "index" column
-        my_check1.drop('index', axis=1, inplace=True)
-
-        # transpose the series
-        my_check1 = my_check1.T
+        _loaded = True
 
-        # reset the index
-        my_check1.reset_index(inplace=True)
-
-        # rename the columns
-        my_check1.rename(columns={"index": "Year", 0: "Value"}, inplace=True)
-
-        # convert the year column in data type int to modify the x limits of the plot
-        my_check1['Year'] = my_check1['Year'].astype(int)
-
-        # make a dataframe variable to use for plotting
-        my_check1 = pd.DataFrame(my_check1)
-
-        my_check1.rename(columns={'Value': 'CO2 emissions (metric tons per capita)',
-                                  1: 'Methane emissions (metric tons of CO2 equivalent per capita)',
-                                  2: 'Nitrous oxide emissions (metric tons of CO2 equivalent per capita)'},
-                         inplace=True)
-
-        # create a figure
-        figure1 = px.line(my_check1,  # the dataframe
-                          x='Year',  # the years will be on the x-axis
-                          y=['CO2 emissions (metric tons per capita)',
-                             'Methane emissions (metric tons of CO2 equivalent per capita)',
-                             'Nitrous oxide emissions (metric tons of CO2 equivalent per capita)'],
-                          # the values for each gas will be on the y axis
-                          labels={'value': 'Metric tons'},  # change the label for the y axis
-                          markers=True  # show markers on each point
-                          )
 
-        # Define shortened labels for the legend
-        short_labels = {'CO2 emissions (metric tons per capita)': 'CO2',
-                        'Methane emissions (metric tons of CO2 equivalent per capita)': 'Methane',
-                        'Nitrous oxide emissions (metric tons of CO2 equivalent per capita)': 'Nitrous oxide'}
+# the version of the dataset, which keys the caches of update_output
+def current_version():
+    load()
+    return version
 
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Greenhouse Gas emmissions per capita<br> in {option} [1990-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'legend': {'title': {'text': 'Gas'}, 'traceorder': 'normal', 'itemsizing': 'constant', 'itemwidth': 50},
-            # Update the legend properties
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
 
-        # Update legend labels
-        for trace in figure1.data:
-            trace.name = short_labels[trace.name]
+#the results of update_output only depend on the selection and the dataset, so we keep the most recent ones
+#in memory keyed by the selection and the hash of the dataset (see esg/memo.py). ESG_CACHE_SIZE sets how many we keep
+cache_size = int(os.environ.get('ESG_CACHE_SIZE', 512))
 
-        figure1.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure1.update_xaxes(
-            range=[my_check1['Year'].min() - 0.5, my_check1['Year'].max() + 0.5])  # Change the lims of the x axis
+#behind the memory cache, the serialized results are kept on the local disk and shared by all workers of the host (see esg/figcache.py)
+figure_cache = FigureCache()
 
-        # Show all years on x-axis
-        figure1.update_xaxes(tickmode='linear', tick0=my_check1['Year'].min(), dtick=1)
+#the results of the queries of the views, shared by the charts of several selections (see esg/query.py)
+query_cache = LRUCache(cache_size)
 
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
+#the indicators of the catalog loaded by this worker, ESG_CATALOG_SIZE sets how many are kept (see esg/catalog.py)
+catalog_cache = LRUCache(CATALOG_SIZE)
 
-        # -------------------------------------------------------------------------------------------
-        # GRAPH NO 2: EVOLUTION OF RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION)
-        # -------------------------------------------------------------------------------------------
+#the derived metrics computed by this worker, ESG_DERIVED_SIZE sets how many are kept (see esg/derived.py)
+derived_cache = LRUCache(DERIVED_SIZE)
 
-        # Create a Series with the relevant indicator and the country of choice
-        my_check2 = new_df[(new_df['country'] == option) & (
-                    new_df['indicator'] == "Renewable energy consumption (% of total final energy consumption)")][
-            years].reset_index()
 
-        # Drop the index column
-        my_check2.drop('index', axis=1, inplace=True)
+# the data served by the http api (see esg/api.py)
+def api_source():
+    load()
+    return {'store': store, 'index': index, 'derived': derived, 'version': version}
 
-        # Transpose the series
-        my_check2 = my_check2.T
 
-        # Rename the columns
-        my_check2.rename(columns={'index': 'year', 0: 'value'},
-                         inplace=True
-                         )
+#the options of the radio items choosing the level and the period of a selection
+LEVEL_OPTIONS = ['country', 'sub-region', 'continent']
+PERIOD_OPTIONS = ['Year', 'All years']
 
-        # make a dataframe variable to use for plotting
-        my_check2 = pd.DataFrame(my_check2)
 
-        # reset the index
-        my_check2.reset_index(inplace=True)
+# label of a radio item value, used to label the latency of its callback. Any value a client sends that is not an
+# option is 'unknown', so the series of the metrics stay bounded
+def option_branch(options):
+    return lambda selected_option: selected_option if selected_option in options else 'unknown'
 
-        # rename the index column
-        my_check2.rename(columns={'index': 'year'}, inplace=True)
 
-        # convert the year column in data type int to modify the x limits of the plot
-        my_check2['year'] = my_check2['year'].astype(int)
+# the level of a selection: the first of country, sub-region and continent that has it, or None
+def selection_level(option):
+    load()
+    return entities.level(option)
 
-        # set the figure
-        figure2 = px.bar(my_check2,
-                         x='year',
-                         y='value',
-                         labels={'value': '% of total final energy consumption'}
-                         )
 
-        figure2.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Renewable energy consumption<br> in {option} [1990-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
+# label of the view of update_output that answers a selection, used to label its latency
+def output_branch(option, year):
+    level = selection_level(option)
+    if level is None:
+        return 'none'
+    return f"{level} / {'year' if year in years else 'all years'}"
 
-        figure2.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure2.update_xaxes(range=[my_check2['year'].min() - 0.5, my_check2['year'].max() + 0.5])
 
-        # Show all years on x-axis
-        figure2.update_xaxes(tickmode='linear', tick0=my_check2['year'].min(), dtick=1)
+#the selections of the users are logged, so that the cache warm up of the next start computes the hottest first
+access_log = AccessLog()
 
-        # set the second dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
 
-        # -------------------------------------------------------------------------------------------
-        # GRAPH NO 3: EVOLUTION OF GDP ANNUAL GROWTH
-        # -------------------------------------------------------------------------------------------
+def log_selection(option, year):
+    if option is not None:
+        access_log.record(option, year)
 
-        # Create a Series with the relevant indicator and the country of choice
-        my_check3 = new_df[(new_df['country'] == option) & (new_df['indicator'] == "GDP growth (annual %)")][
-            years].reset_index()
 
-        # drop the "index" column
-        my_check3.drop('index', axis=1, inplace=True)
+# the selections warmed when neither the configuration nor the access log name enough:
+# every continent and sub-region for the latest year and for all years
+def default_selections():
+    load()
+    return [(option, year) for level in ['continent', 'sub-region'] for option in entities.names(level)
+            for year in [years[-1], None]]
 
-        # transpose the series
-        my_check3 = my_check3.T
-
-        # reset the index
-        my_check3.reset_index(inplace=True)
 
-        # rename the columns
-        my_check3.rename(columns={"index": "Year", 0: "Value"}, inplace=True)
-
-        # convert the year column in data type int to modify the x limits of the plot
-        my_check3['Year'] = my_check3['Year'].astype(int)
+# the selections computed by the cache warm up: the configured ones, the hottest of the access log and the defaults
+def warm_selections():
+    load()
+    configured = read_selections(config['warm_selections']) if config['warm_selections'] else []
+    return hot_selections(configured, access_log, default_selections(),
+                          valid=lambda *selection: len(selection) == 2 and output_branch(*selection) != 'none')
 
-        # make a dataframe variable to use for plotting
-        my_check3 = pd.DataFrame(my_check3)
 
-        figure3 = px.line(my_check3,
-                          x='Year',
-                          y='Value',
-                          labels={'value': 'Annual change (%)'},
-                          markers=True
-                          )
+# the layout of the dashboard. It does not depend on the data, so the page is served before the data is loaded
+def layout():
+    return html.Div(style={'backgroundColor': 'black', 'color': '#7FFF00', 'width': '100%'}, children=[
 
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'GDP growth in {option} [1980-2018]', 'x': 0.5},  # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
+        html.H1(children='A comparative depiction of environmental data (World Bank Data)', style={'textAlign': 'center'}),
 
-        figure3.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure3.update_xaxes(range=[my_check3['Year'].min() - 0.5, my_check3['Year'].max() + 0.5])
+        html.H1('Country | Sub-region | Continent', style={'textAlign': 'center'}),
 
-        # Show all years on x-axis
-        figure3.update_xaxes(tickmode='linear', tick0=my_check3['Year'].min(), dtick=1)
-        figure3.update_yaxes(range=[my_check3['Value'].min() - 1.5, my_check3['Value'].max() + 5])
+        dcc.RadioItems(options=LEVEL_OPTIONS,
+                       value='country',
+                       id='controls-and-radio-item',
+                       inline=True,
+                       ),
 
-        # set the third dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
+        dcc.RadioItems(options=PERIOD_OPTIONS,
+                       value='Year',
+                       id='controls-and-radio-item2',
+                       inline=True
+                       ),
 
-        # -------------------------------------------------------------------------------------------
-        # GRAPH NO 4: EVOLUTION OF ADJUSTED SAVINGS: NATURAL RESOURCES DEPLETION (% of GNI)
-        # -------------------------------------------------------------------------------------------
+        dcc.Dropdown(id='dropdown-selection',
+                     style={
 
-        # Create a Series with the relevant indicator and the country of choice
-        my_check4 = new_df[(new_df['country'] == option) & (new_df['indicator'] == "Forest area (% of land area)")][
-            years].reset_index()
+                         'width': '99.8%',  # set width as 80%
+                         'padding': '3px',  # set padding as 3px
+                         'fontsize': '20px',  # set font size as 20px
+                         'textAlignLast': 'center',  # set text-align-last as center
+                         'backgroundColor': 'black',  # set background color as black
+                         'color': 'black'  # set text color as white
+                     }
 
-        # drop the "index" column
-        my_check4.drop('index', axis=1, inplace=True)
+                     ),
 
-        # transpose the series
-        my_check4 = my_check4.T
+        dcc.Dropdown(id='Year',
+                     options=[{'label': year, 'value': year} for year in years],
+                     placeholder='select-year',
+                     style={
 
-        # reset the index
-        my_check4.reset_index(inplace=True)
+                         'width': '99.8%',  # set width as 80%
+                         'padding': '3px',  # set padding as 3px
+                         'fontsize': '20px',  # set font size as 20px
+                         'textAlignLast': 'center',  # set text-align-last as center
+                         'backgroundColor': 'black',  # set background color as black
+                         'color': 'black'  # set text color as white
+                     }
 
-        # rename the columns
-        my_check4.rename(columns={"index": "Year", 0: "Value"}, inplace=True)
+                     ),
 
-        # convert the year column in data type int to modify the x limits of the plot
-        my_check4['Year'] = my_check4['Year'].astype(int)
+        html.Div([
+            html.Div(id='output-container',
+                     className='chart-grid',
+                     style={'display': 'flex'})
+        ])
 
-        # make a dataframe variable to use for plotting
-        my_check4 = pd.DataFrame(my_check4)
-
-        figure4 = px.line(my_check4,
-                          x='Year',
-                          y='Value',
-                          labels={'Value': '% of land area'},
-                          markers=True
+    ]
                           )
 
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Forest area in {option} [1980-2018]', 'x': 0.5},  # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure4.update_traces(marker_color=light_green_color)  # Change bar color to light green
-        figure4.update_xaxes(range=[my_check4['Year'].min() - 0.5, my_check4['Year'].max() + 0.5])
-        figure4.update_yaxes(range=[my_check4['Value'].min() - 1.5, my_check4['Value'].max() + 5])
-
-        # Show all years on x-axis
-        figure4.update_xaxes(tickmode='linear', tick0=my_check4['Year'].min(), dtick=1)
-
-        # set the fourth dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
 
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
+# the dropdown of every indicator of the framework file and the chart of the picked one for the selection above
+def catalog_layout():
+    return [
+        html.H1('Indicator catalog', style={'textAlign': 'center'}),
 
-    # OPTION 5: USER SELECTS SUB-REGION AND ALL YEARS
+        dcc.Dropdown(id='indicator-selection',
+                     options=catalog_options(),
+                     placeholder='select-indicator',
+                     style={
 
-    elif option in new_df['sub-region'].unique() and year not in years:
+                         'width': '99.8%',  # set width as 80%
+                         'padding': '3px',  # set padding as 3px
+                         'fontsize': '20px',  # set font size as 20px
+                         'textAlignLast': 'center',  # set text-align-last as center
+                         'backgroundColor': 'black',  # set background color as black
+                         'color': 'black'  # set text color as white
+                     }
 
-        # ------------------------------------------------------------------------------------------------------
-        # GRAPH NO 1: EVOLUTION OF CUMULATIVE CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS FOR ALL SUB-REGIONS
-        # ------------------------------------------------------------------------------------------------------
+                     ),
 
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check1 = new_df[new_df['indicator'] == "CO2 emissions (metric tons per capita)"]
+        html.Div([
+            html.Div(id='indicator-container',
+                     className='chart-grid',
+                     style={'display': 'flex'})
+        ])
+    ]
 
-        # group the dataframe by sub-region - sum the CO2 emmissions per capita per sub-region
-        my_check1 = my_check1.groupby('sub-region')[years].sum().reset_index()
 
-        # re-asign table to a dataframe and reset the index
-        my_check1 = pd.DataFrame(my_check1)
-
-        # transpose the datafrafe
-        my_check1 = my_check1.T
-
-        # change the name of the columns
-        my_check1.columns = my_check1.iloc[0, :]
-
-        # remove the first row which is not necessary
-        my_check1 = my_check1.loc['1990':, :]
-
-        # reset the index to put the years back as a column
-        my_check1.reset_index(inplace=True)
-
-        # rename the index column to 'year'
-        my_check1.rename(columns={"index": 'year'}, inplace=True)
-
-        # change the data type of the year column to modify the x axis limits while plotting
-        my_check1['year'] = my_check1['year'].astype(int)
-
-        # take the values of all sub-regions for plotting
-        subregions = my_check1.columns[1:]
-
-        # plot the line graph
-        figure1 = px.line(my_check1,
-                          x='year',
-                          y=subregions,
-                          labels={'value': 'Metric Tons per Capita'},
-                          markers=True
-                          )
+@instrument('update_dropdown', branch=option_branch(LEVEL_OPTIONS))
+def update_dropdown(selected_option):
+    load()
+    #the sorted options of every level are built once by the registry
+    return entities.options(selected_option)
 
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': 'Comparison of cumulative CO2 emmissions<br> for all sub-regions [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
 
-        figure1.update_xaxes(range=[my_check1['year'].min() - 0.5, my_check1['year'].max() + 0.5])
+@instrument('update_period', branch=option_branch(PERIOD_OPTIONS))
+def update_period(selected_option):
+    if selected_option == 'Year':
+        return False
+    else:
+        return True
 
-        # Show all years on x-axis
-        figure1.update_xaxes(tickmode='linear', tick0=my_check1['year'].min(), dtick=1)
 
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
+#the indicators of the charts
+CO2 = "CO2 emissions (metric tons per capita)"
+METHANE = "Methane emissions (metric tons of CO2 equivalent per capita)"
+NITROUS_OXIDE = "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)"
+GASES = [CO2, METHANE, NITROUS_OXIDE]
+GDP_GROWTH = "GDP growth (annual %)"
+RENEWABLES = "Renewable energy consumption (% of total final energy consumption)"
+FOREST_DEPLETION = "Adjusted savings: net forest depletion (% of GNI)"
+RESOURCES_DEPLETION = "Adjusted savings: natural resources depletion (% of GNI)"
+FOREST_AREA = "Forest area (% of land area)"
+
+#the views of update_output by level of the selection and period ('year' or 'all years'), registered with @view.
+#a view returns the four figures of a selection and reads its data with queries (see esg/query.py)
+VIEWS = {}
+
+
+def view(level, period):
+    def register(func):
+        VIEWS[(level, period)] = func
+        return func
+    return register
+
+
+# the top 10 countries of an indicator for a year, globally or within a sub-region or continent, as values by country
+def top_10(indicator, year, scope=None, entity=None):
+    return at_year(queries.run(Query(indicator, scope, entity, year, top=10)), year, 'country')
+
+
+# the values of indicators of a country over all years, one column per indicator
+def country_history(option, indicators):
+    return over_years(queries.run(Query(indicators, 'country', option)), labels=indicators)
+
+
+# line chart of an indicator over all years with one line per country of a sub-region or continent
+def member_lines(level, option, indicator, title, ylabel):
+    table = over_years(queries.run(Query(indicator, level, option)), 'country')
+    return figures.lines(table.index, {name: table[name] for name in table.columns},
+                         title=title, xlabel='Year', ylabel=ylabel, xaxis=figures.year_axis(table.index))
+
+
+# line chart of the population weighted means of a per capita indicator over all years with one line per sub-region
+# or continent
+def group_lines(level, indicator, title, xlabel, ylabel):
+    table = over_years(queries.run(Query(indicator, level=level, stat='weighted')), level)
+    return figures.lines(table.index, {name: table[name] for name in table.columns},
+                         title=title, xlabel=xlabel, ylabel=ylabel, xaxis=figures.year_axis(table.index))
+
+
+# OPTION 1: USER SELECTS COUNTRY AND YEAR
+@view('country', 'year')
+def country_year(option, year):
+    # GRAPH NO 1: EMMISSIONS DATA PER YEAR FOR SELECTED COUNTRY AND YEAR
+    gases = at_year(queries.run(Query(GASES, 'country', option, year)), year, 'indicator').reindex(GASES)
+    figure1 = figures.bar(gases.index, gases,
+                          title=f'Greenhouse Gas Emissions in {option} per capita for ' + year,
+                          xlabel='Indicator', ylabel='Metric tons per capita',
+                          xaxis={'tickvals': [0, 1, 2], 'ticktext': ["CO2", "Methane", "Nitrous oxide"]},
+                          yaxis={'range': [0, gases.max() + 2]})
+
+    # GRAPH NO 2 TOP 10 COUNTRIES CO2 EMMISSIONS PER CAPITA FOR SELECTED YEAR
+    co2 = top_10(CO2, year)
+    figure2 = figures.bar(co2.index, co2,
+                          title='Top 10 countries CO2 emmissions per capita for ' + year,
+                          xlabel='Country', ylabel='Metric tons per capita',
+                          yaxis={'range': [0, co2.max() + 7]})
+
+    # GRAPH NO 3 TOP 10 COUNTRIES METHANE EMMISSIONS (CO2 METRIC TONS EQUIVALENT PER CAPITA)
+    methane = top_10(METHANE, year)
+    figure3 = figures.bar(methane.index, methane,
+                          title='Top 10 countries methane emmissions per capita for ' + year,
+                          xlabel='Country', ylabel='Metric tons of CO2 equivalent per capita',
+                          yaxis={'range': [0, methane.max() + 5]})
+
+    # GRAPH NO 4 TOP 10 COUNTRIES NITROUS OXIDE EMMISSIONS (METRIC TONS OF CO2 EQUIVALENT PER CAPITA)
+    nitrous_oxide = top_10(NITROUS_OXIDE, year)
+    figure4 = figures.bar(nitrous_oxide.index, nitrous_oxide,
+                          title='Top 10 countries nitrus oxide emmissions per capita for ' + year,
+                          xlabel='Country', ylabel='Metric tons of CO2 equivalent per capita',
+                          yaxis={'range': [0, nitrous_oxide.max() + 5]})
+
+    return [figure1, figure2, figure3, figure4]
+
+
+# OPTION 2: USER SELECTS SUB-REGION AND YEAR
+@view('sub-region', 'year')
+def sub_region_year(option, year):
+    # GRAPH NO 1: TOP 10 CO2 EMMISSIONS DATA PER SUB-REGION PER YEAR
+    co2 = top_10(CO2, year, 'sub-region', option)
+    figure1 = figures.bar(co2.index, co2,
+                          title=f"{CO2} in {option}<br> for {year}" if len(co2) < 10 else f"Top 10 {option} in {CO2}<br> in {year}",
+                          xlabel='Country', ylabel='Metric tons per capita',
+                          yaxis={'range': [0, co2.max() + 5]})
+
+    # GRAPH NO 2: TOP 10 COUNTRIES GDP GROWTH (ANNUAL %) PER SUB-REGION AND YEAR
+    gdp = top_10(GDP_GROWTH, year, 'sub-region', option)
+    figure2 = figures.bar(gdp.index, gdp,
+                          title=f"{GDP_GROWTH} in {option} for {year}" if len(gdp) < 10 else f"Top 10 countries in {option} in {GDP_GROWTH} in {year}",
+                          xlabel='Country', ylabel='GDP growth (annual %)',
+                          yaxis={'range': [-5, gdp.max() + 5]})
+
+    # GRAPH NO 3: TOP 10 COUNTRIES RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION) PER SUB-REGION AND YEAR
+    renewables = top_10(RENEWABLES, year, 'sub-region', option)
+    figure3 = figures.bar(renewables.index, renewables,
+                          title=f"Renewable energy consumption in<br> {option} for {year}" if len(renewables) < 10 else f"{option} Top 10 in renewable energy consumption<br> in {year}",
+                          xlabel='Country', ylabel='% of total energy consumption',
+                          yaxis={'range': [0, renewables.max() + 5]})
+
+    # GRAPH NO 4: TOP 10 COUNTRIES NET FOREST DEPLETION (% OF GNI) PER SUB-REGION AND YEAR
+    depletion = top_10(FOREST_DEPLETION, year, 'sub-region', option)
+    figure4 = figures.bar(depletion.index, depletion,
+                          title=f"Net forest depletion in {option}<br> for {year}" if len(depletion) < 10 else f"{option} Top 10 in<br> net forest depletion {year}",
+                          xlabel='Country', ylabel='(% of GNI)',
+                          yaxis={'range': [-5, depletion.max() + 5]})
+
+    return [figure1, figure2, figure3, figure4]
+
+
+# OPTION 3: USER SELECTS CONTINENT AND YEAR
+@view('continent', 'year')
+def continent_year(option, year):
+    # GRAPH NO 1: TOP 10 COUNTRIES CO2 EMMISSIONS PER CONTINENT FOR SELECTED YEAR
+    co2 = top_10(CO2, year, 'continent', option)
+    figure1 = figures.bar(co2.index, co2,
+                          title=f"{option}: CO2 emmissions Top 10 in {year}",
+                          xlabel='Country', ylabel='Metric tons per capita',
+                          yaxis={'range': [0, co2.max() + 20]})
+
+    # GRAPH NO 2: GHG EMMISSIONS PER CAPITA PER CONTINENT FOR SELECTED YEAR
+    # the population weighted means per continent and gas for the year, one column per gas, stacked
+    ghg = at_year(queries.run(Query(GASES, years=year, level='continent', stat='weighted')), year, 'continent', 'indicator', GASES)
+    highest = np.nanmax(ghg.sum(axis=1)) if len(ghg) else 0
+    figure2 = figures.stacked_bars(ghg.index, {gas: ghg[gas] for gas in GASES},
+                                   # this title was never centred
+                                   title={'text': 'GHG emmissions per capita in all continents ', 'x': 0.05},
+                                   xlabel='Continent', ylabel='Metric tons per capita*',
+                                   colors={CO2: 'white', METHANE: '#7FFF00', NITROUS_OXIDE: 'yellow'},
+                                   yaxis={'title': {'font': {'size': 18}}, 'tickfont': {'size': 14},
+                                          'range': [0, highest + 2]},
+                                   # sub-note below the figure
+                                   annotations=[{'xref': 'paper', 'yref': 'paper', 'x': 0.5, 'y': -0.3,
+                                                 'text': '*Values for Methane and Nitrus Oxide emmissions correspond to metric tons of CO2 equivalent per capita',
+                                                 'showarrow': False, 'font': {'size': 12}}])
+
+    # GRAPH NO 3: TOP 10 COUNTRIES RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION)
+    renewables = top_10(RENEWABLES, year, 'continent', option)
+    figure3 = figures.bar(renewables.index, renewables,
+                          title=f"{option}: Renewable energy consumption<br> in {year}",
+                          xlabel='Country', ylabel='(% of total final energy consumption)',
+                          yaxis={'range': [0, 100]})
+
+    # GRAPH NO 4: TOP 10 COUNTRIES ADJUSTED SAVINGS: NATURAL RESOURCES DEPLETION (% OF GNI)
+    depletion = top_10(RESOURCES_DEPLETION, year, 'continent', option)
+    figure4 = figures.bar(depletion.index, depletion,
+                          title=f"{option}: Top 10 Adjusted Savings:<br>Natural Resources Depletion in {year}",
+                          xlabel='Country', ylabel='(% of GNI)',
+                          yaxis={'range': [0, 40]})
+
+    return [figure1, figure2, figure3, figure4]
+
+
+# OPTION 4: USER SELECTS COUNTRY AND ALL YEARS
+@view('country', 'all years')
+def country_all_years(option, year):
+    # GRAPH NO 1: EVOLUTION OF GHG EMMISSIONS PER CAPITA THROUGHOUT THE YEARS
+    # one line per gas with shortened labels for the legend and light green markers. A gas without data has no points
+    gases = country_history(option, GASES)
+    short_labels = {CO2: 'CO2', METHANE: 'Methane', NITROUS_OXIDE: 'Nitrous oxide'}
+    figure1 = figures.lines(gases.index, {short_labels[gas]: gases[gas] for gas in GASES},
+                            title=f'Greenhouse Gas emmissions per capita<br> in {option} [1990-2018]',
+                            xlabel='Year', ylabel='Metric tons', legend_title='Gas',
+                            marker_color=figures.LIGHT_GREEN,
+                            xaxis=figures.year_axis(gases.index),
+                            legend={'traceorder': 'normal', 'itemsizing': 'constant', 'itemwidth': 50})
+
+    # GRAPH NO 2: EVOLUTION OF RENEWABLE ENERGY CONSUMPTION (% OF TOTAL FINAL ENERGY CONSUMPTION)
+    renewables = country_history(option, [RENEWABLES])[RENEWABLES]
+    figure2 = figures.bar(renewables.index, renewables,
+                          title=f'Renewable energy consumption<br> in {option} [1990-2018]',
+                          xlabel='year', ylabel='% of total final energy consumption',
+                          xaxis=figures.year_axis(renewables.index))
+
+    # GRAPH NO 3: EVOLUTION OF GDP ANNUAL GROWTH
+    gdp = country_history(option, [GDP_GROWTH])[GDP_GROWTH]
+    figure3 = figures.line(gdp.index, gdp,
+                           title=f'GDP growth in {option} [1980-2018]',
+                           xlabel='Year', ylabel='Value', marker_color=figures.LIGHT_GREEN,
+                           xaxis=figures.year_axis(gdp.index),
+                           yaxis={'range': [gdp.min() - 1.5, gdp.max() + 5]})
+
+    # GRAPH NO 4: EVOLUTION OF FOREST AREA (% OF LAND AREA)
+    forest = country_history(option, [FOREST_AREA])[FOREST_AREA]
+    figure4 = figures.line(forest.index, forest,
+                           title=f'Forest area in {option} [1980-2018]',
+                           xlabel='Year', ylabel='% of land area', marker_color=figures.LIGHT_GREEN,
+                           xaxis=figures.year_axis(forest.index),
+                           yaxis={'range': [forest.min() - 1.5, forest.max() + 5]})
+
+    return [figure1, figure2, figure3, figure4]
+
+
+# OPTION 5: USER SELECTS SUB-REGION AND ALL YEARS
+@view('sub-region', 'all years')
+def sub_region_all_years(option, year):
+    return [
+        # GRAPH NO 1: EVOLUTION OF CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS FOR ALL SUB-REGIONS
+        group_lines('sub-region', CO2,
+                    title='Comparison of CO2 emmissions per capita<br> for all sub-regions [1980-2018]',
+                    xlabel='year', ylabel='Metric Tons per Capita'),
 
-        # --------------------------------------------------------------------------------------
         # GRAPH NO 2: EVOLUTION OF CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # --------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check2 = new_df[
-            (new_df['sub-region'] == option) & (new_df['indicator'] == "CO2 emissions (metric tons per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check2 = my_check2.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check2.columns.name = None
-
-        # reset the index
-        my_check2.reset_index(inplace=True)
+        member_lines('sub-region', option, CO2,
+                     title=f'CO2 emmissions in {option}<br>All Countries [1980-2018]',
+                     ylabel='Metric Tons per Capita'),
 
-        # rename the column 'index' to 'year'
-        my_check2.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check2['year'] = my_check2['year'].astype(int)
-
-        # get the countries from the dataframe
-        countries = my_check2.columns[1:]
-
-        figure2 = px.line(my_check2,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons per Capita', 'year': 'Year'}
-                          )
-
-        figure2.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'CO2 emmissions in {option}<br>All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure2.update_xaxes(range=[my_check2['year'].min() - 0.5, my_check2['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure2.update_xaxes(tickmode='linear', tick0=my_check2['year'].min(), dtick=1)
-
-        # set the second dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
-
-        # -------------------------------------------------------------------------------------------
         # GRAPH NO 3: EVOLUTION OF METHANE EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # -------------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check3 = new_df[(new_df['sub-region'] == option) & (
-                    new_df['indicator'] == "Methane emissions (metric tons of CO2 equivalent per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check3 = my_check3.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check3.columns.name = None
-
-        # reset the index
-        my_check3.reset_index(inplace=True)
-
-        # rename the column 'index' to 'year'
-        my_check3.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check3['year'] = my_check3['year'].astype(int)
-
-        # get the countries from the dataframe
-        countries = my_check3.columns[1:]
-
-        figure3 = px.line(my_check3,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons of CO2 Equivalent<br> per Capita', 'year': 'Year'}
-                          )
-
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Methane emmissions in {option}<br> All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
+        member_lines('sub-region', option, METHANE,
+                     title=f'Methane emmissions in {option}<br> All Countries [1980-2018]',
+                     ylabel='Metric Tons of CO2 Equivalent<br> per Capita'),
 
-        figure3.update_xaxes(range=[my_check3['year'].min() - 0.5, my_check3['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure3.update_xaxes(tickmode='linear', tick0=my_check3['year'].min(), dtick=1)
-
-        # set the third dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
-
-        # ------------------------------------------------------------------------------------------------
         # GRAPH NO 4: EVOLUTION OF NITRUS OXIDE EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # ------------------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check4 = new_df[(new_df['sub-region'] == 'Southern Europe') & (
-                    new_df['indicator'] == "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check4 = my_check4.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check4.columns.name = None
-
-        # reset the index
-        my_check4.reset_index(inplace=True)
-
-        # rename the column 'index' to 'year'
-        my_check4.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check4['year'] = my_check4['year'].astype(int)
-
-        # get the countries from the dataframe
-        countries = my_check4.columns[1:]
-
-        figure4 = px.line(my_check4,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons of CO2 equivalent in<br> per Capita', 'year': 'Year'}
-                          )
-
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Nitrus oxide emmissions in {option}<br> All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure4.update_xaxes(range=[my_check4['year'].min() - 0.5, my_check4['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure4.update_xaxes(tickmode='linear', tick0=my_check4['year'].min(), dtick=1)
-
-        # set the fourth dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
-
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
-
-    # OPTION 6: USER SELECTS CONTINENT AND ALL YEARS
-
-    elif option in new_df['continent'].unique() and year not in years:
+        member_lines('sub-region', option, NITROUS_OXIDE,
+                     title=f'Nitrus oxide emmissions in {option}<br> All Countries [1980-2018]',
+                     ylabel='Metric Tons of CO2 equivalent in<br> per Capita'),
+    ]
 
-        # ------------------------------------------------------------------------------------------------------
-        # GRAPH NO 1: EVOLUTION OF CUMULATIVE CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS FOR ALL CONTINENTS
-        # ------------------------------------------------------------------------------------------------------
 
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check1 = new_df[new_df['indicator'] == "CO2 emissions (metric tons per capita)"]
+# OPTION 6: USER SELECTS CONTINENT AND ALL YEARS
+@view('continent', 'all years')
+def continent_all_years(option, year):
+    return [
+        # GRAPH NO 1: EVOLUTION OF CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS FOR ALL CONTINENTS
+        group_lines('continent', CO2,
+                    title='Comparison of CO2 emmissions per capita<br> for all continents [1980-2018]',
+                    xlabel='Year', ylabel='Metric Tons <br>of CO2 per Capita'),
 
-        # group the dataframe by sub-region - sum the CO2 emmissions per capita per sub-region
-        my_check1 = my_check1.groupby('continent')[years].sum().reset_index()
-
-        # re-asign table to a dataframe and reset the index
-        my_check1 = pd.DataFrame(my_check1)
-
-        # transpose the datafrafe
-        my_check1 = my_check1.T
-
-        # change the name of the columns
-        my_check1.columns = my_check1.iloc[0, :]
-
-        # assign a None value to the columns name
-        my_check1.columns.name = None
-
-        # reset the index to put the years back as a column
-        my_check1.reset_index(inplace=True)
-
-        # rename the index column to 'year'
-        my_check1.rename(columns={"index": 'year'}, inplace=True)
-
-        # remove the first row from the dataset
-        my_check1 = my_check1.iloc[1:, :]
-
-        # change the data type of the year column to modify the x axis limits while plotting
-        my_check1['year'] = my_check1['year'].astype(int)
-
-        # take the values of all sub-regions for plotting
-        continents = my_check1.columns[1:]
-
-        figure1 = px.line(my_check1,
-                          x='year',
-                          y=continents,
-                          markers=True,
-                          labels={'value': 'Cumulative Metric Tons <br>of CO2 per Capita', 'year': 'Year'}
-                          )
-
-        figure1.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': 'Comparison of cumulative CO2 emmissions<br> for all continents [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure1.update_xaxes(range=[my_check1['year'].min() - 0.5, my_check1['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure1.update_xaxes(tickmode='linear', tick0=my_check1['year'].min(), dtick=1)
-
-        # set the first dcc graph object
-        R_chart1 = dcc.Graph(figure=figure1)
-
-        # --------------------------------------------------------------------------------------
         # GRAPH NO 2: EVOLUTION OF CO2 EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # --------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check2 = new_df[
-            (new_df['continent'] == option) & (new_df['indicator'] == "CO2 emissions (metric tons per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check2 = my_check2.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check2.columns.name = None
+        member_lines('continent', option, CO2,
+                     title=f'CO2 emmissions in {option}<br>All Countries [1980-2018]',
+                     ylabel='Metric Tons per Capita'),
 
-        # reset the index
-        my_check2.reset_index(inplace=True)
-
-        # rename the column 'index' to 'year'
-        my_check2.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check2['year'] = my_check2['year'].astype(int)
-
-        # get the countries from the dataframe
-        countries = my_check2.columns[1:]
-
-        figure2 = px.line(my_check2,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons per Capita', 'year': 'Year'}
-                          )
-
-        figure2.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'CO2 emmissions in {option}<br>All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure2.update_xaxes(range=[my_check2['year'].min() - 0.5, my_check2['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure2.update_xaxes(tickmode='linear', tick0=my_check2['year'].min(), dtick=1)
-
-        # set the second dcc graph object
-        R_chart2 = dcc.Graph(figure=figure2)
-
-        # -------------------------------------------------------------------------------------------
         # GRAPH NO 3: EVOLUTION OF METHANE EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # -------------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check3 = new_df[(new_df['continent'] == option) & (
-                    new_df['indicator'] == "Methane emissions (metric tons of CO2 equivalent per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check3 = my_check3.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check3.columns.name = None
-
-        # reset the index
-        my_check3.reset_index(inplace=True)
-
-        # rename the column 'index' to 'year'
-        my_check3.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check3['year'] = my_check3['year'].astype(int)
-
-        # get the countries from the dataframe
-        countries = my_check3.columns[1:]
-
-        figure3 = px.line(my_check3,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons of <br>CO2 Equivalent per Capita', 'year': 'Year'}
-                          )
+        member_lines('continent', option, METHANE,
+                     title=f'Methane emmissions in {option}<br>All Countries [1980-2018]',
+                     ylabel='Metric Tons of <br>CO2 Equivalent per Capita'),
 
-        figure3.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Methane emmissions in {option}<br>All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure3.update_xaxes(range=[my_check3['year'].min() - 0.5, my_check3['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure3.update_xaxes(tickmode='linear', tick0=my_check3['year'].min(), dtick=1)
-
-        # set the third dcc graph object
-        R_chart3 = dcc.Graph(figure=figure3)
-
-        # ------------------------------------------------------------------------------------------------
         # GRAPH NO 4: EVOLUTION OF NITRUS OXIDE EMMISSIONS PER CAPITA THROUGHOUT THE YEARS (ALL COUNTRIES)
-        # ------------------------------------------------------------------------------------------------
-
-        # retrieve only the relevant indicator (CO2 emmissions per capita)
-        my_check4 = new_df[(new_df['continent'] == option) & (
-                    new_df['indicator'] == "Nitrous oxide emissions (metric tons of CO2 equivalent per capita)")]
-
-        # set the country as index and select the years columns then transpose the dataframe
-        my_check4 = my_check4.set_index('country')[years].T
-
-        # set the name of the columns to None
-        my_check4.columns.name = None
-
-        # reset the index
-        my_check4.reset_index(inplace=True)
-
-        # rename the column 'index' to 'year'
-        my_check4.rename(columns={'index': 'year'}, inplace=True)
-
-        # change the data type of the year column to int to change the x axis limits in plotting
-        my_check4['year'] = my_check4['year'].astype(int)
+        member_lines('continent', option, NITROUS_OXIDE,
+                     title=f'Nitrus oxide emmissions in {option}<br>All Countries [1980-2018]',
+                     ylabel='Metric Tons of<br>CO2 Equivalent per Capita'),
+    ]
 
-        # get the countries from the dataframe
-        countries = my_check4.columns[1:]
 
-        figure4 = px.line(my_check4,
-                          x='year',
-                          y=countries,
-                          markers=True,
-                          labels={'value': 'Metric Tons of<br>CO2 Equivalent per Capita', 'year': 'Year'}
-                          )
-
-        figure4.update_layout({
-            'plot_bgcolor': 'black',  # Change background color to black
-            'paper_bgcolor': 'black',  # Change plot area color to black
-            'font': {'color': 'white'},  # Change label color to white
-            'title': {'text': f'Nitrus oxide emmissions in {option}<br>All Countries [1980-2018]', 'x': 0.5},
-            # Add title and align it to the center
-            'xaxis': {'tickangle': 45}  # Rotate x-axis labels by 45 degrees
-        })
-
-        figure4.update_xaxes(range=[my_check4['year'].min() - 0.5, my_check4['year'].max() + 0.5])
-
-        # Show all years on x-axis
-        figure4.update_xaxes(tickmode='linear', tick0=my_check4['year'].min(), dtick=1)
-
-        # set the fourth dcc graph object
-        R_chart4 = dcc.Graph(figure=figure4)
-
-        return [
-            html.Div(className='chart-item', children=[html.Div(children=R_chart1), html.Div(children=R_chart2)]),
-            html.Div(className='chart-item', children=[html.Div(children=R_chart3), html.Div(children=R_chart4)])
-        ]
+@instrument('update_output', branch=output_branch, log=log_selection)
+@memoize(maxsize=cache_size, version=current_version)
+@figure_cache.memoize('wb_ed.update_output', current_version)
+def update_output(option, year):
+    level = selection_level(option)
+    if level is None:
+        return None
+    charts = VIEWS[(level, 'year' if year in years else 'all years')](option, year)
+
+    # two rows of two graphs
+    return [
+        html.Div(className='chart-item', children=[html.Div(children=dcc.Graph(figure=figure)) for figure in charts[:2]]),
+        html.Div(className='chart-item', children=[html.Div(children=dcc.Graph(figure=figure)) for figure in charts[2:]])
+    ]
+
+
+# the chart of an indicator of the catalog for the selection: its values over the years for a country, the top 10
+# countries of a sub-region or continent for a year or all its countries over the years. The indicator is loaded
+# on its first use and kept while it is among the ESG_CATALOG_SIZE indicators used last
+@instrument('update_indicator', branch=lambda code, option, year: output_branch(option, year))
+@memoize(maxsize=cache_size, version=current_version)
+@figure_cache.memoize('wb_ed.update_indicator', current_version)
+def update_indicator(code, option, year):
+    level = selection_level(option)
+    if code not in catalog or level is None:
+        return None
+    engine = catalog.get(code)
+    name = catalog.name(code)
+
+    if level == 'country':
+        history = over_years(engine.run(Query(name, 'country', option)), labels=[name])[name]
+        figure = figures.line(history.index, history,
+                              title=f'{name}<br> in {option} [1990-2018]',
+                              xlabel='Year', ylabel='Value', marker_color=figures.LIGHT_GREEN,
+                              xaxis=figures.year_axis(history.index))
+    elif year in years:
+        top = at_year(engine.run(Query(name, level, option, year, top=10)), year, 'country')
+        figure = figures.bar(top.index, top,
+                             title=f'{option}: Top 10 in {name}<br> in {year}',
+                             xlabel='Country', ylabel='Value')
+    else:
+        table = over_years(engine.run(Query(name, level, option)), 'country')
+        figure = figures.lines(table.index, {country: table[country] for country in table.columns},
+                               title=f'{name} in {option}<br>All Countries [1990-2018]',
+                               xlabel='Year', ylabel='Value', xaxis=figures.year_axis(table.index))
+
+    return [html.Div(className='chart-item', children=[html.Div(children=dcc.Graph(figure=figure))])]
+
+
+#export the hit and miss counters of both caches of update_output on /metrics
+REGISTRY.add_collector('wb_ed.update_output', cache_collector('wb_ed.update_output', update_output.cache))
+REGISTRY.add_collector('wb_ed.figures', cache_collector('wb_ed.figures', figure_cache))
+REGISTRY.add_collector('wb_ed.queries', cache_collector('wb_ed.queries', query_cache))
+REGISTRY.add_collector('wb_ed.catalog', cache_collector('wb_ed.catalog', catalog_cache))
+REGISTRY.add_collector('wb_ed.derived', cache_collector('wb_ed.derived', derived_cache))
+
+#the cache warm up of this worker, started by create_app
+warmer = None
+
+#export the progress of the cache warm up on /metrics
+warm_up_selections, warm_up_cpu = warm_up_collectors('wb_ed.update_output', lambda: warmer)
+REGISTRY.add_collector('wb_ed.warm_up.selections', warm_up_selections)
+REGISTRY.add_collector('wb_ed.warm_up.cpu', warm_up_cpu)
+
+
+# compute the hottest selections through both caches of update_output in a background thread, within the cpu budget
+# of esg/warm.py. The warm up calls update_output without its metrics, so it does not count as latency of the users
+def start_cache_warm_up():
+    global warmer
+    warmer = CacheWarmer(update_output.__wrapped__, warm_selections, name='wb_ed-cache-warm-up')
+    warmer.start()
+    return warmer
+
+
+# create the dash application. config overrides DEFAULT_CONFIG; the data is loaded following config['warm_up']
+def create_app(app_config=None):
+    config.update(DEFAULT_CONFIG, **(app_config or {}))
+
+    with startup_phase('create app'):
+        app = dash.Dash(__name__)
+        app.layout = layout()
+
+        if config['static']:
+            #the browser fetches the files baked by esg/bake.py (see assets/wb_ed.js), the server only serves them
+            app.layout.children.append(dcc.Store(id='baked', data=baked_source('wb_ed', read_manifest('wb_ed'))))
+            app.clientside_callback(
+                ClientsideFunction(namespace='wb_ed', function_name='update_dropdown'),
+                Output('dropdown-selection', 'options'),
+                [Input('controls-and-radio-item', 'value')],
+                [State('baked', 'data')]
+            )
+            app.clientside_callback(
+                ClientsideFunction(namespace='wb_ed', function_name='update_period'),
+                Output(component_id='Year', component_property='disabled'),
+                Input(component_id='controls-and-radio-item2', component_property='value')
+            )
+            app.clientside_callback(
+                ClientsideFunction(namespace='wb_ed', function_name='update_output'),
+                Output(component_id='output-container', component_property='children'),
+                [Input(component_id='dropdown-selection', component_property='value'),
+                 Input(component_id='Year', component_property='value')],
+                [State('baked', 'data')]
+            )
+            register_baked(app.server)
+        else:
+            app.callback(
+                Output('dropdown-selection', 'options'),
+                [Input('controls-and-radio-item', 'value')]
+            )(update_dropdown)
+
+            app.callback(
+                Output(component_id='Year', component_property='disabled'),
+                Input(component_id='controls-and-radio-item2', component_property='value')
+            )(update_period)
+
+            app.callback(
+                Output(component_id='output-container', component_property='children'),
+                [Input(component_id='dropdown-selection', component_property='value'),
+                 Input(component_id='Year', component_property='value')]
+            )(update_output)
+
+            #the indicators of the catalog are loaded on demand by the server, so they are only offered here
+            app.layout.children.extend(catalog_layout())
+            app.callback(
+                Output(component_id='indicator-container', component_property='children'),
+                [Input(component_id='indicator-selection', component_property='value'),
+                 Input(component_id='dropdown-selection', component_property='value'),
+                 Input(component_id='Year', component_property='value')]
+            )(update_indicator)
+
+        #latency histograms of the callbacks and counters of the caches are served on /metrics
+        register_metrics(app.server)
+
+        #the cleaned data is served read only under /api/v1 for other services (see esg/api.py)
+        register_api(app.server, api_source)
+
+    #the callbacks of the static mode do not need the data, only the api loads it on its first request
+    if config['static']:
+        return app
+    if config['warm_up'] == 'startup':
+        load()
+    elif config['warm_up'] == 'background':
+        threading.Thread(target=load, name='wb_ed-warm-up', daemon=True).start()
+
+    #the cache warm up waits for the data in its own thread
+    if config['warm_up'] != 'none' and config['warm_cache']:
+        start_cache_warm_up()
+    return app
 
 
 if __name__ == '__main__':
-    app.run_server(debug=True)
\ No newline at end of file
+    logging.basicConfig(level=logging.INFO)
+    create_app().run_server(debug=True)